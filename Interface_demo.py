@@ -5,8 +5,9 @@ from googlesheetapp import GoogleSheetApp
 
 
 class SchedulerApp:
-    def __init__(self, sheet_name = "August 2023"):
-        self.googleSheetApp = GoogleSheetApp()
+    def __init__(self, sheet_name = "August 2023", sheet_app = None):
+        # sheet_app defaults to the process-wide GoogleSheetApp, LocalSheetApp reads from in-memory sheets
+        self.googleSheetApp = sheet_app if sheet_app is not None else GoogleSheetApp.shared()
         # self.__sheet_name = 'August 2023'
         self.__sheet_name = sheet_name
         self.__sheet_id = '1wHNERHZUxl8mI7xOPtWsvRBHxw9r_ohFoi7BWET_YdU'
@@ -21,12 +22,40 @@ class SchedulerApp:
         self.__date_range = self.__sheet_name + '!A12:A42'
         self.__shift_matrix_range = self.__sheet_name + '!A210:J219' #TODO: retrieve shift matrix from sheet
 
-        start_date, end_date = self.get_date()
+        self.__schedule = self.build_schedule(self.fetch_tables())
+
+    def fetch_tables(self):
+        """Reads all the input ranges of the sheet with a single batch request.
+
+        Returns:
+            The parsed tables by name: date, name, staffs, shifts, fixed_shifts,
+            morning_availability, afternoon_availability and holidays.
+        """
+        tables = {
+            'date': (self.__date_range, 'values'),
+            'name': (self.__name_range, 'values'),
+            'staffs': (self.__staffs_range, 'dict'),
+            'shifts': (self.__shifts_range, 'values'),
+            'fixed_shifts': (self.__fixed_shift_range, 'values'),
+            'morning_availability': (self.__morning_availability_range, 'dict'),
+            'afternoon_availability': (self.__afternoon_availability_range, 'dict'),
+            'holidays': (self.__holidays_range, 'values'),
+        }
+        values = self.googleSheetApp.batch_get_sheet_values(
+            self.__sheet_id,
+            [range for range, _ in tables.values()],
+            [type for _, type in tables.values()],
+        )
+        return dict(zip(tables, values))
+
+    def build_schedule(self, tables):
+        """Builds the schedule from the tables returned by fetch_tables."""
+        start_date, end_date = self.parse_date(tables['date'])
 
         self._start_date = start_date
         self._end_date = end_date
 
-        name = self.get_schedule_name()
+        name = tables['name'][0][0]
         schedule = Schedule(
             name = name,
             start_time= self._start_date,
@@ -34,7 +63,7 @@ class SchedulerApp:
         )
 
         # Add active employees to schedule
-        employees = self.get_staffs()
+        employees = tables['staffs']
         for employee in employees: #type: ignore
             if employee['active'] == 'TRUE':
                 schedule.add_employee(
@@ -48,7 +77,7 @@ class SchedulerApp:
         
         # TODO : setting shift types from sheet
         # Add shifts to schedule
-        shifts = self.get_shifts() #type: ignore
+        shifts = tables['shifts'] #type: ignore
         shifts_header = [str.lower(i) for i in shifts[0]] #type: ignore
         shifts = shifts[1:] #type: ignore
         for j in range(len(shifts)): #type: ignore
@@ -75,7 +104,7 @@ class SchedulerApp:
                     )
 
         # Add fixed shifts
-        fixed_shifts = self.get_fixed_shift() #type: ignore
+        fixed_shifts = tables['fixed_shifts'] #type: ignore
         # print('Fixed shifts:')
         fixed_shifts_header = [str.lower(i) for i in fixed_shifts[0]] #type: ignore
         fixed_shifts = fixed_shifts[1:] #type: ignore
@@ -94,7 +123,7 @@ class SchedulerApp:
                     
 
         # Add morning availability
-        morning_availability = self.get_morning_availability()
+        morning_availability = tables['morning_availability']
         for i in range(len(morning_availability)): #type: ignore
             for employee in schedule.employees:
                 abbreviation = employee.abbreviation
@@ -107,7 +136,7 @@ class SchedulerApp:
                     )
         
         # Add afternoon availability
-        afternoon_availability = self.get_afternoon_availability()
+        afternoon_availability = tables['afternoon_availability']
         for i in range(len(afternoon_availability)): #type: ignore
             for employee in schedule.employees:
                 abbreviation = employee.abbreviation
@@ -118,14 +147,14 @@ class SchedulerApp:
                     )
 
         #Add holidays
-        holidays = self.googleSheetApp.get_sheet_values(self.__sheet_id, self.__holidays_range, type = 'values')
+        holidays = tables['holidays']
         for index in range(len(holidays)): #type: ignore
             if holidays[index][0] == 'TRUE': #type: ignore
                 holiday = self._start_date + timedelta(days=index)
                 schedule.add_holiday(holiday)
                 # print(f'Add holiday: {datetime(2023, 4, 1 + index)}')
-            
-        self.__schedule = schedule
+
+        return schedule
 
     @property
     def schedule(self):
@@ -175,13 +204,18 @@ class SchedulerApp:
 
     def get_date(self):
         date_text = self.googleSheetApp.get_sheet_values(self.__sheet_id, self.__date_range, type = 'values') #type: ignore
+        return self.parse_date(date_text)
+
+    @staticmethod
+    def parse_date(date_text):
         start_date = datetime.strptime(date_text[0][0], '%d/%m/%Y') #type: ignore
         end_date = datetime.strptime(date_text[-1][0], '%d/%m/%Y') #type: ignore
 
         return start_date, end_date
 
-    def solve(self):
-        self.schedule.solve()
+    def solve(self, **kwargs):
+        # kwargs are passed to Schedule.solve, e.g. time_limit, objective or config
+        return self.schedule.solve(**kwargs)
         
     
 
@@ -10,11 +10,22 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 
 from source import *
 from Interface_demo import GoogleSheetApp, SchedulerApp
+from jobs import DEFAULT_PATH, JobStore, SolveJobQueue
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 
 app = FastAPI()
 
+# Solves run in a bounded process pool, the endpoints only queue and read jobs
+job_queue = SolveJobQueue(
+    store=JobStore(os.environ.get('JOBS_DB', DEFAULT_PATH)),
+    max_jobs=int(os.environ.get('MAX_SOLVE_JOBS', 2)),
+)
+
+@app.on_event("shutdown")
+def shutdown():
+    job_queue.shutdown(wait=False)
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -28,15 +39,34 @@ async def root():
 #         return {"message": str(e)}
 #     return {"message": "Solved"}
 
-#input sheet name and solve
+#input sheet name and queue the solve, returns the job id
 @app.get("/solve/{sheet_name}")
-def solve(sheet_name: str):
+def solve(sheet_name: str, time_limit: int = 60, objective: str = 'lexicographic', write: bool = False):
     try:
-        schedulerApp = SchedulerApp(sheet_name=sheet_name)
-        schedulerApp.solve()
+        job_id = job_queue.submit(sheet_name, time_limit=time_limit, objective=objective, write=write)
     except Exception as e:
         return {"message": str(e)}
-    return {"message": "Solved"}
+    return {"message": "Submitted", "job_id": job_id}
+
+#phase, objective and elapsed time of a job
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return status
+
+#solved schedule of a job
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = job_queue.result(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job['status'] in ('queued', 'running'):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}")
+    if job['status'] == 'failed':
+        return {"message": job['error'], "status": job['status']}
+    return {"message": "Solved", "status": job['status'], **job['result']}
 
 
 
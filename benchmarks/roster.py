@@ -0,0 +1,121 @@
+import random
+from datetime import datetime, timedelta
+
+from source import Schedule, Employee, Shift, Task
+
+
+# Start hour and duration in hours of every shift type, as built by SchedulerApp
+SHIFT_TIMES = {
+    'mc': (8, 4),
+    's1': (8, 4),
+    's1+': (8, 4),
+    's2': (12, 4),
+    's2+': (12, 4),
+    'ems': (8, 8),
+    'observe': (8, 8),
+    'amd': (8, 8),
+    'avd': (8, 8),
+}
+
+# Shift types that are also worked on holidays, the other types are only created on workdays
+HOLIDAY_SHIFT_TYPES = ('avd',)
+
+# Per employee (min, max) number of shifts on holidays, as enforced by Schedule.solve
+HOLIDAY_QUOTA = (1, 2)
+
+# Per employee (min, max) number of shifts of each type group, from the shift_group_sum quotas of
+# Schedule.solve; ('s1+', 's2+') is what is left of the (7, 8) quota of all four s types.
+# The shifts of a group are staffed so that the total lands in the middle of num_employees * (min, max).
+GROUP_QUOTAS = {
+    ('mc',): (1, 2),
+    ('amd',): (1, 2),
+    ('avd',): (2, 3),
+    ('s1', 's2'): (3, 4),
+    ('s1+', 's2+'): (4, 4),
+}
+
+# Employees with per employee quotas hardcoded in Schedule.solve
+REQUIRED_ABBREVIATIONS = ('BC', 'SS', 'PU')
+
+
+def staffing(num_dates: int, total: int) -> list[int]:
+    """Spreads total assignments over num_dates shifts, 0 meaning that no shift is created."""
+    if num_dates == 0:
+        return []
+    base, remainder = divmod(total, num_dates)
+    # Evenly spaced dates get the extra employee
+    extra = set(i * num_dates // remainder for i in range(remainder))
+    return [base + (1 if i in extra else 0) for i in range(num_dates)]
+
+
+def generate_roster(num_employees: int = 13, num_days: int = 31, shift_types=tuple(SHIFT_TIMES), availability: float = 0.95,
+                    start_time: datetime = datetime(2023, 8, 1), seed: int = 0) -> Schedule:
+    """Generates a synthetic schedule that satisfies the quotas hardcoded in Schedule.solve.
+
+    Args:
+        num_employees: The number of employees, at least 3 (BC, SS and PU are always created).
+        num_days: The number of days of the schedule.
+        shift_types: The shift types to create, a subset of SHIFT_TIMES.
+        availability: The probability that an employee is available for a half day.
+        start_time: The first day of the schedule.
+        seed: The seed of the random availability.
+    Returns:
+        The schedule with employees, shifts and the employees' unavailable half days as tasks.
+    """
+    if num_employees < len(REQUIRED_ABBREVIATIONS):
+        raise ValueError(f'Invalid value for num_employees: {num_employees}')
+    if num_days < 1:
+        raise ValueError(f'Invalid value for num_days: {num_days}')
+    if not 0 <= availability <= 1:
+        raise ValueError(f'Invalid value for availability: {availability}')
+    for shift_type in shift_types:
+        if shift_type not in SHIFT_TIMES:
+            raise ValueError(f'Invalid value for shift_type: {shift_type}')
+
+    rnd = random.Random(seed)
+    schedule = Schedule(name=f'Benchmark {num_employees}x{num_days}', start_time=start_time, end_time=start_time + timedelta(days=num_days - 1))
+
+    abbreviations = list(REQUIRED_ABBREVIATIONS) + [f'E{i}' for i in range(num_employees - len(REQUIRED_ABBREVIATIONS))]
+    for abbreviation in abbreviations:
+        schedule.add_employee(Employee(first_name=abbreviation, last_name='Benchmark', role='staff', abbreviation=abbreviation))
+
+    # Assignments needed per shift type, types without a quota are staffed by one employee per shift
+    totals = {}
+    for group, (low, high) in GROUP_QUOTAS.items():
+        group = [shift_type for shift_type in group if shift_type in shift_types]
+        for shift_type in group:
+            totals[shift_type] = round(num_employees * (low + high) / 2 / len(group))
+    # The holiday quota is shared by the holiday shift types, the rest of their total goes to workdays
+    holiday_types = [shift_type for shift_type in shift_types if shift_type in HOLIDAY_SHIFT_TYPES]
+    holiday_totals = {shift_type: round(num_employees * sum(HOLIDAY_QUOTA) / 2 / len(holiday_types)) for shift_type in holiday_types}
+
+    holidays = set(schedule.holidays)
+    for shift_type in shift_types:
+        hour, duration = SHIFT_TIMES[shift_type]
+        template = Shift(name=shift_type, description=shift_type, duration=timedelta(hours=duration), start_time=start_time + timedelta(hours=hour), shift_type=shift_type)
+        first = len(schedule.shifts)
+        schedule.add_shifts(template, holiday=shift_type in holiday_types)
+        created = schedule.shifts[first:]
+        on_holidays = [shift for shift in created if shift.start_time.replace(hour=0) in holidays]
+        on_workdays = [shift for shift in created if shift.start_time.replace(hour=0) not in holidays]
+
+        staffed = []
+        if on_holidays:
+            staffed += zip(on_holidays, staffing(len(on_holidays), holiday_totals[shift_type]))
+        if shift_type in totals:
+            workday_total = max(totals[shift_type] - holiday_totals.get(shift_type, 0), 0)
+            staffed += zip(on_workdays, staffing(len(on_workdays), workday_total))
+        for shift, employees in staffed:
+            if employees == 0:
+                schedule.remove_shift(shift)
+            else:
+                shift.min_employees = shift.max_employees = employees
+
+    # Unavailable half days
+    for employee in schedule.employees:
+        for day in range(num_days):
+            for hour in (8, 12):
+                if rnd.random() >= availability:
+                    employee.add_task(Task(name='', description='', start_time=start_time + timedelta(days=day, hours=hour), duration=timedelta(hours=4)))
+
+    return schedule
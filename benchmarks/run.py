@@ -0,0 +1,189 @@
+"""Benchmarks Schedule.solve on synthetic rosters.
+
+Every case runs in a fresh process so that its peak memory is measured on its own. The results
+are written as JSON and compared to a baseline, e.g.
+
+    python -m benchmarks.run --employees 13 25 --days 31 --output results.json
+    python -m benchmarks.run --suite small --baseline baseline.json --output results.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from ortools import __version__ as ortools_version
+
+from benchmarks.roster import generate_roster, SHIFT_TIMES
+
+
+# (employees, days) of the predefined suites
+SUITES = {
+    'small': [(13, 31), (25, 31)],
+    'medium': [(25, 62), (50, 31), (50, 92)],
+    'large': [(100, 92), (200, 31), (50, 365)],
+}
+
+# Measures compared to the baseline, with the absolute change under which a difference is noise
+TIMINGS = {
+    'generate_time': 0.05,
+    'build_time': 0.05,
+    'solve_time': 0.5,
+    'peak_memory_mb': 20,
+}
+
+FEASIBLE = ('OPTIMAL', 'FEASIBLE')
+
+
+def case_name(case: dict) -> str:
+    name = f"e{case['employees']}-d{case['days']}-a{case['availability']}-{case['objective']}"
+    return name + '-sparse' if case.get('sparse') else name
+
+
+def run_case(case: dict) -> dict:
+    """Generates and solves one roster, returns its measures. Runs in its own process."""
+    from source import SolverConfig
+
+    start = time.perf_counter()
+    schedule = generate_roster(case['employees'], case['days'], shift_types=case['shift_types'], availability=case['availability'], seed=case['seed'])
+    generate_time = time.perf_counter() - start
+
+    # The first phase starts once the model is built
+    marks = {}
+    def progress(phase):
+        marks.setdefault('build', time.perf_counter())
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        solved = schedule.solve(time_limit=case['time_limit'], verbose=False, objective=case['objective'],
+                                config=SolverConfig(workers=case['workers'], seed=case['seed']), progress=progress,
+                                sparse=case.get('sparse', False))
+    total_time = time.perf_counter() - start
+
+    proto = schedule.model.Proto()
+    assigned = sum(len(shift.employees) for shift in schedule.shifts)
+    required = sum(shift.min_employees for shift in schedule.shifts)
+    return {
+        'name': case_name(case),
+        'case': case,
+        'solved': bool(solved),
+        'shifts': len(schedule.shifts),
+        'variables': len(proto.variables),
+        'constraints': len(proto.constraints),
+        'generate_time': generate_time,
+        'build_time': marks.get('build', start) - start,
+        'solve_time': sum(phase['wall_time'] for phase in schedule.phases),
+        'total_time': total_time,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'phases': schedule.phases,
+        'spans': schedule.spans,
+        'coverage': assigned / required if required else 1.0,
+    }
+
+
+def run(cases: list[dict]) -> dict:
+    results = []
+    for case in cases:
+        print(f'Running {case_name(case)}', file=sys.stderr)
+        # A new process per case, so the peak memory of a case doesn't include the previous ones
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(run_case, case).result()
+        print(f"  build {result['build_time']:.2f}s, solve {result['solve_time']:.2f}s, "
+              f"{result['variables']} variables, {result['constraints']} constraints, {result['peak_memory_mb']:.0f} MB", file=sys.stderr)
+        results.append(result)
+    return {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'ortools': ortools_version,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list[str]:
+    """Lists the regressions of results against baseline.
+
+    A timing or the peak memory regresses when it grows by more than tolerance (relative) and by
+    more than its noise floor in TIMINGS. Quality regresses when a phase that was solved is not
+    anymore, or when its objective (maximized) drops by more than tolerance.
+    """
+    regressions = []
+    baseline_results = {result['name']: result for result in baseline['results']}
+    for result in results['results']:
+        name = result['name']
+        if name not in baseline_results:
+            continue
+        base = baseline_results[name]
+        for measure, floor in TIMINGS.items():
+            old, new = base[measure], result[measure]
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append(f'{name}: {measure} {old:.2f} -> {new:.2f}')
+        for old_phase, new_phase in zip(base['phases'], result['phases']):
+            if old_phase['status'] in FEASIBLE and new_phase['status'] not in FEASIBLE:
+                regressions.append(f"{name}: {old_phase['name']} {old_phase['status']} -> {new_phase['status']}")
+            elif old_phase['objective'] is not None and new_phase['objective'] is not None:
+                if new_phase['objective'] < old_phase['objective'] - tolerance * abs(old_phase['objective']):
+                    regressions.append(f"{name}: {old_phase['name']} objective {old_phase['objective']} -> {new_phase['objective']}")
+        if len(result['phases']) < len(base['phases']):
+            regressions.append(f"{name}: {len(base['phases'])} phases -> {len(result['phases'])}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Schedule.solve on synthetic rosters.')
+    parser.add_argument('--suite', choices=sorted(SUITES), help='predefined (employees, days) cases, instead of --employees and --days')
+    parser.add_argument('--employees', type=int, nargs='+', default=[13], help='numbers of employees (10-200)')
+    parser.add_argument('--days', type=int, nargs='+', default=[31], help='numbers of days (7-365)')
+    parser.add_argument('--availability', type=float, nargs='+', default=[0.95], help='probabilities that an employee is available for a half day')
+    parser.add_argument('--shift-types', nargs='+', default=list(SHIFT_TIMES), choices=list(SHIFT_TIMES))
+    parser.add_argument('--objective', default='lexicographic')
+    parser.add_argument('--time-limit', type=float, default=10, help='time limit of every solve phase, in seconds')
+    parser.add_argument('--workers', type=int, default=None, help='CP-SAT workers, defaults to the number of CPUs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sparse', action='store_true', help='solve with sparse=True, see Schedule.solve')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results to compare to, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change allowed before a regression is reported')
+    args = parser.parse_args(argv)
+
+    sizes = SUITES[args.suite] if args.suite else [(employees, days) for employees in args.employees for days in args.days]
+    cases = [{
+        'employees': employees,
+        'days': days,
+        'availability': availability,
+        'shift_types': args.shift_types,
+        'objective': args.objective,
+        'time_limit': args.time_limit,
+        'workers': args.workers,
+        'seed': args.seed,
+        'sparse': args.sparse,
+    } for employees, days in sizes for availability in args.availability]
+
+    results = run(cases)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}', file=sys.stderr)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'Regression {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+        print('No regression', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,37 +1,204 @@
+import threading
+from functools import lru_cache
+
 import gspread
-import regex as re
+from cachetools import LRUCache, TTLCache
+from gspread.utils import a1_range_to_grid_range, absolute_range_name, fill_gaps
+
+
+@lru_cache(maxsize=1024)
+def split_range(range):
+    """Splits 'Sheet name!A1:B2' into the sheet name and the A1 range."""
+    SHEET_NAME, _, RANGE_NAME = range.partition('!')
+    return SHEET_NAME.strip(), RANGE_NAME.strip()
+
+
+def to_type(values, type = 'values'):
+    """Returns the values as rows, or as dicts keyed by the first row if type is 'dict'."""
+    if type == 'values':
+        return values
+    elif type == 'dict':
+        titles = values[0]
+        values = values[1:]
+        result = [dict(zip(titles, value)) for value in values]
+        return result
+    raise ValueError(f'Invalid value for type: {type}')
 
 
 class GoogleSheetApp():
-    def __init__(self):
+    """Reads and writes Google Sheets ranges through gspread.
+
+    Spreadsheet and worksheet handles are cached for ttl seconds (at most maxsize of each, least
+    recently used first out), so repeated reads of the same sheet don't fetch its metadata again.
+    With cache_values, read values are also cached for values_ttl seconds; writes through
+    update_sheet_values drop the cached values of the written sheet, other edits of the sheet
+    are seen once the entries expire or after invalidate().
+
+    Args:
+        ttl: Lifetime in seconds of the cached spreadsheet and worksheet handles.
+        maxsize: The maximum number of cached spreadsheets, worksheets and ranges.
+        cache_values: If True, cache the values read by get_sheet_values and batch_get_sheet_values.
+        values_ttl: Lifetime in seconds of the cached values.
+    """
+    __shared = None
+    __shared_lock = threading.Lock()
+
+    def __init__(self, ttl = 600, maxsize = 64, cache_values = False, values_ttl = 60):
         self.service = gspread.service_account(filename="creds.json") #type: ignore
+        self.__lock = threading.RLock()
+        self.__spreadsheets = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.__worksheets = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.__values = TTLCache(maxsize=maxsize, ttl=values_ttl) if cache_values else LRUCache(maxsize=0)
+
+    @classmethod
+    def shared(cls):
+        """The GoogleSheetApp of this process, created on the first call, so handles are cached across solves."""
+        if cls.__shared is None:
+            # Checked again under the lock, so concurrent first calls create a single app
+            with cls.__shared_lock:
+                if cls.__shared is None:
+                    cls.__shared = cls()
+        return cls.__shared
+
+    def open_spreadsheet(self, spreadsheet_id):
+        with self.__lock:
+            sheet = self.__spreadsheets.get(spreadsheet_id)
+            if sheet is None:
+                sheet = self.service.open_by_key(spreadsheet_id)
+                self.__spreadsheets[spreadsheet_id] = sheet
+            return sheet
+
+    def open_worksheet(self, spreadsheet_id, sheet_name):
+        key = (spreadsheet_id, sheet_name)
+        with self.__lock:
+            worksheet = self.__worksheets.get(key)
+            if worksheet is None:
+                worksheet = self.open_spreadsheet(spreadsheet_id).worksheet(sheet_name)
+                self.__worksheets[key] = worksheet
+            return worksheet
+
+    def invalidate(self, spreadsheet_id = None, sheet_name = None, handles = False):
+        """Drops the cached values of a sheet, a spreadsheet or everything.
+
+        Args:
+            spreadsheet_id: Only drop this spreadsheet's entries, all spreadsheets if None.
+            sheet_name: Only drop this sheet's entries, all sheets if None.
+            handles: If True, also drop the matching spreadsheet and worksheet handles.
+        """
+        def matches(key):
+            return (spreadsheet_id is None or key[0] == spreadsheet_id) and (sheet_name is None or key[1] == sheet_name)
+
+        with self.__lock:
+            caches = [self.__values, self.__worksheets] if handles else [self.__values]
+            for cache in caches:
+                for key in [key for key in cache.keys() if matches(key)]:
+                    cache.pop(key, None)
+            if handles and sheet_name is None:
+                for key in [key for key in self.__spreadsheets.keys() if spreadsheet_id is None or key == spreadsheet_id]:
+                    self.__spreadsheets.pop(key, None)
+
+    def __cached_values(self, spreadsheet_id, range):
+        with self.__lock:
+            values = self.__values.get((spreadsheet_id, *split_range(range)))
+        # Copy the rows so that callers can't modify the cached values
+        return [list(row) for row in values] if values is not None else None
+
+    def __cache_values(self, spreadsheet_id, range, values):
+        with self.__lock:
+            if self.__values.maxsize > 0:
+                self.__values[(spreadsheet_id, *split_range(range))] = [list(row) for row in values]
 
     def get_sheet_values(self, spreadsheet_id, range, type = 'values'):
-        sheet = self.service.open_by_key(spreadsheet_id)
-
-        SHEET_NAME = re.split(r'!', range)[0].strip()
-        RANGE_NAME = re.split(r'!', range)[1].strip()
-        worksheet = sheet.worksheet(SHEET_NAME)
-        values = worksheet.get_values(RANGE_NAME)
-        if type == 'values':
-            return values
-        elif type == 'dict':
-            titles = values[0]
-            values = values[1:]
-            result = [dict(zip(titles, value)) for value in values]
-            return result
+        values = self.__cached_values(spreadsheet_id, range)
+        if values is None:
+            SHEET_NAME, RANGE_NAME = split_range(range)
+            worksheet = self.open_worksheet(spreadsheet_id, SHEET_NAME)
+            values = worksheet.get_values(RANGE_NAME)
+            self.__cache_values(spreadsheet_id, range, values)
+        return to_type(values, type)
+
+    def batch_get_sheet_values(self, spreadsheet_id, ranges, types = None):
+        """Reads several ranges with one values.batchGet request.
+
+        Args:
+            spreadsheet_id: The spreadsheet key.
+            ranges: The ranges as 'Sheet name!A1:B2', like in get_sheet_values.
+            types: The type ('values' or 'dict') of each range, defaults to 'values'.
+        Returns:
+            The values of each range in the same order, padded like Worksheet.get_values.
+        """
+        types = types if types is not None else ['values'] * len(ranges)
+        assert len(types) == len(ranges), 'One type per range is required'
+        values = [self.__cached_values(spreadsheet_id, range) for range in ranges]
+
+        # Only the ranges that are not cached are requested
+        missing = [i for i in range(len(ranges)) if values[i] is None]
+        if missing:
+            sheet = self.open_spreadsheet(spreadsheet_id)
+            response = sheet.values_batch_get([absolute_range_name(*split_range(ranges[i])) for i in missing])
+            for i, value_range in zip(missing, response['valueRanges']):
+                # Empty ranges have no 'values' key
+                values[i] = fill_gaps(value_range.get('values', []))
+                self.__cache_values(spreadsheet_id, ranges[i], values[i])
+        return [to_type(value, type) for value, type in zip(values, types)]
     
     def update_sheet_values(self, spreadsheet_id, range, values):
-        sheet = self.service.open_by_key(spreadsheet_id)
-
-        SHEET_NAME = re.split(r'!', range)[0].strip()
-        RANGE_NAME = re.split(r'!', range)[1].strip()
-        worksheet = sheet.worksheet(SHEET_NAME)
+        SHEET_NAME, RANGE_NAME = split_range(range)
+        worksheet = self.open_worksheet(spreadsheet_id, SHEET_NAME)
         worksheet.update(RANGE_NAME, values)
+        self.invalidate(spreadsheet_id, SHEET_NAME)
 
         print(f'Updated {spreadsheet_id} {range} with {values}')
 
 
+class LocalSheetApp():
+    """In-memory stand-in for GoogleSheetApp, e.g. for tests or offline runs.
+
+    Args:
+        sheets: The cells of every sheet as {sheet name: rows of string values}, with the first
+            row being row 1 of the sheet. All spreadsheet ids share the same sheets.
+    """
+    def __init__(self, sheets):
+        self.sheets = {name: [list(row) for row in rows] for name, rows in sheets.items()}
+        # Number of requests made, a batch counts as one
+        self.requests = 0
+
+    def __read(self, range):
+        SHEET_NAME, RANGE_NAME = split_range(range)
+        grid = a1_range_to_grid_range(RANGE_NAME)
+        rows = self.sheets[SHEET_NAME][grid['startRowIndex']:grid['endRowIndex']]
+        values = [[str(value) for value in row[grid['startColumnIndex']:grid['endColumnIndex']]] for row in rows]
+        # Trailing empty cells and rows are not returned, as by the Sheets API
+        values = [row[:max([i + 1 for i, value in enumerate(row) if value != ''], default=0)] for row in values]
+        while values and not values[-1]:
+            values.pop()
+        return fill_gaps(values)
+
+    def get_sheet_values(self, spreadsheet_id, range, type = 'values'):
+        self.requests += 1
+        return to_type(self.__read(range), type)
+
+    def batch_get_sheet_values(self, spreadsheet_id, ranges, types = None):
+        types = types if types is not None else ['values'] * len(ranges)
+        assert len(types) == len(ranges), 'One type per range is required'
+        self.requests += 1
+        return [to_type(self.__read(range), type) for range, type in zip(ranges, types)]
+
+    def update_sheet_values(self, spreadsheet_id, range, values):
+        self.requests += 1
+        SHEET_NAME, RANGE_NAME = split_range(range)
+        grid = a1_range_to_grid_range(RANGE_NAME)
+        rows = self.sheets.setdefault(SHEET_NAME, [])
+        for i, row in enumerate(values):
+            r = grid['startRowIndex'] + i
+            while len(rows) <= r:
+                rows.append([])
+            for j, value in enumerate(row):
+                c = grid['startColumnIndex'] + j
+                rows[r].extend([''] * (c + 1 - len(rows[r])))
+                rows[r][c] = value
+
+
 if __name__ == '__main__':
 
     KEY = "1wHNERHZUxl8mI7xOPtWsvRBHxw9r_ohFoi7BWET_YdU"
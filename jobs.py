@@ -0,0 +1,212 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from source import Schedule, SolverConfig, ShiftSolutionStream
+from Interface_demo import SchedulerApp
+
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+# Default database of JobStore, out of the working directory so that the server leaves no file behind
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'scheduler_jobs.db')
+
+# Minimum seconds between two writes of the solver progress of a job
+SOLUTION_INTERVAL = 1.0
+
+
+class JobStore:
+    """SQLite store of the solve jobs.
+
+    The API process creates and reads the jobs, the solver processes update their phase, objective
+    and result, so every call opens its own short-lived connection.
+
+    Args:
+        path: The SQLite database file, defaults to DEFAULT_PATH in the temporary directory.
+    """
+
+    __columns = ('id', 'sheet_name', 'params', 'status', 'phase', 'objective', 'solutions',
+                 'created_at', 'started_at', 'finished_at', 'result', 'error')
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        with self.__connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, sheet_name TEXT, params TEXT, status TEXT, phase TEXT, '
+                'objective REAL, solutions INTEGER DEFAULT 0, created_at REAL, started_at REAL, '
+                'finished_at REAL, result TEXT, error TEXT)'
+            )
+
+    @contextlib.contextmanager
+    def __connect(self):
+        # The connection's own context manager commits but does not close it
+        with contextlib.closing(sqlite3.connect(self.path, timeout=30)) as connection, connection:
+            yield connection
+
+    def create(self, sheet_name: str, params: dict) -> str:
+        job_id = str(uuid.uuid4())
+        with self.__connect() as connection:
+            connection.execute(
+                'INSERT INTO jobs (id, sheet_name, params, status, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, sheet_name, json.dumps(params), 'queued', time.time())
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        for field in fields:
+            if field not in self.__columns or field == 'id':
+                raise ValueError(f'Invalid value for field: {field}')
+        if 'status' in fields and fields['status'] not in JOB_STATUSES:
+            raise ValueError(f'Invalid value for status: {fields["status"]}')
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        with self.__connect() as connection:
+            connection.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> dict:
+        """Returns the job as a dict, or None if there is no job with this id."""
+        with self.__connect() as connection:
+            row = connection.execute(f'SELECT {", ".join(self.__columns)} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.__columns, row))
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        if job['started_at'] is None:
+            job['elapsed'] = 0.0
+        else:
+            job['elapsed'] = (job['finished_at'] or time.time()) - job['started_at']
+        return job
+
+
+def run_job(path: str, job_id: str, app_factory, sheet_name: str, params: dict) -> None:
+    """Builds the schedule of a sheet and solves it, recording the progress in the job store.
+
+    Runs in a worker process of SolveJobQueue.
+    """
+    store = JobStore(path)
+    store.update(job_id, status='running', started_at=time.time())
+    try:
+        params = dict(params)
+        workers = params.pop('workers')
+        write = params.pop('write', False)
+        schedulerApp = app_factory(sheet_name=sheet_name)
+
+        # Improving solutions come much faster than the store needs them: at most one write per
+        # SOLUTION_INTERVAL, and the last solution of a phase is written when the phase ends
+        pending = None
+        written_at = 0.0
+
+        def flush():
+            nonlocal pending, written_at
+            if pending is not None:
+                store.update(job_id, objective=pending['objective'], solutions=pending['solution'])
+                pending = None
+                written_at = time.monotonic()
+
+        def on_solution(solution):
+            nonlocal pending
+            pending = solution
+            if time.monotonic() - written_at >= SOLUTION_INTERVAL:
+                flush()
+
+        def on_phase(phase):
+            if phase['status'] != 'RUNNING':
+                flush()
+            store.update(job_id, phase=phase['name'], objective=phase['objective'])
+
+        schedulerApp.solve(
+            verbose=False,
+            config=SolverConfig(workers=workers),
+            callback=ShiftSolutionStream(sink=on_solution),
+            progress=on_phase,
+            **params
+        )
+        schedule = schedulerApp.schedule
+        if write:
+            schedulerApp.update_schedule()
+        result = {
+            'name': schedule.name,
+            'schedule': schedule.to_matrix(),
+            'phases': schedule.phases,
+        }
+        store.update(job_id, status='done', result=result, finished_at=time.time())
+    except Exception as e:
+        store.update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+
+class SolveJobQueue:
+    """Runs sheet solves in a bounded pool of processes.
+
+    At most max_jobs solves run at the same time, the others wait in the queue. The CPU cores are
+    split between the running solves, so concurrent sheets don't starve each other.
+
+    Args:
+        store: The job store, defaults to JobStore().
+        max_jobs: The maximum number of solves running at the same time.
+        workers_per_job: CP-SAT workers of each solve, defaults to cpu_count / max_jobs.
+        app_factory: Called with sheet_name in the worker process, returns an object with
+            solve, schedule and update_schedule like SchedulerApp.
+    """
+
+    def __init__(self, store: JobStore = None, max_jobs: int = 2, workers_per_job: int = None, app_factory=SchedulerApp):
+        if max_jobs < 1:
+            raise ValueError(f'Invalid value for max_jobs: {max_jobs}')
+        self.store = store if store is not None else JobStore()
+        self.max_jobs = max_jobs
+        self.workers_per_job = workers_per_job or max(1, (os.cpu_count() or 1) // max_jobs)
+        self.app_factory = app_factory
+        self.__executor = None
+
+    def __get_executor(self):
+        # Created on the first submit, with spawn so that the workers don't inherit the server's threads
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(max_workers=self.max_jobs, mp_context=multiprocessing.get_context('spawn'))
+        return self.__executor
+
+    def submit(self, sheet_name: str, time_limit: int = 60, objective: str = 'lexicographic', write: bool = False) -> str:
+        """Queues the solve of a sheet and returns the job id.
+
+        Args:
+            sheet_name: The sheet to build the schedule from.
+            time_limit: Time limit of every solve phase, see Schedule.solve.
+            objective: Objective strategy, see Schedule.solve.
+            write: If True, the solution is written back to the sheet.
+        """
+        if objective not in Schedule.OBJECTIVE_STRATEGIES:
+            raise ValueError(f'Invalid value for objective: {objective}')
+        params = {'time_limit': time_limit, 'objective': objective, 'write': write, 'workers': self.workers_per_job}
+        job_id = self.store.create(sheet_name, params)
+        future = self.__get_executor().submit(run_job, self.store.path, job_id, self.app_factory, sheet_name, params)
+        future.add_done_callback(lambda future: self.__on_done(job_id, future))
+        return job_id
+
+    def __on_done(self, job_id, future):
+        # run_job records its own errors, this catches the worker process dying
+        if future.exception() is not None:
+            self.store.update(job_id, status='failed', error=str(future.exception()), finished_at=time.time())
+
+    def status(self, job_id: str) -> dict:
+        """Status, phase, objective and elapsed time of the job, or None if there is no such job."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {field: job[field] for field in ('id', 'sheet_name', 'status', 'phase', 'objective', 'solutions', 'elapsed', 'error')}
+
+    def result(self, job_id: str) -> dict:
+        """The job with its result, or None if there is no such job."""
+        return self.store.get(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=wait)
+            self.__executor = None
@@ -0,0 +1,122 @@
+import contextlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from source import Schedule, SolverConfig
+
+
+# Keys of a scenario, every key is optional
+SCENARIO_KEYS = ('name', 'shift_group_sum', 'add_holidays', 'remove_holidays', 'seed', 'preset', 'time_limit', 'objective', 'sparse')
+
+FEASIBLE = ('OPTIMAL', 'FEASIBLE')
+
+
+def apply_scenario(schedule: Schedule, scenario: dict) -> None:
+    """Applies the schedule overrides of a scenario: shift_group_sum bounds merged into the
+    schedule's, and holidays (datetimes or ISO strings) added or removed."""
+    schedule.shift_group_sum.update(scenario.get('shift_group_sum', {}))
+    for date in scenario.get('add_holidays', []):
+        schedule.add_holiday(datetime.fromisoformat(date) if isinstance(date, str) else date)
+    for date in scenario.get('remove_holidays', []):
+        schedule.remove_holiday(datetime.fromisoformat(date) if isinstance(date, str) else date)
+
+
+def solve_scenario(data: dict, scenario: dict, workers: int, time_limit: int, objective: str) -> dict:
+    """Rebuilds the schedule from Schedule.to_dict, applies the scenario and solves it.
+
+    Runs in a worker process of solve_portfolio, the solver output is discarded.
+    """
+    start = time.perf_counter()
+    try:
+        schedule = Schedule.from_dict(data)
+        apply_scenario(schedule, scenario)
+        config = SolverConfig(workers=workers, preset=scenario.get('preset', 'balanced'), seed=scenario.get('seed'))
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            solved = schedule.solve(time_limit=scenario.get('time_limit', time_limit), verbose=False, objective=scenario.get('objective', objective),
+                                    config=config, sparse=scenario.get('sparse', False))
+        return {'solved': bool(solved), 'phases': schedule.phases, 'wall_time': time.perf_counter() - start, 'schedule': schedule.to_dict(), 'error': None}
+    except Exception as e:
+        return {'solved': False, 'phases': [], 'wall_time': time.perf_counter() - start, 'schedule': None, 'error': str(e)}
+
+
+def rank(names: list[str], results: list[dict]) -> pd.DataFrame:
+    """Comparison table of the scenarios, best first.
+
+    Solved scenarios come first, then they are compared on the objective of every phase in
+    order (all maximized), and ties go to the fastest one.
+    """
+    rows = []
+    for name, result in zip(names, results):
+        row = {
+            'scenario': name,
+            'solved': result['solved'],
+            'status': result['phases'][-1]['status'] if result['phases'] else None,
+            'wall_time': result['wall_time'],
+            'error': result['error'],
+        }
+        for phase in result['phases']:
+            row[phase['name']] = phase['objective'] if phase['status'] in FEASIBLE else None
+        row['schedule'] = Schedule.from_dict(result['schedule']) if result['schedule'] is not None else None
+        rows.append(row)
+
+    if not rows:
+        return pd.DataFrame(columns=['rank', 'scenario', 'solved', 'status', 'wall_time', 'error', 'schedule'])
+    table = pd.DataFrame(rows)
+    objectives = [column for column in table.columns if column not in ('scenario', 'solved', 'status', 'wall_time', 'error', 'schedule')]
+    table = table.sort_values(['solved'] + objectives + ['wall_time'], ascending=[False] + [False] * len(objectives) + [True], na_position='last')
+    table.insert(0, 'rank', range(1, len(table) + 1))
+    return table.reset_index(drop=True)
+
+
+def solve_portfolio(schedule: Schedule, scenarios: list[dict], max_workers: int = None, workers_per_task: int = None,
+                    time_limit: int = 60, objective: str = 'lexicographic') -> pd.DataFrame:
+    """Solves variants of a schedule in parallel and ranks them.
+
+    The base schedule is sent to the worker processes once per scenario as Schedule.to_dict, so the
+    workers never unpickle the object graph, and every scenario is solved on its own copy.
+
+    Args:
+        schedule: The base schedule, left unchanged.
+        scenarios: One dict per variant with any of SCENARIO_KEYS, e.g.
+            {'name': 'more mc', 'shift_group_sum': {('max', 'mc'): 3}, 'seed': 1}.
+            name: The label of the variant in the table, defaults to 'scenario <position>'.
+            shift_group_sum: Bounds merged into the schedule's shift_group_sum.
+            add_holidays, remove_holidays: Dates to make holidays or workdays.
+            seed, preset: See SolverConfig.
+            time_limit, objective, sparse: See Schedule.solve, default to the arguments below.
+        max_workers: The maximum number of scenarios solved at the same time, defaults to the
+            number of CPUs.
+        workers_per_task: CP-SAT workers of each scenario, defaults to cpu_count / max_workers.
+        time_limit: Time limit of every solve phase, see Schedule.solve.
+        objective: Objective strategy, see Schedule.solve.
+    Returns:
+        A DataFrame with one row per scenario, best first: rank, scenario, solved, status, wall_time,
+        error, the objective of every phase and the solved schedule.
+    """
+    if objective not in Schedule.OBJECTIVE_STRATEGIES:
+        raise ValueError(f'Invalid value for objective: {objective}')
+    for scenario in scenarios:
+        for key in scenario:
+            if key not in SCENARIO_KEYS:
+                raise ValueError(f'Invalid value for scenario key: {key}')
+    if not scenarios:
+        return rank([], [])
+
+    cpu_count = os.cpu_count() or 1
+    max_workers = max_workers or min(len(scenarios), cpu_count)
+    if max_workers < 1:
+        raise ValueError(f'Invalid value for max_workers: {max_workers}')
+    workers_per_task = workers_per_task or max(1, cpu_count // max_workers)
+
+    data = schedule.to_dict()
+    names = [scenario.get('name', f'scenario {k}') for k, scenario in enumerate(scenarios)]
+    # spawn, so that the workers don't inherit the caller's threads
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(solve_scenario, data, scenario, workers_per_task, time_limit, objective) for scenario in scenarios]
+        results = [future.result() for future in futures]
+    return rank(names, results)
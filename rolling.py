@@ -0,0 +1,148 @@
+import math
+from datetime import datetime, timedelta
+
+from source import Schedule
+
+
+class RollingHorizon:
+    """Solves a long schedule window by window.
+
+    Every step solves the shifts of a window of window_days, keeps the assignments of its first
+    freeze_days and moves the window forward by freeze_days. Each window is a Schedule of its own
+    that shares the employees and the shifts of the long schedule, so the assignments land
+    directly in it. The state before the window is carried over:
+
+    - the shifts of the last boundary_days before the window are part of its model with their
+      assignments fixed (constants with sparse=True) and no other employee eligible, see
+      Schedule.frozen_until, so the consecutive days rule sees them and they are not changed;
+    - the shifts every employee worked earlier are counted in the window's group and holiday
+      sums through Schedule.carry;
+    - the per month bounds of shift_group_sum and holiday_sum are scaled to the days from the
+      start of the long schedule to the end of the window (floor for min, ceil for max).
+
+    Args:
+        schedule: The long schedule, e.g. a year, with its employees, tasks and shifts.
+        window_days: Length of the solved window in days.
+        freeze_days: Days kept from every window, the step of the horizon.
+        boundary_days: Days before the window whose assignments are part of its model.
+        period_days: Length of the period of the shift_group_sum and holiday_sum bounds.
+    """
+
+    def __init__(self, schedule: Schedule, window_days: int = 42, freeze_days: int = 28, boundary_days: int = 1, period_days: float = 365.25 / 12):
+        if window_days < 1:
+            raise ValueError(f'Invalid value for window_days: {window_days}')
+        if not 1 <= freeze_days <= window_days:
+            raise ValueError(f'Invalid value for freeze_days: {freeze_days}')
+        if boundary_days < 0:
+            raise ValueError(f'Invalid value for boundary_days: {boundary_days}')
+        self.schedule = schedule
+        self.window_days = window_days
+        self.freeze_days = freeze_days
+        self.boundary_days = boundary_days
+        self.period_days = period_days
+        # Per window: name, start, end, frozen until, status and wall time of the last phase
+        self.windows = []
+
+    def __scaled(self, bounds: dict, days: float) -> dict:
+        # Rounded towards the looser bound, the small epsilon absorbs float errors of whole periods
+        scale = days / self.period_days
+        return {key: math.floor(value * scale + 1e-9) if self.__bound(key) == 'min' else math.ceil(value * scale - 1e-9)
+                for key, value in bounds.items()}
+
+    @staticmethod
+    def __bound(key) -> str:
+        # shift_group_sum keys are ('max' or 'min', shift types), holiday_sum keys are 'max' or 'min'
+        return key if isinstance(key, str) else key[0]
+
+    def __carry(self, before: datetime) -> dict:
+        """Shifts every employee worked before a time, per shift_group_sum types and on holidays."""
+        holiday_dates = set(self.schedule.holiday_dates)
+        carry = {employee: {} for employee in self.schedule.employees}
+        groups = {types: (types,) if isinstance(types, str) else tuple(types) for _, types in self.schedule.shift_group_sum}
+        for shift in self.schedule.shifts:
+            if shift.start_time >= before:
+                continue
+            for employee in shift.employees:
+                if employee not in carry:
+                    continue
+                counts = carry[employee]
+                for types, shift_types in groups.items():
+                    if shift.shift_type in shift_types:
+                        counts[types] = counts.get(types, 0) + 1
+                if shift.date in holiday_dates:
+                    counts[Schedule.HOLIDAYS] = counts.get(Schedule.HOLIDAYS, 0) + 1
+        return carry
+
+    def window(self, start: datetime) -> Schedule:
+        """The schedule of the window starting at start, with its boundary days and carried-over state."""
+        schedule = self.schedule
+        context_start = max(start - timedelta(days=self.boundary_days), schedule.start_time)
+        end = min(start + timedelta(days=self.window_days), schedule.end_time + timedelta(days=1))
+
+        window = Schedule(f'{schedule.name} {start.date()}', context_start, end - timedelta(microseconds=1))
+        window.employees = list(schedule.employees)
+        for shift in schedule.shifts:
+            if context_start <= shift.start_time < end:
+                window.add_shift(shift)
+        window._holidays = [holiday for holiday in schedule.holidays if context_start <= holiday < end]
+
+        # Bounds on the shifts from the start of the long schedule to the end of the window
+        days = (end - schedule.start_time) / timedelta(days=1)
+        window.shift_group_sum = self.__scaled(schedule.shift_group_sum, days)
+        window.holiday_sum = self.__scaled(schedule.holiday_sum, days)
+        window.carry = self.__carry(context_start)
+        window.frozen_until = start
+        return window
+
+    def run(self, **kwargs) -> bool:
+        """Solves the whole schedule window by window.
+
+        Args:
+            kwargs: Passed to Schedule.solve of every window, sparse defaults to True.
+        Returns:
+            True if every window was solved. Otherwise the windows before the failed one keep their
+            assignments and the failed window is left unassigned.
+        """
+        kwargs.setdefault('sparse', True)
+        schedule = self.schedule
+        # Assignments made before the run are kept as fixed assignments
+        initial = {(shift, employee) for shift in schedule.shifts for employee in shift.employees}
+        self.windows = []
+        start = schedule.start_time
+        while start <= schedule.end_time:
+            window = self.window(start)
+            frozen_until = start + timedelta(days=self.freeze_days)
+            solved = window.solve(**kwargs)
+            self.windows.append({
+                'name': window.name,
+                'start': start,
+                'end': window.end_time,
+                'frozen_until': min(frozen_until, window.end_time),
+                'shifts': len(window.shifts),
+                'status': window.phases[-1]['status'] if window.phases else None,
+                'wall_time': sum(phase['wall_time'] for phase in window.phases),
+            })
+            if not solved:
+                for shift in window.shifts:
+                    if shift.start_time >= start:
+                        self.__release(shift, initial)
+                return False
+            # The window reaching the end is kept whole, otherwise what is after the frozen days
+            # is released and solved again by the next window
+            if window.end_time >= schedule.end_time:
+                self.windows[-1]['frozen_until'] = window.end_time
+                break
+            for shift in window.shifts:
+                if shift.start_time >= frozen_until:
+                    self.__release(shift, initial)
+            start = frozen_until
+        return True
+
+    @staticmethod
+    def __release(shift, initial: set) -> None:
+        for employee in list(shift.employees):
+            if (shift, employee) in initial:
+                continue
+            shift.remove_employee(employee)
+            if shift in employee.all_tasks:
+                employee.remove_task(shift)
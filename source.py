@@ -1,15 +1,116 @@
 from datetime import datetime, timedelta
+import time
+import itertools
 import uuid
 from ortools.sat.python import cp_model
 import pandas as pd
 import pickle
 import csv
+import json
 # from IPython.display import clear_output
 import math
+import os
+import queue
+import io
+import sys
+import contextlib
+import threading
+import abc
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AssignmentSet:
+    """Insertion-ordered set of the tasks of an employee or of the employees of a shift.
+
+    Membership, append and remove are O(1) through a dict. It reads like the list it replaces:
+    iteration, len and indexing (from a list that is cached until the next change). view keeps
+    filtered lists, e.g. the shifts of an employee, cached until the next change as well. The
+    cached lists are shared by all the callers and must not be modified, copy them first.
+    """
+    __slots__ = ('_items', '_list', '_views')
+
+    def __init__(self, items=()):
+        self._items = dict.fromkeys(items)
+        self._list = None
+        self._views = {}
+
+    def __getstate__(self):
+        return list(self._items)
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def _changed(self) -> None:
+        self._list = None
+        self._views = {}
+
+    def append(self, item) -> None:
+        self._items[item] = None
+        self._changed()
+
+    def remove(self, item) -> None:
+        if item not in self._items:
+            raise ValueError(f'{item} is not in the set')
+        del self._items[item]
+        self._changed()
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._changed()
+
+    def list(self) -> list:
+        if self._list is None:
+            self._list = list(self._items)
+        return self._list
+
+    def view(self, predicate) -> list:
+        """The items for which predicate is true, in insertion order.
+
+        The list is cached and returned to every caller until the set changes, so it must not be
+        modified: use list(view(predicate)) to get a list of one's own.
+        """
+        if predicate not in self._views:
+            self._views[predicate] = [item for item in self._items if predicate(item)]
+        return self._views[predicate]
+
+    def __contains__(self, item) -> bool:
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self.list()[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, AssignmentSet):
+            return self.list() == other.list()
+        if isinstance(other, (list, tuple)):
+            return self.list() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self.list())
+
+
+def _is_shift(task) -> bool:
+    return isinstance(task, Shift)
+
+
+def _is_task(task) -> bool:
+    return not isinstance(task, Shift) and isinstance(task, Task)
 
 
 class Employee:
+    __slots__ = ('first_name', 'last_name', 'name', 'abbreviation', 'role', '_id', '_created_at', '_updated_at', '_index', 'all_tasks')
+    _ids = itertools.count()
+
     def __init__(self, first_name: str, last_name: str, role: str = 'Uncategorized', abbreviation: str = ''):
         assert len(first_name) > 0, 'First name cannot be empty'
         assert len(last_name) > 0, 'Last name cannot be empty'
@@ -20,10 +121,15 @@ class Employee:
         self.name = first_name + " " + last_name
         self.abbreviation = abbreviation
         self.role = role
-        self._id = uuid.uuid4()
-        self._created_at = datetime.now()
-        self._updated_at = datetime.now()
-        self.all_tasks = []
+        self._id = next(Employee._ids)
+        self._created_at = self._updated_at = datetime.now()
+        self._index = None # column in the schedule's ShiftVariables, set when the model is built
+        self.all_tasks = AssignmentSet()
+
+    def __setstate__(self, state):
+        _set_slots(self, state)
+        if not isinstance(self.all_tasks, AssignmentSet):
+            self.all_tasks = AssignmentSet(self.all_tasks)
 
     @property
     def full_name(self) -> str:
@@ -31,19 +137,13 @@ class Employee:
 
     @property
     def shifts(self) -> list:
-        shifts = []
-        for task in self.all_tasks:
-            if isinstance(task, Shift):
-                shifts.append(task)
-        return shifts
+        # Cached by all_tasks until it changes, shared and not to be modified, see AssignmentSet.view
+        return self.all_tasks.view(_is_shift)
 
     @property
     def tasks(self) -> list:
-        tasks = []
-        for task in self.all_tasks:
-            if not isinstance(task, Shift) and isinstance(task, Task):
-                tasks.append(task)
-        return tasks
+        # Cached like shifts
+        return self.all_tasks.view(_is_task)
 
     def __repr__(self) -> str:
         return f"Employee('{self.name}', '{self.role}', {self.all_tasks})"
@@ -68,7 +168,7 @@ class Employee:
         self._updated_at = datetime.now()
 
     def reset_tasks(self):
-        self.all_tasks = []
+        self.all_tasks = AssignmentSet()
         self._updated_at = datetime.now()
 
     #TODO: fix task, all_tasks, and shifts
@@ -97,7 +197,20 @@ class Employee:
         return employees
 
 
+def _set_slots(obj, state) -> None:
+    # Pickles made before __slots__ hold a __dict__, newer ones a (None, slots) pair
+    if isinstance(state, tuple):
+        state = {**(state[0] or {}), **state[1]}
+    for key, value in state.items():
+        if key != 'end_time':
+            setattr(obj, key, value)
+
+
 class Task:
+    __slots__ = ('name', 'description', 'start_time', 'duration', '_id', '_created_at', '_updated_at')
+    # Ids of tasks and shifts
+    _ids = itertools.count()
+
     def __init__(self, name: str, description: str, start_time: datetime, duration: timedelta):
         
         self.name = name
@@ -105,10 +218,19 @@ class Task:
         assert duration >= timedelta(minutes=0), "duration must be greater than or equal to 0"
         self.start_time = start_time
         self.duration = duration
-        self.end_time = start_time + duration
-        self._id = uuid.uuid4()
-        self._created_at = datetime.now()
-        self._updated_at = datetime.now()
+        self._id = next(Task._ids)
+        self._created_at = self._updated_at = datetime.now()
+
+    def __setstate__(self, state):
+        _set_slots(self, state)
+
+    @property
+    def end_time(self) -> datetime:
+        return self.start_time + self.duration
+
+    @end_time.setter
+    def end_time(self, end_time: datetime) -> None:
+        self.duration = end_time - self.start_time
 
     def __repr__(self) -> str:
         return self.name + " " + str(self.start_time) + " " + str(self.end_time)
@@ -130,6 +252,7 @@ class Task:
     
 
 class Shift(Task):
+    __slots__ = ('shift_type', 'min_employees', 'max_employees', 'employees', '_index')
 
     def __init__(self, name: str, description: str, duration: timedelta, start_time: datetime, shift_type: str, min_employees: int = 1, max_employees: int = 1):
         super().__init__(name, description, start_time, duration)
@@ -139,9 +262,56 @@ class Shift(Task):
         assert max_employees >= 0, "max_employees must be greater than or equal to 0"
         self.min_employees = min_employees
         self.max_employees = max_employees
-        self.employees = []
+        self.employees = AssignmentSet()
+        self._index = None # row in the schedule's ShiftVariables, set when the model is built
         # self.date = start_time.date()
 
+    def __setstate__(self, state):
+        _set_slots(self, state)
+        if not isinstance(self.employees, AssignmentSet):
+            self.employees = AssignmentSet(self.employees)
+
+    @classmethod
+    def from_arrays(cls, names, descriptions, durations, start_times, shift_types, min_employees=1, max_employees=1) -> list['Shift']:
+        """Creates many shifts at once, with the checks of __init__ done on whole arrays.
+
+        Args:
+            names, descriptions: One string per shift.
+            durations: timedelta64 array or timedeltas.
+            start_times: datetime64 array or datetimes.
+            shift_types, min_employees, max_employees: One value per shift, or one for all of them.
+        """
+        start_times = np.asarray(start_times, dtype='datetime64[us]')
+        durations = np.asarray(durations, dtype='timedelta64[us]')
+        n = len(start_times)
+        shift_types = np.broadcast_to(np.asarray(shift_types, dtype=object), n)
+        min_employees = np.broadcast_to(np.asarray(min_employees), n)
+        max_employees = np.broadcast_to(np.asarray(max_employees), n)
+        if len(names) != n or len(descriptions) != n or len(durations) != n:
+            raise ValueError('names, descriptions, durations and start_times must have the same length')
+        assert (durations >= np.timedelta64(0, 'us')).all(), "duration must be greater than or equal to 0"
+        assert (min_employees <= max_employees).all(), "min_employees must be less than or equal to max_employees"
+        assert (min_employees >= 0).all(), "min_employees must be greater than or equal to 0"
+
+        now = datetime.now()
+        shifts = []
+        for name, description, duration, start_time, shift_type, low, high in zip(
+                names, descriptions, durations.tolist(), start_times.tolist(), shift_types.tolist(), min_employees.tolist(), max_employees.tolist()):
+            shift = cls.__new__(cls)
+            shift.name = name
+            shift.description = description
+            shift.start_time = start_time
+            shift.duration = duration
+            shift._id = next(Task._ids)
+            shift._created_at = shift._updated_at = now
+            shift.shift_type = str.lower(shift_type)
+            shift.min_employees = low
+            shift.max_employees = high
+            shift.employees = AssignmentSet()
+            shift._index = None
+            shifts.append(shift)
+        return shifts
+
     @property
     def day(self):
         return self.start_time.day
@@ -169,16 +339,296 @@ class Shift(Task):
         self._updated_at = datetime.now()
 
     def reset_employees(self):
-        self.employees = []
+        self.employees = AssignmentSet()
         self._updated_at = datetime.now()
 
 
 
+class ScheduleIndex:
+    """Lookup tables over the shifts of a schedule.
+
+    Maps date -> shifts, type -> shifts and (date, type) -> shifts, so the
+    constraint builders do not have to scan every shift for every employee and day.
+    """
+
+    def __init__(self, shifts=()):
+        self.by_date = {}
+        self.by_type = {}
+        self.by_date_type = {}
+        for shift in shifts:
+            self.add_shift(shift)
+
+    def add_shift(self, shift: Shift) -> None:
+        self.by_date.setdefault(shift.date, []).append(shift)
+        self.by_type.setdefault(shift.type, []).append(shift)
+        self.by_date_type.setdefault((shift.date, shift.type), []).append(shift)
+
+    def remove_shift(self, shift: Shift) -> None:
+        self.by_date[shift.date].remove(shift)
+        self.by_type[shift.type].remove(shift)
+        self.by_date_type[(shift.date, shift.type)].remove(shift)
+
+    @staticmethod
+    def _types(types) -> tuple:
+        return (types,) if isinstance(types, str) else tuple(types)
+
+    def shifts_on(self, date) -> list[Shift]:
+        return self.by_date.get(date, [])
+
+    def shifts_of_type(self, types) -> list[Shift]:
+        return [shift for shift_type in self._types(types) for shift in self.by_type.get(shift_type, [])]
+
+    def shifts_on_type(self, date, types) -> list[Shift]:
+        return [shift for shift_type in self._types(types) for shift in self.by_date_type.get((date, shift_type), [])]
+
+
+class ShiftTypeConflicts:
+    """Same-day shift type conflicts compiled into cliques.
+
+    matrix[i][j] == 0 means that an employee cannot work a labels[i] and a labels[j] shift on the
+    same day. The conflicting pairs are covered greedily by cliques of types, so a clique becomes
+    one "at most one of these shifts" constraint per employee and day instead of one constraint
+    per pair of shifts. The compiled cliques are cached per matrix.
+
+    Args:
+        labels: The shift types of the rows and columns of matrix.
+        matrix: The compatibility matrix, 1 if the two types can be worked on the same day.
+    """
+
+    __compiled = {}
+
+    def __init__(self, labels, matrix):
+        key = (tuple(labels), tuple(map(tuple, matrix)))
+        if key not in self.__compiled:
+            self.__compiled[key] = self.__compile(*key)
+        self.labels = {label: i for i, label in enumerate(key[0])}
+        # (types, exclusive): exclusive cliques allow one shift of all their types, the others
+        # only forbid pairs of shifts of different types
+        self.cliques = self.__compiled[key]
+
+    @staticmethod
+    def __compile(labels: tuple, matrix: tuple) -> list[tuple]:
+        n = len(labels)
+        for i in range(n):
+            if len(matrix[i]) != n:
+                raise ValueError(f'Invalid value for matrix: row {labels[i]} has {len(matrix[i])} columns')
+        conflicts = [[not matrix[i][j] or not matrix[j][i] for j in range(n)] for i in range(n)]
+        uncovered = {(i, j) for i in range(n) for j in range(i, n) if conflicts[i][j]}
+        cliques = []
+        while uncovered:
+            # Grow a clique from the uncovered conflict touching the most uncovered conflicts
+            degree = [sum(1 for edge in uncovered if k in edge) for k in range(n)]
+            i, j = max(sorted(uncovered), key=lambda edge: degree[edge[0]] + degree[edge[1]])
+            clique = [i] if i == j else [i, j]
+            # Two shifts of a type that doesn't conflict with itself may be worked on the same
+            # day, so such a type only gets a pair of its own
+            exclusive = all(conflicts[k][k] for k in clique)
+            if exclusive:
+                for k in sorted(range(n), key=lambda k: -degree[k]):
+                    if k not in clique and conflicts[k][k] and all(conflicts[k][m] for m in clique):
+                        clique.append(k)
+            clique.sort()
+            uncovered -= {(a, b) for a in clique for b in clique if a <= b}
+            cliques.append((tuple(labels[k] for k in clique), exclusive))
+        return cliques
+
+    def groups(self, clique: tuple, exclusive: bool, shifts: list[Shift]) -> list[list[Shift]]:
+        """The groups of the given shifts of which an employee can work at most one."""
+        shifts = [shift for shift in shifts if shift.type in clique]
+        if exclusive:
+            return [shifts] if len(shifts) > 1 else []
+        return [[shift1, shift2] for k, shift1 in enumerate(shifts) for shift2 in shifts[k + 1:] if shift1.type != shift2.type]
+
+
+class AvailabilityBitmap:
+    """Unavailable time of every employee as a bitmap over discrete time slots.
+
+    The slots are the intervals between consecutive start / end times of the employees' tasks
+    and of the shifts, so every task covers whole slots. The bitmap is filled from all the
+    tasks at once with a prefix sum, and the availability of every (shift, employee) pair is
+    then read with one indexing step.
+
+    Args:
+        employees: The employees, row j of the bitmap is employees[j].
+        shifts: The shifts to compute the availability of.
+    """
+
+    def __init__(self, employees: list[Employee], shifts: list[Shift]):
+        rows, starts, ends = [], [], []
+        for j, employee in enumerate(employees):
+            for task in employee.tasks:
+                rows.append(j)
+                starts.append(task.start_time)
+                ends.append(task.end_time)
+        rows = np.array(rows, dtype=np.intp)
+        starts, ends = self.__times(starts), self.__times(ends)
+        shift_starts = self.__times([shift.start_time for shift in shifts])
+        shift_ends = self.__times([shift.end_time for shift in shifts])
+
+        # Slot k is [edges[k], edges[k + 1])
+        self.edges = np.unique(np.concatenate([starts, ends, shift_starts, shift_ends]))
+        counts = np.zeros((len(employees), len(self.edges) + 1), dtype=np.int32)
+        np.add.at(counts, (rows, np.searchsorted(self.edges, starts)), 1)
+        np.add.at(counts, (rows, np.searchsorted(self.edges, ends)), -1)
+        self.bitmap = np.cumsum(counts, axis=1)[:, :-1] > 0
+
+        # Same rule as Employee.is_available: unavailable if the shift starts in [start, end) or
+        # ends in (start, end] of a task, i.e. the slot starting at the shift's start or the
+        # slot ending at the shift's end is covered
+        first = np.searchsorted(self.edges, shift_starts)
+        last = np.searchsorted(self.edges, shift_ends) - 1
+        busy = self.bitmap[:, first] | (self.bitmap[:, np.maximum(last, 0)] & (last >= 0))
+        self.available = ~busy.T
+
+    @staticmethod
+    def __times(times: list[datetime]) -> np.ndarray:
+        return np.array(times, dtype='datetime64[us]').astype(np.int64)
+
+
+
+class ShiftVariables:
+    """Assignment variables stored as a dense shift x employee matrix.
+
+    Row i belongs to the shift with _index i and column j to the employee with _index j,
+    so per-employee, per-shift and per-day groups of variables are plain NumPy slices.
+    Only the pairs marked in eligible get a variable, the other cells hold one shared
+    constant 0, so the constraint builders can still treat the matrix as dense. Pairs
+    marked in fixed hold a shared constant 1 instead of a variable.
+    """
+
+    def __init__(self, model: cp_model.CpModel, shifts: list[Shift], employees: list[Employee], eligible: np.ndarray = None, fixed: np.ndarray = None):
+        self.shifts = list(shifts)
+        self.employees = list(employees)
+        self.reindex()
+
+        shape = (len(self.shifts), len(self.employees))
+        self.eligible = np.ones(shape, dtype=bool) if eligible is None else np.asarray(eligible, dtype=bool)
+        self.fixed = np.zeros(shape, dtype=bool) if fixed is None else np.asarray(fixed, dtype=bool)
+        assert self.eligible.shape == shape and self.fixed.shape == shape, 'eligible and fixed must be shifts x employees matrices'
+        # Pairs with a variable of their own
+        self.variable = self.eligible & ~self.fixed
+        self.zero = model.NewConstant(0)
+        self.one = model.NewConstant(1)
+        self.vars = np.full(shape, self.zero, dtype=object)
+        self.vars[self.fixed] = self.one
+        for i, j in zip(*np.nonzero(self.variable)):
+            self.vars[i, j] = model.NewBoolVar('shift_{}_employee_{}'.format(self.shifts[i].name, self.employees[j].name))
+        # Positions of the variables in the model proto, used to read a whole solution at once
+        self.indices = np.array([[var.Index() for var in row] for row in self.vars], dtype=np.int64).reshape(self.vars.shape)
+
+    @property
+    def shape(self) -> tuple:
+        return self.vars.shape
+
+    def reindex(self) -> None:
+        """Sets the _index of the shifts and employees to their row and column, again if another
+        model sharing them was built since."""
+        for i, shift in enumerate(self.shifts):
+            shift._index = i
+        for j, employee in enumerate(self.employees):
+            employee._index = j
+
+    def covers(self, eligible: np.ndarray, assigned: np.ndarray = None) -> bool:
+        """True if every pair marked in eligible has a variable, and every fixed pair is still marked in assigned."""
+        eligible = np.asarray(eligible, dtype=bool)
+        if (eligible & ~self.eligible).any():
+            return False
+        return assigned is None or not (self.fixed & ~np.asarray(assigned, dtype=bool)).any()
+
+    def is_constant(self, var) -> bool:
+        return var is self.zero or var is self.one
+
+    def bounds(self, variables) -> tuple:
+        """Smallest and largest possible sum of the variables."""
+        variables = list(np.ravel(variables))
+        ones = sum(1 for var in variables if var is self.one)
+        return ones, len(variables) - sum(1 for var in variables if var is self.zero)
+
+    def __getitem__(self, key):
+        shift, employee = key
+        return self.vars[shift._index, employee._index]
+
+    def shift(self, shift: Shift) -> np.ndarray:
+        """Variables of one shift, one per employee."""
+        return self.vars[shift._index]
+
+    def employee(self, employee: Employee) -> np.ndarray:
+        """Variables of one employee, one per shift."""
+        return self.vars[:, employee._index]
+
+    def rows(self, shifts: list[Shift]) -> np.ndarray:
+        """Sub-matrix of the given shifts (len(shifts) x employees)."""
+        return self.vars[np.array([shift._index for shift in shifts], dtype=np.intp)]
+
+    def block(self, shifts: list[Shift], employee: Employee) -> np.ndarray:
+        """Variables of the given shifts for one employee."""
+        return self.rows(shifts)[:, employee._index]
+
+    def sum(self, variables):
+        # The constants are folded, so the sum only has the variables' terms
+        variables = list(np.ravel(variables))
+        terms = [var for var in variables if var is not self.zero and var is not self.one]
+        ones = len(variables) - len(terms) - sum(1 for var in variables if var is self.zero)
+        return cp_model.LinearExpr.Sum(terms) + ones if ones else cp_model.LinearExpr.Sum(terms)
+
+    def values(self, solution) -> np.ndarray:
+        """Assignment matrix (0/1) of a solution, e.g. solver.ResponseProto().solution."""
+        return np.asarray(solution, dtype=np.int64)[self.indices]
+
+
+
+class SolverConfig:
+    """CP-SAT settings used by Schedule.solve.
+
+    Args:
+        workers: Number of parallel search workers, defaults to os.cpu_count().
+        preset: Name of a parameter preset in PRESETS, trading latency against solution quality.
+        seed: Random seed of the search.
+        relative_gap_limit: Stop a phase once its objective is within this relative gap of the best bound.
+            Overrides the preset's value.
+        log_search_progress: If True, CP-SAT logs its search progress.
+    """
+
+    PRESETS = {
+        # No LP relaxation or symmetry detection, stop a phase within 5 % of the bound
+        'fast-feasible': {'linearization_level': 0, 'symmetry_level': 0, 'relative_gap_limit': 0.05},
+        # CP-SAT defaults
+        'balanced': {},
+        # Stronger relaxation and symmetry handling to close the gap
+        'prove-optimal': {'linearization_level': 2, 'symmetry_level': 2, 'relative_gap_limit': 0.0},
+    }
+
+    def __init__(self, workers: int = None, preset: str = 'balanced', seed: int = None, relative_gap_limit: float = None, log_search_progress: bool = False):
+        if preset not in self.PRESETS:
+            raise ValueError(f'Invalid value for preset: {preset}')
+        assert workers is None or workers >= 1, 'workers must be greater than or equal to 1'
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.preset = preset
+        self.seed = seed
+        self.relative_gap_limit = relative_gap_limit
+        self.log_search_progress = log_search_progress
+
+    def __repr__(self) -> str:
+        return f"SolverConfig(workers={self.workers}, preset='{self.preset}', seed={self.seed}, relative_gap_limit={self.relative_gap_limit})"
+
+    def apply(self, solver: cp_model.CpSolver) -> cp_model.CpSolver:
+        for name, value in self.PRESETS[self.preset].items():
+            setattr(solver.parameters, name, value)
+        solver.parameters.num_search_workers = self.workers
+        if self.seed is not None:
+            solver.parameters.random_seed = self.seed
+        if self.relative_gap_limit is not None:
+            solver.parameters.relative_gap_limit = self.relative_gap_limit
+        solver.parameters.log_search_progress = self.log_search_progress
+        return solver
+
+
+
 # Solution printer.
 class ShiftSolutionPrinter(cp_model.CpSolverSolutionCallback):
     """Print intermediate solutions."""
 
-    def __init__(self, shift_vars: dict, shifts: list[Shift], employees: list[Employee], penalties, start_time: datetime, end_time: datetime):
+    def __init__(self, shift_vars: ShiftVariables, shifts: list[Shift], employees: list[Employee], penalties, start_time: datetime, end_time: datetime):
         cp_model.CpSolverSolutionCallback.__init__(self)
         self.__shift_vars = shift_vars
         self.__shifts = shifts
@@ -189,6 +639,11 @@ class ShiftSolutionPrinter(cp_model.CpSolverSolutionCallback):
         self.__start_time = start_time
         self.__end_time = end_time
 
+        # Group the shifts by type once, not on every solution
+        self.__shift_by_type = {}
+        for shift in shifts:
+            self.__shift_by_type.setdefault(shift.shift_type, []).append(shift)
+
     @property
     def dates(self):
         return pd.date_range(self.__start_time, self.__end_time, freq='D')
@@ -197,20 +652,14 @@ class ShiftSolutionPrinter(cp_model.CpSolverSolutionCallback):
 
         # Create a dataframe with the dates as the index and the shift types as the columns
         shift_schedule = pd.DataFrame(index=self.dates, columns=[shift_type for shift_type in self.__shift_types])
-        shift_by_type = {}
-        # Optimized version
-        for shift in self.__shifts:
-            if shift.shift_type in shift_by_type:
-                shift_by_type[shift.shift_type].append(shift)
-            else:
-                shift_by_type[shift.shift_type] = [shift]
+        shift_by_type = self.__shift_by_type
 
         # Fill the dataframe with the employees assigned to each shift, if no shift is assigned, fill with 'Unassigned'
         for date in self.dates:
             for shift_type in shift_by_type:
                 for shift in shift_by_type[shift_type]:
                     if shift.start_time.date() == date:
-                        shift_schedule.loc[date, shift_type] = [employee.first_name for employee in self.__employees if self.Value(self.__shift_vars[(shift, employee)]) == 1]
+                        shift_schedule.loc[date, shift_type] = [employee.first_name for employee, var in zip(self.__employees, self.__shift_vars.shift(shift)) if self.Value(var) == 1]
 
         # Fill nan values with '' (empty string)
         shift_schedule = shift_schedule.fillna('')
@@ -222,7 +671,7 @@ class ShiftSolutionPrinter(cp_model.CpSolverSolutionCallback):
             
         for employee in self.__employees:
             for shift_type in self.__shift_types:
-                schedule_workload.loc[employee.name, shift_type] = len([shift for shift in shift_by_type[shift_type] if self.Value(self.__shift_vars[(shift, employee)]) == 1])
+                schedule_workload.loc[employee.name, shift_type] = len([var for var in self.__shift_vars.block(shift_by_type[shift_type], employee) if self.Value(var) == 1])
         
         # clear_output(wait=True)
         print('Solution %i' % self.__solution_count)
@@ -235,7 +684,792 @@ class ShiftSolutionPrinter(cp_model.CpSolverSolutionCallback):
 
 
 
+class ShiftSolutionStream(cp_model.CpSolverSolutionCallback):
+    """Lightweight solution callback that streams compact assignment arrays.
+
+    Every improving solution is read from the variable matrix in one indexing step and passed
+    on as a dict with the solution number, objective value, wall time and a (shifts x employees)
+    uint8 assignment array. Solutions go to sink if one is given, otherwise to a bounded queue
+    that keeps the most recent maxsize solutions. DataFrames are only built on demand by
+    to_frame and workload.
+
+    The stream is bound to the schedule's variables by Schedule.solve(callback=stream).
+    """
+
+    def __init__(self, sink=None, maxsize: int = 10):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.__sink = sink
+        self.__shift_vars = None
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.last = None
+        self.__solution_count = 0
+
+    def bind(self, shift_vars: ShiftVariables) -> None:
+        self.__shift_vars = shift_vars
+
+    def on_solution_callback(self):
+        self.__solution_count += 1
+        solution = {
+            'solution': self.__solution_count,
+            'objective': self.ObjectiveValue(),
+            'wall_time': self.WallTime(),
+            'assignment': self.__shift_vars.values(self.Response().solution).astype(np.uint8),
+        }
+        self.last = solution
+        if self.__sink is not None:
+            self.__sink(solution)
+            return
+        # Keep the most recent solutions, dropping the oldest one when the queue is full
+        while True:
+            try:
+                self.queue.put_nowait(solution)
+                break
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def solution_count(self):
+        return self.__solution_count
+
+    def to_frame(self, assignment: np.ndarray = None) -> pd.DataFrame:
+        """Dates x shift types table of the employees' first names (last solution by default)."""
+        if assignment is None:
+            assignment = self.last['assignment']
+        shifts, employees = self.__shift_vars.shifts, self.__shift_vars.employees
+        cells = {}
+        for i, j in zip(*np.nonzero(assignment)):
+            cells.setdefault((shifts[i].date, shifts[i].shift_type), []).append(employees[j].first_name)
+        dates = sorted(set(shift.date for shift in shifts))
+        shift_types = sorted(set(shift.shift_type for shift in shifts))
+        return pd.DataFrame([[cells.get((date, shift_type), '') for shift_type in shift_types] for date in dates], index=dates, columns=shift_types)
+
+    def workload(self, assignment: np.ndarray = None) -> pd.DataFrame:
+        """Employees x shift types table of assignment counts (last solution by default)."""
+        if assignment is None:
+            assignment = self.last['assignment']
+        shifts, employees = self.__shift_vars.shifts, self.__shift_vars.employees
+        shift_types = np.array([shift.shift_type for shift in shifts])
+        columns = sorted(set(shift_types))
+        counts = np.stack([assignment[shift_types == shift_type].sum(axis=0) for shift_type in columns], axis=1) if columns else np.zeros((len(employees), 0), dtype=int)
+        return pd.DataFrame(counts, index=[employee.name for employee in employees], columns=columns)
+
+
+
+class MetricsSink(abc.ABC):
+    """Receives the build spans and solver phases of Schedule.solve(metrics=sink).
+
+    Events are dicts with 'type' ('span' or 'phase'), 'schedule' and 'name'. Spans have
+    'wall_time', 'variables' and 'constraints' (added by the span), phases have the keys of
+    Schedule.phases: 'status', 'objective', 'best_bound', 'wall_time', 'conflicts' and 'branches'.
+    """
+
+    @abc.abstractmethod
+    def record(self, event: dict) -> None:
+        pass
+
+
+class InMemoryMetrics(MetricsSink):
+    """Keeps the events in a list."""
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, event: dict) -> None:
+        self.events.append(event)
+
+    def spans(self) -> list[dict]:
+        return [event for event in self.events if event['type'] == 'span']
+
+    def phases(self) -> list[dict]:
+        return [event for event in self.events if event['type'] == 'phase']
+
+    def to_frame(self, type: str = 'span') -> pd.DataFrame:
+        return pd.DataFrame([event for event in self.events if event['type'] == type])
+
+
+class JSONLinesMetrics(MetricsSink):
+    """Appends every event as a JSON line to a file, with the time it was recorded."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def record(self, event: dict) -> None:
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'timestamp': time.time(), **event}) + '\n')
+
+
+class PrometheusMetrics(MetricsSink):
+    """Aggregates the events as Prometheus metrics, see render for the text exposition format.
+
+    Gauges hold the values of the last build and solve, the *_seconds_total counters add up
+    the time of all of them.
+    """
+
+    __help = {
+        'scheduler_build_span_seconds': ('gauge', 'Time of the last build of a constraint family'),
+        'scheduler_build_span_variables': ('gauge', 'Variables added by the last build of a constraint family'),
+        'scheduler_build_span_constraints': ('gauge', 'Constraints added by the last build of a constraint family'),
+        'scheduler_build_span_seconds_total': ('counter', 'Time of all the builds of a constraint family'),
+        'scheduler_phase_seconds': ('gauge', 'Wall time of the last solve of a phase'),
+        'scheduler_phase_objective': ('gauge', 'Objective value of the last solve of a phase'),
+        'scheduler_phase_best_bound': ('gauge', 'Best objective bound of the last solve of a phase'),
+        'scheduler_phase_conflicts': ('gauge', 'Conflicts of the last solve of a phase'),
+        'scheduler_phase_branches': ('gauge', 'Branches of the last solve of a phase'),
+        'scheduler_phase_status': ('gauge', 'Status of the last solve of a phase, 1 for the current status'),
+        'scheduler_phase_seconds_total': ('counter', 'Wall time of all the solves of a phase'),
+    }
+
+    def __init__(self):
+        self.samples = {}
+
+    def __set(self, metric, labels, value, add=False):
+        key = (metric, tuple(sorted(labels.items())))
+        self.samples[key] = self.samples.get(key, 0) + value if add else value
+
+    def record(self, event: dict) -> None:
+        if event['type'] == 'span':
+            labels = {'schedule': event['schedule'], 'span': event['name']}
+            self.__set('scheduler_build_span_seconds', labels, event['wall_time'])
+            self.__set('scheduler_build_span_variables', labels, event['variables'])
+            self.__set('scheduler_build_span_constraints', labels, event['constraints'])
+            self.__set('scheduler_build_span_seconds_total', labels, event['wall_time'], add=True)
+        elif event['type'] == 'phase':
+            labels = {'schedule': event['schedule'], 'phase': event['name']}
+            self.__set('scheduler_phase_seconds', labels, event['wall_time'])
+            self.__set('scheduler_phase_seconds_total', labels, event['wall_time'], add=True)
+            for field in ('objective', 'best_bound', 'conflicts', 'branches'):
+                if event[field] is not None:
+                    self.__set(f'scheduler_phase_{field}', labels, event[field])
+            for key in [key for key in self.samples if key[0] == 'scheduler_phase_status' and set(labels.items()) <= set(key[1])]:
+                self.samples[key] = 0
+            self.__set('scheduler_phase_status', {**labels, 'status': event['status']}, 1)
+
+    @staticmethod
+    def __label(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric, (kind, help) in self.__help.items():
+            samples = [(labels, value) for (name, labels), value in self.samples.items() if name == metric]
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric} {help}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{self.__label(label)}"' for key, label in labels)
+                lines.append(f'{metric}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Writes the metrics to a file, e.g. for the node exporter's textfile collector."""
+        # Written to a temporary file first so that the collector never reads a partial file
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.render())
+        os.replace(path + '.tmp', path)
+
+
+class BuildSpans:
+    """Times consecutive sections of a model build and counts the variables and constraints they add.
+
+    begin(name) ends the running span, if any, and starts the next one, end() ends the last one.
+
+    Args:
+        model: The CP-SAT model being built.
+        record: Called with every ended span as a 'span' event.
+    """
+
+    def __init__(self, model: cp_model.CpModel, record=None):
+        self.__proto = model.Proto()
+        self.__record = record
+        self.__current = None
+        self.spans = []
+
+    def begin(self, name: str) -> None:
+        self.end()
+        self.__current = (name, time.perf_counter(), len(self.__proto.variables), len(self.__proto.constraints))
+
+    def end(self) -> None:
+        if self.__current is None:
+            return
+        name, start, variables, constraints = self.__current
+        span = {
+            'type': 'span',
+            'name': name,
+            'wall_time': time.perf_counter() - start,
+            'variables': len(self.__proto.variables) - variables,
+            'constraints': len(self.__proto.constraints) - constraints,
+        }
+        self.__current = None
+        self.spans.append(span)
+        if self.__record is not None:
+            self.__record(span)
+
+
+class ComponentRelay(MetricsSink):
+    """Forwards the progress and metrics of a component solved on a worker thread to the
+    callbacks of the whole schedule.
+
+    Every phase and event is tagged with the index of the component, and the calls of all the
+    components are serialized by their shared lock, so the callbacks never run concurrently.
+
+    Args:
+        component: The index of the component.
+        lock: The lock shared by the components of a solve.
+        progress: The progress callback of the schedule, if any.
+        metrics: The MetricsSink of the schedule, if any.
+    """
+
+    def __init__(self, component: int, lock: threading.Lock, progress=None, metrics: MetricsSink = None):
+        self.component = component
+        self.__lock = lock
+        self.__progress = progress
+        self.__metrics = metrics
+
+    def progress(self, phase: dict) -> None:
+        if self.__progress is not None:
+            with self.__lock:
+                self.__progress({**phase, 'component': self.component})
+
+    def record(self, event: dict) -> None:
+        if self.__metrics is not None:
+            with self.__lock:
+                self.__metrics.record({**event, 'component': self.component})
+
+
+class ThreadOutput(io.TextIOBase):
+    """Stream that keeps apart the output of threads running concurrently.
+
+    Inside capture(key), whatever a thread writes goes to the buffer of key in buffers, the
+    writes of other threads go to stream. Used as sys.stdout while the components of a schedule
+    are solved, so their output can be printed one component after the other.
+
+    Args:
+        stream: The stream receiving the writes outside of capture.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+        self.__local = threading.local()
+
+    @contextlib.contextmanager
+    def capture(self, key):
+        self.__local.buffer = self.buffers.setdefault(key, io.StringIO())
+        try:
+            yield self.__local.buffer
+        finally:
+            self.__local.buffer = None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.__local, 'buffer', None)
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+class ScheduleSnapshot:
+    """Binary snapshot of a schedule: an employee table, a shift table and the assignments as arrays.
+
+    The file starts with MAGIC, the length of a JSON header and the header, which holds the
+    schedule's scalar fields and the dtype, shape and offset of every array. The arrays follow,
+    64-byte aligned, so they can be memory-mapped and only the rows of a date range need to be
+    read. Shifts and employees are referenced by their row in the tables.
+
+    Args:
+        path: The snapshot file.
+        mmap: If True, the arrays are memory-mapped instead of read into memory.
+    """
+
+    MAGIC = b'SHIFTSNP'
+    VERSION = 1
+    __alignment = 64
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError(f'Invalid value for path: {path} is not a schedule snapshot')
+            header_length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+            self.header = json.loads(f.read(header_length))
+        if self.header['version'] != self.VERSION:
+            raise ValueError(f'Invalid value for version: {self.header["version"]}')
+        self.arrays = {}
+        for name, (dtype, shape, offset) in self.header['arrays'].items():
+            if mmap and math.prod(shape) > 0:
+                self.arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+            else:
+                self.arrays[name] = np.fromfile(path, dtype=dtype, count=math.prod(shape), offset=offset).reshape(shape)
+
+    @classmethod
+    def is_snapshot(cls, path: str) -> bool:
+        with open(path, 'rb') as f:
+            return f.read(len(cls.MAGIC)) == cls.MAGIC
+
+    @staticmethod
+    def __times(times) -> np.ndarray:
+        return np.array(times, dtype='datetime64[us]').astype(np.int64)
+
+    @staticmethod
+    def __datetimes(values) -> list[datetime]:
+        return np.asarray(values, dtype=np.int64).astype('datetime64[us]').astype(object).tolist()
+
+    @staticmethod
+    def __strings(values) -> np.ndarray:
+        # Fixed width unicode, so the column can be memory-mapped like the numeric ones
+        return np.array(list(values), dtype=str) if len(values) else np.array([], dtype='<U1')
+
+    @classmethod
+    def write(cls, schedule: 'Schedule', path: str) -> None:
+        """Writes the snapshot of schedule to path."""
+        employees = schedule.employees
+        columns = {employee: j for j, employee in enumerate(employees)}
+        tasks = [(j, task) for j, employee in enumerate(employees) for task in employee.tasks]
+        shift_types = sorted(set(shift.shift_type for shift in schedule.shifts))
+        type_codes = {shift_type: k for k, shift_type in enumerate(shift_types)}
+        assignments = [(i, columns[employee]) for i, shift in enumerate(schedule.shifts) for employee in shift.employees if employee in columns]
+
+        arrays = {
+            'employee_first_name': cls.__strings([employee.first_name for employee in employees]),
+            'employee_last_name': cls.__strings([employee.last_name for employee in employees]),
+            'employee_role': cls.__strings([employee.role for employee in employees]),
+            'employee_abbreviation': cls.__strings([employee.abbreviation for employee in employees]),
+            'task_employee': np.array([j for j, _ in tasks], dtype=np.int32),
+            'task_start': cls.__times([task.start_time for _, task in tasks]),
+            'task_duration': np.array([task.duration // timedelta(microseconds=1) for _, task in tasks], dtype=np.int64),
+            'task_name': cls.__strings([task.name for _, task in tasks]),
+            'task_description': cls.__strings([task.description for _, task in tasks]),
+            'shift_name': cls.__strings([shift.name for shift in schedule.shifts]),
+            'shift_description': cls.__strings([shift.description for shift in schedule.shifts]),
+            'shift_start': cls.__times([shift.start_time for shift in schedule.shifts]),
+            'shift_duration': np.array([shift.duration // timedelta(microseconds=1) for shift in schedule.shifts], dtype=np.int64),
+            'shift_type': np.array([type_codes[shift.shift_type] for shift in schedule.shifts], dtype=np.int32),
+            'shift_min_employees': np.array([shift.min_employees for shift in schedule.shifts], dtype=np.int32),
+            'shift_max_employees': np.array([shift.max_employees for shift in schedule.shifts], dtype=np.int32),
+            # (shift, employee) rows of every assignment
+            'assignment': np.array(assignments, dtype=np.int32).reshape(len(assignments), 2),
+        }
+
+        # Offsets are relative to the data section until the header length is known
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            layout[name] = [array.dtype.str, list(array.shape), offset]
+            offset += -(-array.nbytes // cls.__alignment) * cls.__alignment
+        header = {
+            'version': cls.VERSION,
+            'name': schedule.name,
+            'start_time': schedule.start_time.isoformat(),
+            'end_time': schedule.end_time.isoformat(),
+            'holidays': [holiday.isoformat() for holiday in schedule.holidays],
+            'shift_group_sum': [[bound, types, value] for (bound, types), value in schedule.shift_group_sum.items()],
+            'holiday_sum': dict(schedule.holiday_sum),
+            'carry': [[columns[employee], key, count] for employee, counts in schedule.carry.items() if employee in columns for key, count in counts.items()],
+            'frozen_until': schedule.frozen_until.isoformat() if schedule.frozen_until is not None else None,
+            'shift_types': shift_types,
+        }
+        prefix = len(cls.MAGIC) + 8
+        data_start = 0
+        while True:
+            header['arrays'] = {name: [dtype, shape, data_start + start] for name, (dtype, shape, start) in layout.items()}
+            encoded = json.dumps(header).encode()
+            aligned = -(-(prefix + len(encoded)) // cls.__alignment) * cls.__alignment
+            if aligned == data_start:
+                break
+            data_start = aligned
+
+        with open(path + '.tmp', 'wb') as f:
+            f.write(cls.MAGIC)
+            f.write(np.array([len(encoded)], dtype='<u8').tobytes())
+            f.write(encoded)
+            for name, array in arrays.items():
+                f.seek(header['arrays'][name][2])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + offset)
+        os.replace(path + '.tmp', path)
+
+    def to_schedule(self, start: datetime = None, end: datetime = None) -> 'Schedule':
+        """Builds the schedule, or only the part of it between start and end.
+
+        Args:
+            start: Only the shifts starting at or after start are read, defaults to the schedule's start.
+            end: Only the shifts starting before end are read, defaults to all the remaining shifts.
+        Returns:
+            A schedule with all the employees, their tasks overlapping the range, and the shifts in
+            the range with their assignments. Its start and end time are clipped to the range,
+            frozen_until, carry and the quotas are those of the whole schedule. A range that
+            leaves no time of the schedule, e.g. one outside of it, raises a ValueError.
+        """
+        header, arrays = self.header, self.arrays
+        start_time = datetime.fromisoformat(header['start_time'])
+        end_time = datetime.fromisoformat(header['end_time'])
+        low = self.__times([start])[0] if start is not None else np.iinfo(np.int64).min
+        high = self.__times([end])[0] if end is not None else np.iinfo(np.int64).max
+
+        clipped_start = max(start_time, start) if start is not None else start_time
+        clipped_end = min(end_time, end - timedelta(microseconds=1)) if end is not None else end_time
+        if clipped_start >= clipped_end:
+            raise ValueError(f'Invalid value for start, end: [{start}, {end}) is outside of the schedule from {start_time} to {end_time}')
+        schedule = Schedule(header['name'], clipped_start, clipped_end)
+        schedule._holidays = [holiday for holiday in map(datetime.fromisoformat, header['holidays'])
+                              if schedule.start_time <= holiday <= schedule.end_time]
+        schedule.shift_group_sum = {(bound, types if isinstance(types, str) else tuple(types)): value for bound, types, value in header['shift_group_sum']}
+
+        employees = [Employee(first_name, last_name, role, abbreviation) for first_name, last_name, role, abbreviation in zip(
+            arrays['employee_first_name'].tolist(), arrays['employee_last_name'].tolist(), arrays['employee_role'].tolist(), arrays['employee_abbreviation'].tolist())]
+        for employee in employees:
+            schedule.add_employee(employee)
+        schedule.holiday_sum = dict(header.get('holiday_sum', Schedule.HOLIDAY_SUM))
+        for j, key, count in header.get('carry', []):
+            schedule.carry.setdefault(employees[j], {})[key if isinstance(key, str) else tuple(key)] = count
+        if header.get('frozen_until') is not None:
+            schedule.frozen_until = datetime.fromisoformat(header['frozen_until'])
+
+        task_start, task_duration = arrays['task_start'], arrays['task_duration']
+        rows = np.nonzero((task_start < high) & (task_start + task_duration > low))[0]
+        for row, start_time, duration in zip(rows.tolist(), self.__datetimes(task_start[rows]), task_duration[rows].tolist()):
+            employees[arrays['task_employee'][row]].add_task(Task(str(arrays['task_name'][row]), str(arrays['task_description'][row]), start_time, timedelta(microseconds=duration)))
+
+        shift_start = arrays['shift_start']
+        rows = np.nonzero((shift_start >= low) & (shift_start < high))[0]
+        shift_types = np.array(header['shift_types'], dtype=object)
+        created = Shift.from_arrays(arrays['shift_name'][rows].tolist(), arrays['shift_description'][rows].tolist(),
+                                    arrays['shift_duration'][rows].astype('timedelta64[us]'), shift_start[rows].astype('datetime64[us]'),
+                                    shift_types[arrays['shift_type'][rows]], arrays['shift_min_employees'][rows], arrays['shift_max_employees'][rows])
+        shifts = {}
+        for row, shift in zip(rows.tolist(), created):
+            shifts[row] = schedule.add_shift(shift)
+        assignment = arrays['assignment']
+        for i, j in assignment[np.isin(assignment[:, 0], rows)].tolist():
+            schedule.assign_shift(shifts[i], employees[j])
+        return schedule
+
+
+class GreedyScheduler:
+    """Fast heuristic schedule: a constructive greedy pass followed by a local search.
+
+    The cost of an assignment is a weighted count of violated rules: coverage, the
+    shift_group_sum and holiday_sum quotas (with carry) first, then the shift type conflicts and
+    the limit of two shifts per day, then one shift per day and the consecutive days rule, in the
+    priority order of Schedule.solve. Employees are only assigned to shifts they are available
+    for, and the assignments already in shift.employees are kept.
+
+    Args:
+        schedule: The schedule to assign, it is not modified until apply is called.
+        time_limit: Time limit of the local search in seconds.
+        seed: Seed of the random moves of the local search.
+    """
+
+    # Weights of the rule tiers in the cost
+    HARD, SOFT, OBJECTIVE = 10000, 100, 1
+    # Batches of 100 moves without an improvement after which the local search stops
+    PATIENCE = 50
+
+    def __init__(self, schedule: 'Schedule', time_limit: float = 0.2, seed: int = 0):
+        self.schedule = schedule
+        self.time_limit = time_limit
+        self.random = np.random.default_rng(seed)
+        self.shifts = list(schedule.shifts)
+        self.employees = list(schedule.employees)
+        columns = {employee: j for j, employee in enumerate(self.employees)}
+
+        self.available = AvailabilityBitmap(self.employees, self.shifts).available
+        if schedule.frozen_until is not None:
+            self.available[[shift.start_time < schedule.frozen_until for shift in self.shifts]] = False
+        self.fixed = [{columns[employee] for employee in shift.employees if employee in columns} for shift in self.shifts]
+        self.candidates = [np.nonzero(self.available[i])[0].tolist() for i in range(len(self.shifts))]
+
+        # Quota bounds per group of shift types, from shift_group_sum
+        self.groups = []
+        bounds = {}
+        for (bound, types), value in schedule.shift_group_sum.items():
+            if types not in bounds:
+                bounds[types] = {}
+                self.groups.append(types)
+            bounds[types][bound] = value
+        self.bounds = [bounds[types] for types in self.groups]
+        self.carry = [[schedule.carry.get(employee, {}).get(types, 0) for types in self.groups] for employee in self.employees]
+        self.holiday_carry = [schedule.carry.get(employee, {}).get(Schedule.HOLIDAYS, 0) for employee in self.employees]
+
+        # Rules touched by every shift
+        holiday_dates = set(schedule.holiday_dates)
+        conflicts = {}
+        self.keys = []
+        for shift in self.shifts:
+            if shift.date not in conflicts:
+                conflicts[shift.date] = schedule.shift_type_conflicts(shift.date)
+            # Days are ordinals, so that d + 1 is the next calendar day
+            d = shift.date.toordinal()
+            keys = [('group', g) for g, types in enumerate(self.groups) if shift.shift_type in ((types,) if isinstance(types, str) else types)]
+            if shift.date in holiday_dates:
+                keys.append(('holiday',))
+            keys.append(('day', d))
+            for c, (clique, exclusive) in enumerate(conflicts[shift.date].cliques):
+                if shift.shift_type in clique:
+                    keys.append(('clique', d, c, exclusive))
+            for g, group in enumerate(schedule.CONSECUTIVE_SHIFT_GROUPS):
+                if shift.shift_type in group:
+                    keys.append(('works', g, d))
+            self.keys.append(keys)
+
+        self.assigned = [set() for _ in self.shifts]
+        self.counts = {}
+        for i, employees in enumerate(self.fixed):
+            for j in employees:
+                self.__apply(i, j, 1)
+
+    def __count(self, key) -> int:
+        return self.counts.get(key, 0)
+
+    def __penalty(self, j: int, key: tuple) -> int:
+        kind = key[0]
+        if kind == 'group':
+            g = key[1]
+            count = self.__count((j, 'group', g)) + self.carry[j][g]
+            bounds = self.bounds[g]
+            return self.HARD * (max(0, count - bounds.get('max', count)) + max(0, bounds.get('min', count) - count))
+        if kind == 'holiday':
+            count = self.__count((j, 'holiday')) + self.holiday_carry[j]
+            bounds = self.schedule.holiday_sum
+            return self.HARD * (max(0, count - bounds.get('max', count)) + max(0, bounds.get('min', count) - count))
+        if kind == 'day':
+            count = self.__count((j, 'day', key[1]))
+            return self.SOFT * (count > 2) + self.OBJECTIVE * (count > 1)
+        if kind == 'clique':
+            types = self.counts.get((j, 'clique', key[1], key[2]), {})
+            if key[3]:
+                return self.SOFT * (sum(types.values()) > 1)
+            return self.SOFT * (len([count for count in types.values() if count > 0]) > 1)
+        if kind == 'works':
+            # Windows of two consecutive days starting on this day and on the day before
+            g, d = key[1], key[2]
+            works = [self.__count((j, 'works', g, day)) > 0 for day in (d - 1, d, d + 1)]
+            return self.OBJECTIVE * ((works[0] and works[1]) + (works[1] and works[2]))
+        raise ValueError(f'Invalid value for key: {key}')
+
+    def __apply(self, i: int, j: int, sign: int) -> None:
+        shift = self.shifts[i]
+        for key in self.keys[i]:
+            if key[0] == 'clique':
+                types = self.counts.setdefault((j, 'clique', key[1], key[2]), {})
+                types[shift.shift_type] = types.get(shift.shift_type, 0) + sign
+            else:
+                counter = (j,) + key
+                self.counts[counter] = self.counts.get(counter, 0) + sign
+        if sign > 0:
+            self.assigned[i].add(j)
+        else:
+            self.assigned[i].discard(j)
+
+    def __cost(self, i: int, j: int) -> int:
+        return sum(self.__penalty(j, key) for key in self.keys[i])
+
+    def delta(self, i: int, j: int, sign: int) -> int:
+        """Change of the cost when employee j is added to (sign 1) or removed from (sign -1) shift i."""
+        before = self.__cost(i, j)
+        self.__apply(i, j, sign)
+        after = self.__cost(i, j)
+        self.__apply(i, j, -sign)
+        return after - before
+
+    def cost(self) -> int:
+        """Cost of the current assignment."""
+        total = 0
+        for i, shift in enumerate(self.shifts):
+            total += self.HARD * (max(0, shift.min_employees - len(self.assigned[i])) + max(0, len(self.assigned[i]) - shift.max_employees))
+        # The quotas hold for every employee, also when the schedule has no shift they count
+        seen = set()
+        for j in range(len(self.employees)):
+            for key in [('group', g) for g in range(len(self.groups))] + [('holiday',)]:
+                seen.add((j, key))
+                total += self.__penalty(j, key)
+        for i, keys in enumerate(self.keys):
+            for j in range(len(self.employees)):
+                for key in keys:
+                    if (j, key) not in seen:
+                        seen.add((j, key))
+                        total += self.__penalty(j, key)
+        return total
+
+    def construct(self) -> None:
+        """Fills every shift up to min_employees, scarcest shifts first, with the cheapest available employee."""
+        load = np.zeros(len(self.employees))
+        for employees in self.assigned:
+            for j in employees:
+                load[j] += 1
+        order = sorted(range(len(self.shifts)), key=lambda i: (len(self.candidates[i]), self.shifts[i].start_time))
+        for i in order:
+            while len(self.assigned[i]) < self.shifts[i].min_employees:
+                options = [j for j in self.candidates[i] if j not in self.assigned[i]]
+                if not options:
+                    break
+                # Ties go to the employee with the fewest shifts, then at random
+                noise = self.random.random(len(options))
+                j = min(range(len(options)), key=lambda k: (self.delta(i, options[k], 1), load[options[k]], noise[k]))
+                self.__apply(i, options[j], 1)
+                load[options[j]] += 1
+
+    def improve(self) -> int:
+        """Local search: replaces an assigned employee by another available one while it does not
+        increase the cost, until time_limit or PATIENCE batches without an improvement. Returns the
+        number of improving moves."""
+        deadline = time.perf_counter() + self.time_limit
+        movable = [i for i in range(len(self.shifts)) if len(self.candidates[i]) > 1]
+        improved = 0
+        stalled = 0
+        while movable and stalled < self.PATIENCE and time.perf_counter() < deadline:
+            before = improved
+            for _ in range(100):
+                i = movable[self.random.integers(len(movable))]
+                current = [j for j in self.assigned[i] if j not in self.fixed[i]]
+                options = [j for j in self.candidates[i] if j not in self.assigned[i]]
+                if not current or not options:
+                    continue
+                out = current[self.random.integers(len(current))]
+                into = options[self.random.integers(len(options))]
+                change = self.delta(i, out, -1)
+                self.__apply(i, out, -1)
+                change += self.delta(i, into, 1)
+                if change <= 0:
+                    self.__apply(i, into, 1)
+                    improved += change < 0
+                else:
+                    self.__apply(i, out, 1)
+            stalled = 0 if improved > before else stalled + 1
+        return improved
+
+    def run(self) -> 'GreedyScheduler':
+        self.construct()
+        self.improve()
+        return self
+
+    def assignment(self) -> np.ndarray:
+        """The current assignment as a shifts x employees matrix."""
+        assignment = np.zeros((len(self.shifts), len(self.employees)), dtype=bool)
+        for i, employees in enumerate(self.assigned):
+            assignment[i, list(employees)] = True
+        return assignment
+
+    def violations(self) -> dict:
+        """Number of violated rules of the current assignment, per rule."""
+        violations = {'coverage': 0, 'shift_group_sum': 0, 'holiday_sum': 0, 'shift_types_matrix': 0,
+                      'max_shifts_per_day': 0, 'one_shift_per_day': 0, 'consecutive_days': 0}
+        for i, shift in enumerate(self.shifts):
+            violations['coverage'] += not shift.min_employees <= len(self.assigned[i]) <= shift.max_employees
+        keys = {key for keys in self.keys for key in keys}
+        for j in range(len(self.employees)):
+            for g in range(len(self.groups)):
+                violations['shift_group_sum'] += self.__penalty(j, ('group', g)) > 0
+            violations['holiday_sum'] += self.__penalty(j, ('holiday',)) > 0
+            for key in keys:
+                if key[0] == 'day':
+                    count = self.__count((j,) + key)
+                    violations['max_shifts_per_day'] += count > 2
+                    violations['one_shift_per_day'] += count > 1
+                elif key[0] == 'clique':
+                    violations['shift_types_matrix'] += self.__penalty(j, key) > 0
+                elif key[0] == 'works':
+                    # The window starting on the day
+                    violations['consecutive_days'] += self.__count((j,) + key) > 0 and self.__count((j, 'works', key[1], key[2] + 1)) > 0
+        return violations
+
+    @property
+    def feasible(self) -> bool:
+        # Coverage and the quotas are hard constraints of the CP-SAT model
+        violations = self.violations()
+        return violations['coverage'] == 0 and violations['shift_group_sum'] == 0 and violations['holiday_sum'] == 0
+
+    def apply(self) -> None:
+        """Writes the assignment to shift.employees and the employees' tasks."""
+        for i, shift in enumerate(self.shifts):
+            for j in sorted(self.assigned[i]):
+                employee = self.employees[j]
+                if employee not in shift.employees:
+                    shift.add_employee(employee)
+                    employee.add_task(shift)
+
+
 class Schedule:
+    # Domain of the aggregated penalty variables of the objective phases
+    __objective_domain = [-100000000, 100000000]
+    OBJECTIVE_STRATEGIES = ('lexicographic', 'budgeted', 'weighted')
+    ENGINES = ('cp-sat', 'greedy')
+
+    # Default per employee ('max' or 'min', shift types) -> number of shifts, copied to every
+    # schedule's shift_group_sum
+    SHIFT_GROUP_SUM = {
+        ('max',('mc')) : 2,
+        ('min',('mc')) : 1,
+        ('max',('amd')) : 2,
+        ('min',('amd')) : 1,
+        ('max',('avd')) : 3,
+        ('min',('avd')) : 2,
+        ('max',('s1', 's2')) : 4,
+        ('min',('s1', 's2')) : 3,
+        ('max',('s1', 's1+', 's2', 's2+')) : 8,
+        ('min',('s1', 's1+', 's2', 's2+')) : 7,
+    }
+
+    # Default per employee ('max' or 'min') -> number of shifts on holidays, copied to every
+    # schedule's holiday_sum
+    HOLIDAY_SUM = {'max': 2, 'min': 1}
+
+    # Key of the shifts on holidays in carry
+    HOLIDAYS = 'holidays'
+
+    # (first day of the month, matrix): same-day compatibility of the shift types from that day
+    # on, 1 if an employee can work both types on the same day
+    SHIFT_TYPES_MATRICES = [
+        (1, {
+            'labels' : ['s1', 's1+', 'mc', 's2', 's2+', 'observe', 'ems', 'amd', 'avd'],
+            'matrix': [
+              # s1 s1+ mc s2 s2+ ob em amd avd
+                [0, 0, 0, 0, 0, 0, 0, 1, 0], # s1
+                [0, 0, 0, 0, 0, 1, 1, 1, 1], # s1+
+                [0, 0, 0, 1, 1, 0, 0, 1, 1], # mc
+                [0, 0, 1, 0, 0, 0, 0, 1, 0], # s2
+                [0, 0, 1, 0, 0, 1, 1, 1, 1], # s2+
+                [0, 1, 0, 0, 1, 0, 0, 1, 1], # ob
+                [0, 1, 0, 0, 1, 0, 0, 1, 1], # em
+                [1, 1, 1, 1, 1, 1, 1, 0, 1], # amd
+                [0, 1, 1, 0, 1, 1, 1, 1, 0]  # avd
+            ]
+        }),
+        (16, {
+            'labels' : ['s1', 's1+', 'mc', 's2', 's2+', 'observe', 'ems', 'amd', 'avd'],
+            'matrix': [
+              # s1 s1+ mc s2 s2+ ob em amd avd
+                [0, 0, 0, 0, 0, 0, 0, 1, 0], # s1
+                [0, 0, 0, 0, 0, 1, 1, 1, 1], # s1+
+                [0, 0, 0, 1, 1, 0, 0, 1, 1], # mc
+                [0, 0, 1, 0, 0, 0, 0, 1, 0], # s2
+                [0, 0, 1, 0, 0, 1, 1, 1, 1], # s2+
+                [0, 1, 0, 0, 1, 0, 0, 1, 1], # ob
+                [0, 1, 0, 0, 1, 0, 0, 1, 1], # em
+                [1, 1, 1, 1, 1, 1, 1, 0, 0], # amd
+                [0, 1, 1, 0, 1, 1, 1, 0, 0]  # avd
+            ]
+        }),
+    ]
+
+    # Groups of shift types that an employee should not work on consecutive days
+    CONSECUTIVE_SHIFT_GROUPS = [
+        ['s1', 's1+', 's2', 's2+'],
+        ['mc'],
+        ['amd', 'avd'],
+        ['avd']
+    ]
+    # Days in a rolling window, an employee should work a group on at most one of them
+    CONSECUTIVE_DAYS_WINDOW = 2
+
     def __init__(self, name: str, start_time: datetime, end_time: datetime):
         assert start_time < end_time, 'Start time must be before end time'
         self.name = name
@@ -245,16 +1479,45 @@ class Schedule:
         self.shifts = list[Shift]()
 
         self._holidays = self.get_weekends(start_time, end_time)
+        self.shift_group_sum = dict(self.SHIFT_GROUP_SUM)
+        self.holiday_sum = dict(self.HOLIDAY_SUM)
+        # employee -> {shift types of a shift_group_sum key or HOLIDAYS: shifts worked before the
+        # schedule}, counted in the group and holiday sums, e.g. by RollingHorizon
+        self.carry = {}
+        # Shifts starting before this time keep exactly the employees in shift.employees, e.g. the
+        # boundary days of a RollingHorizon window
+        self.frozen_until = None
 
         self.__id = uuid.uuid4()
         self.__created_at = datetime.now()
         self.__updated_at = datetime.now()
 
         self.__model = cp_model.CpModel()
-        self.__shift_vars = {}
+        self.__shift_vars = None
         self.__penalties = 0
+        self.__index = None
+
+        # State of the last solve, kept for incremental re-solves
+        self.__model_signature = None
+        self.__fixed_shifts = set()
+        self.__assigned_shifts = set()
+        self.__blocked_shifts = set()
+        self.__phases = []
+        self.__available = None
+        self.__sparse = False
+        self.__callback = None
+        self.__progress = None
+        self.__metrics = None
+        self.__spans = []
         
         
+    @property
+    def index(self) -> ScheduleIndex:
+        # Built lazily, rebuilt at the start of every solve and kept up to date by add/remove_shift
+        if self.__index is None:
+            self.__index = ScheduleIndex(self.shifts)
+        return self.__index
+
     @property
     def solution_printer(self):
         return ShiftSolutionPrinter(self.__shift_vars, self.shifts, self.employees, self.__penalties, self.start_time, self.end_time)
@@ -262,6 +1525,21 @@ class Schedule:
     @property
     def penalty(self):
         return self.__penalties
+
+    @property
+    def phases(self) -> list[dict]:
+        # Name, status, objective value and wall time of every solver run of the last solve
+        return self.__phases
+
+    @property
+    def model(self) -> cp_model.CpModel:
+        # CP-SAT model of the last solve
+        return self.__model
+
+    @property
+    def spans(self) -> list[dict]:
+        # Name, wall time, variables and constraints of every constraint family of the last model build
+        return self.__spans
     
     @property
     def dates(self) -> list[datetime]:
@@ -308,7 +1586,7 @@ class Schedule:
         return self.duration.days + 1
     
     def get_shifts_by_date(self, date: datetime) -> list[Shift]:
-        return [shift for shift in self.shifts if shift.start_time.date() == date.date()]
+        return list(self.index.shifts_on(date.date()))
     
     
     def shift_per_employee(self, shift_type, type = None) -> float:
@@ -337,6 +1615,11 @@ class Schedule:
             print(f"Number of {shift_type} shifts per employee: {self.shift_per_employee(shift_type)}")
 
 
+    def shift_type_conflicts(self, date) -> ShiftTypeConflicts:
+        """The compiled SHIFT_TYPES_MATRICES entry of the day of date."""
+        matrix = [matrix for first_day, matrix in self.SHIFT_TYPES_MATRICES if first_day <= date.day][-1]
+        return ShiftTypeConflicts(matrix['labels'], matrix['matrix'])
+
     def add_holiday(self, date: datetime) -> None:
         # Check if date is in dates 
         if date not in self.dates:
@@ -370,6 +1653,7 @@ class Schedule:
     def reset(self) -> None:
         self.employees = []
         self.shifts = []
+        self.__index = None
  
     def add_employee(self, employee) -> object:
         self.employees.append(employee)
@@ -378,28 +1662,78 @@ class Schedule:
 
     def add_shift(self, shift) -> object:
         self.shifts.append(shift)
+        if self.__index is not None:
+            self.__index.add_shift(shift)
         self.__updated_at = datetime.now()
         return shift
     
     def add_shifts(self, shift: Shift, holiday = False, until = None) -> None:
-        if holiday:
-            dates = [date for date in self.dates if date.date() >= shift.start_time.date()]
-        else:
-            dates = [date for date in self.dates if date not in self.holidays and date.date() >= shift.start_time.date()]
-        
-        for date in dates:
-            if until is None:
-                start_time = datetime.combine(date, shift.start_time.time())
-                self.add_shift(Shift(name=shift.name + ' ' + str(start_time.date()), description=shift.description, start_time=start_time, duration=shift.duration, shift_type=shift.shift_type,
-                                    min_employees=shift.min_employees, max_employees=shift.max_employees))
-            elif date <= until:
-                start_time = datetime.combine(date, shift.start_time.time())
-                self.add_shift(Shift(name=shift.name + ' ' + str(start_time.date()), description=shift.description, start_time=start_time, duration=shift.duration, shift_type=shift.shift_type,
-                                    min_employees=shift.min_employees, max_employees=shift.max_employees))
-            else:
-                break
-                
+        self.add_recurring_shifts(shift, holidays='include' if holiday else 'exclude', until=until)
+
+    def add_recurring_shifts(self, templates, weekdays=None, holidays='exclude', until: datetime = None, every_days: int = 1) -> list[Shift]:
+        """Adds the occurrences of shift templates on the days of the schedule, in one batch.
 
+        Every template recurs from the day of its start_time at the same time of day. The days are
+        computed as a datetime64 range, the shifts are created with Shift.from_arrays and appended
+        to the schedule at once.
+
+        Args:
+            templates: A Shift, or a list of Shifts or of (Shift, rule) pairs where rule is a dict
+                overriding any of weekdays, holidays, until and every_days for that template.
+            weekdays: The days of the week with an occurrence, 0 for Monday, defaults to all.
+            holidays: 'exclude' to skip the schedule's holidays, 'include' to keep them, or 'only'
+                for the holidays only.
+            until: No occurrence on the days after until.
+            every_days: Every how many days, from the template's day, there is an occurrence.
+        Returns:
+            The added shifts, template by template in date order.
+        """
+        if isinstance(templates, Shift):
+            templates = [templates]
+        defaults = {'weekdays': weekdays, 'holidays': holidays, 'until': until, 'every_days': every_days}
+
+        # Same days as self.dates, and the holidays as days
+        days = np.datetime64(self.start_time.date(), 'D') + np.arange(self.num_days)
+        on_holiday = np.isin(days, np.array(self.holiday_dates, dtype='datetime64[D]'))
+        weekday = (days.astype(np.int64) + 3) % 7 # 1970-01-01 is a Thursday
+        time_of_day = np.timedelta64(self.start_time - datetime.combine(self.start_time.date(), datetime.min.time()), 'us')
+
+        added = []
+        for template in templates:
+            template, rule = template if isinstance(template, tuple) else (template, {})
+            for key in rule:
+                if key not in defaults:
+                    raise ValueError(f'Invalid value for rule key: {key}')
+            rule = {**defaults, **rule}
+            if rule['holidays'] not in ('exclude', 'include', 'only'):
+                raise ValueError(f"Invalid value for holidays: {rule['holidays']}")
+            if rule['every_days'] < 1:
+                raise ValueError(f"Invalid value for every_days: {rule['every_days']}")
+
+            first = np.datetime64(template.start_time.date(), 'D')
+            keep = (days >= first) & ((days - first).astype(np.int64) % rule['every_days'] == 0)
+            if rule['holidays'] == 'exclude':
+                keep &= ~on_holiday
+            elif rule['holidays'] == 'only':
+                keep &= on_holiday
+            if rule['weekdays'] is not None:
+                keep &= np.isin(weekday, list(rule['weekdays']))
+            if rule['until'] is not None:
+                # Compared like self.dates, at the schedule's time of day
+                keep &= days.astype('datetime64[us]') + time_of_day <= np.datetime64(rule['until'], 'us')
+
+            dates = days[keep]
+            start_times = dates.astype('datetime64[us]') + np.timedelta64(template.start_time - datetime.combine(template.start_time.date(), datetime.min.time()), 'us')
+            names = [f'{template.name} {date}' for date in np.datetime_as_string(dates)]
+            added += Shift.from_arrays(names, [template.description] * len(dates), np.full(len(dates), np.timedelta64(template.duration, 'us')),
+                                       start_times, template.shift_type, template.min_employees, template.max_employees)
+
+        self.shifts.extend(added)
+        if self.__index is not None:
+            for shift in added:
+                self.__index.add_shift(shift)
+        self.__updated_at = datetime.now()
+        return added
 
     def remove_employee(self, employee) -> None:
         self.employees.remove(employee)
@@ -407,6 +1741,8 @@ class Schedule:
 
     def remove_shift(self, shift) -> None:
         self.shifts.remove(shift)
+        if self.__index is not None:
+            self.__index.remove_shift(shift)
         self.__updated_at = datetime.now()
 
     def assign_shift(self, shift: Shift, employee: Employee) -> None:
@@ -501,19 +1837,111 @@ class Schedule:
 
         return shift_schedule
     
-    def save(self, file_name):
-        with open(file_name, 'wb') as f:
-            pickle.dump(self, f)
+    def save(self, file_name, format='snapshot'):
+        """Saves the schedule.
+
+        Args:
+            file_name: The file to write.
+            format: 'snapshot' for a ScheduleSnapshot, or 'pickle' to pickle the schedule object
+                (without the model of the last solve).
+        """
+        if format == 'snapshot':
+            ScheduleSnapshot.write(self, file_name)
+        elif format == 'pickle':
+            with open(file_name, 'wb') as f:
+                pickle.dump(self, f)
+        else:
+            raise ValueError(f'Invalid value for format: {format}')
 
     def to_csv(self, path):
         self.__display_table(group_by="shift type").to_csv(path + '/schedule.csv')
         self.__display_table(group_by="workload").to_csv(path + '/workload.csv')
 
     @staticmethod
-    def load(file_name):
+    def load(file_name, start: datetime = None, end: datetime = None, mmap: bool = True):
+        """Loads a schedule saved by save, pickled files included.
+
+        Args:
+            file_name: The file to read.
+            start, end: Only read the shifts starting in [start, end), see ScheduleSnapshot.to_schedule.
+                Not supported for pickled files.
+            mmap: If True, the arrays of a snapshot are memory-mapped.
+        """
+        if ScheduleSnapshot.is_snapshot(file_name):
+            return ScheduleSnapshot(file_name, mmap=mmap).to_schedule(start, end)
+        if start is not None or end is not None:
+            raise ValueError(f'Invalid value for file_name: {file_name} is pickled, it cannot be read by date range')
         with open(file_name, 'rb') as f:
             return pickle.load(f)
 
+    def __getstate__(self):
+        # The model, the variables and the hooks of the last solve are not kept, the next solve rebuilds them
+        state = self.__dict__.copy()
+        for name in ('model', 'shift_vars', 'index', 'callback', 'progress', 'metrics', 'available', 'model_signature'):
+            state.pop(f'_Schedule__{name}', None)
+        return state
+
+    def __setstate__(self, state):
+        # Archives pickled by older versions miss the attributes added since
+        state.setdefault('shift_group_sum', dict(self.SHIFT_GROUP_SUM))
+        state.setdefault('holiday_sum', dict(self.HOLIDAY_SUM))
+        state.setdefault('carry', {})
+        state.setdefault('frozen_until', None)
+        state.setdefault('_Schedule__sparse', False)
+        state.setdefault('_Schedule__spans', [])
+        self.__dict__.update(state)
+        self.__model = cp_model.CpModel()
+        self.__shift_vars = None
+        self.__index = None
+        self.__callback = None
+        self.__progress = None
+        self.__metrics = None
+        self.__available = None
+        self.__model_signature = None
+
+    def to_dict(self) -> dict:
+        """Compact form of the schedule with plain values only: times as ISO strings, durations in
+        seconds and assignments as employee positions. It is much smaller than the pickled object
+        graph and is how schedules cross process boundaries, see from_dict."""
+        columns = {employee: j for j, employee in enumerate(self.employees)}
+        return {
+            'name': self.name,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'holidays': [holiday.isoformat() for holiday in self.holidays],
+            'shift_group_sum': [[bound, types, value] for (bound, types), value in self.shift_group_sum.items()],
+            'holiday_sum': dict(self.holiday_sum),
+            'carry': [[columns[employee], key, count] for employee, counts in self.carry.items() if employee in columns for key, count in counts.items()],
+            'frozen_until': self.frozen_until.isoformat() if self.frozen_until is not None else None,
+            'employees': [[employee.first_name, employee.last_name, employee.role, employee.abbreviation,
+                           [[task.name, task.description, task.start_time.isoformat(), task.duration.total_seconds()] for task in employee.tasks]]
+                          for employee in self.employees],
+            'shifts': [[shift.name, shift.description, shift.start_time.isoformat(), shift.duration.total_seconds(), shift.shift_type,
+                        shift.min_employees, shift.max_employees, [columns[employee] for employee in shift.employees if employee in columns]]
+                       for shift in self.shifts],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Schedule':
+        """Rebuilds a schedule from to_dict, with new employees, tasks and shifts."""
+        schedule = cls(data['name'], datetime.fromisoformat(data['start_time']), datetime.fromisoformat(data['end_time']))
+        schedule._holidays = [datetime.fromisoformat(holiday) for holiday in data['holidays']]
+        schedule.shift_group_sum = {(bound, types if isinstance(types, str) else tuple(types)): value for bound, types, value in data['shift_group_sum']}
+        for first_name, last_name, role, abbreviation, tasks in data['employees']:
+            employee = schedule.add_employee(Employee(first_name, last_name, role, abbreviation))
+            for name, description, start_time, duration in tasks:
+                employee.add_task(Task(name, description, datetime.fromisoformat(start_time), timedelta(seconds=duration)))
+        schedule.holiday_sum = dict(data.get('holiday_sum', cls.HOLIDAY_SUM))
+        for j, key, count in data.get('carry', []):
+            schedule.carry.setdefault(schedule.employees[j], {})[key if isinstance(key, str) else tuple(key)] = count
+        if data.get('frozen_until') is not None:
+            schedule.frozen_until = datetime.fromisoformat(data['frozen_until'])
+        for name, description, start_time, duration, shift_type, min_employees, max_employees, assigned in data['shifts']:
+            shift = schedule.add_shift(Shift(name, description, timedelta(seconds=duration), datetime.fromisoformat(start_time), shift_type, min_employees, max_employees))
+            for j in assigned:
+                schedule.assign_shift(shift, schedule.employees[j])
+        return schedule
+
     @staticmethod
     def __negated_bounded_span(works, start, length):
         """Filters an isolated sub-sequence of variables assined to True.
@@ -615,18 +2043,539 @@ class Schedule:
         return cost_variables, cost_coefficients
     
 
-    def solve(self, time_limit=60, verbose=True):
+    def solve(self, time_limit=60, verbose=True, incremental=False, objective='lexicographic', config: SolverConfig = None, callback: cp_model.CpSolverSolutionCallback = None, progress=None, metrics=None, sparse=False, decompose=False, engine='cp-sat', warm_start=False):
         """Solves the schedule using the CP-SAT solver.
 
         Args:
             time_limit: The time limit in seconds.
             verbose: If True, prints the solver output.
+            incremental: If True and the model of the previous solve still matches the schedule's
+                shifts and employees, repair the previous solution instead of building and solving
+                a new model (see __resolve). Otherwise, or if an employee became available for a
+                shift that has no variable in that model, a full solve is done.
+            objective: How the soft constraints and the objectives are optimized, in that priority order.
+                'lexicographic': one solve per objective with time_limit each, every phase pinned
+                    and used as the hint of the next one.
+                'budgeted': as 'lexicographic', but time_limit is split between the phases.
+                'weighted': a single solve of a weighted sum, with weights scaled so that every
+                    tier outweighs all the tiers below it.
+            config: Worker count, preset, seed and other CP-SAT settings, see SolverConfig.
+                Defaults to SolverConfig().
+            callback: Solution callback called on every improving solution of every phase, e.g.
+                ShiftSolutionStream(). Callbacks with a bind method are bound to the assignment variables.
+            progress: Called with the phase dict (name, status, objective, wall_time) when a phase
+                starts, with status 'RUNNING', and again when it ends.
+            metrics: A MetricsSink receiving the time, variables and constraints of every constraint
+                family of the model build, and the status, wall time, objective, best bound,
+                conflicts and branches of every phase.
+            sparse: If True, the pairs already assigned in shift.employees become constants instead
+                of variables, and the soft constraints they decide become constants too. The model
+                is smaller, but an incremental solve rebuilds it once one of these pairs is removed.
+            decompose: If True and the built model splits into independent components (see
+                components), every component is solved as a schedule of its own, concurrently,
+                with the CP-SAT workers split between them. The phases, and the phases and events
+                passed to progress and metrics, then have a 'component' key; the components call
+                them one at a time. callback is not used for the components.
+            engine: 'cp-sat', or 'greedy' for a draft in milliseconds from GreedyScheduler, with
+                time_limit as the limit of its local search. The greedy phase is 'FEASIBLE' if
+                coverage and the quotas hold, its objective is minus the heuristic cost and its
+                'violations' count the broken rules.
+            warm_start: If True, the first CP-SAT phase is hinted with a GreedyScheduler draft.
+        """
+        if objective not in self.OBJECTIVE_STRATEGIES:
+            raise ValueError(f'Invalid value for objective: {objective}')
+        if engine not in self.ENGINES:
+            raise ValueError(f'Invalid value for engine: {engine}')
+
+        if engine == 'greedy':
+            return self.__solve_greedy(time_limit=time_limit, config=config, progress=progress, metrics=metrics)
+
+        if incremental:
+            if self.__model_signature is not None and self.__model_signature == self.__signature() and self.__sparse == sparse:
+                # Availability may have changed through the employees' tasks
+                available, eligible = self.__eligibility()
+                if self.__shift_vars.covers(eligible, self.__assignment()):
+                    self.__available = available
+                    return self.__resolve(time_limit=time_limit, verbose=verbose, config=config, callback=callback, progress=progress, metrics=metrics)
+            print('Shifts, employees or availability changed since the last solve, rebuilding the model')
+
+        self.__metrics = metrics
+        self.__sparse = sparse
+        self.__build_model()
+        if decompose:
+            components = self.components()
+            if len(components) > 1:
+                return self.__solve_components(components, time_limit=time_limit, verbose=verbose, objective=objective, config=config, progress=progress, metrics=metrics, sparse=sparse,
+                                               warm_start=warm_start)
+        shift_vars = self.__shift_vars
+        constraints = self.__constraints
+        self.__callback = callback
+        self.__progress = progress
+        if hasattr(callback, 'bind'):
+            callback.bind(shift_vars)
+        objective_names = self.__objective_names
+        const_penalties_var = self.__const_penalties_var
+        ls_penalties = self.__ls_penalties
+
+        # ------------------------ Solver ---------------------------
+
+        # add assumptions
+        # self.__model.AddAssumptions([constraint for constraint in constraints.values()])
+
+
+        solver = self.__solver(time_limit, config)
+        self.__phases = []
+        solution = None
+
+        if warm_start:
+            draft = GreedyScheduler(self, seed=(config or SolverConfig()).seed or 0).run()
+            assignment = draft.assignment()
+            self.__model.ClearHints()
+            for i, j in zip(*np.nonzero(shift_vars.variable)):
+                self.__model.AddHint(shift_vars.vars[i, j], int(assignment[i, j]))
+
+        # The soft constraints come first, then the objectives in order
+        phases = [('constraints', const_penalties_var)] + list(zip(objective_names, ls_penalties))
+
+        if objective == 'weighted':
+            weights = self.__tier_weights([self.__tier_ranges[var.Index()] for _, var in phases])
+            self.__model.Maximize(cp_model.LinearExpr.WeightedSum([var for _, var in phases], weights))
+            print(f'Begin solving with weighted objectives')
+            status = self.__solve_phase(solver, 'weighted')
+            if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+                solution = solver.ResponseProto().solution
+                print(f'Constraints satisfaction: {solver.Value(const_penalties_var)} ({solver.Value(const_penalties_var) / len(constraints) * 100 :.2f} %)')
+                for name, penalties in phases[1:]:
+                    print(f'Objective satisfaction ({name}): {solver.Value(penalties)}')
+        else:
+            deadline = time.time() + time_limit
+            for k, (name, penalties) in enumerate(phases):
+                if objective == 'budgeted':
+                    # Split what is left of the time limit evenly between the remaining phases
+                    solver.parameters.max_time_in_seconds = max(deadline - time.time(), 0) / (len(phases) - k)
+
+                self.__model.Maximize(penalties)
+                if k == 0:
+                    # Solve model - satisfy only constraints
+                    print(f'Begin solving with constraints')
+                else:
+                    print(f'Begin solving with objective {name}')
+                status = self.__solve_phase(solver, name)
+                if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+                    break
+                solution = solver.ResponseProto().solution
+
+                # Save the satisfaction of this phase and start the next one from its solution
+                self.__restrict(penalties, round(solver.ObjectiveValue()))
+                self.__hint(solution)
+                if k == 0:
+                    print(f'Constraints satisfaction: {solver.Value(const_penalties_var)} ({solver.Value(const_penalties_var) / len(constraints) * 100 :.2f} %)')
+                else:
+                    print(f'Objective satisfaction: {solver.ObjectiveValue()}')
+
+        # Keep the solution of the last phase that found one
+        if solution is not None:
+            # if verbose:
+            print('Solution:')
+            # print('Objective value =', solver.ObjectiveValue())
+            values = shift_vars.values(solution)
+            for i, j in zip(*np.nonzero(values)):
+                shift, employee = shift_vars.shifts[i], shift_vars.employees[j]
+                # print(f'{shift.name} is assigned to {employee.name}')
+                try:
+                    shift.add_employee(employee)
+                    employee.add_task(shift)
+                except Exception as e:
+                    pass
+            self.__assigned_shifts = {(shift_vars.shifts[i], shift_vars.employees[j]) for i, j in zip(*np.nonzero(values))}
+            for constraint in constraints:
+                if solution[constraints[constraint].Index()] == 0:
+                    print(f'{constraint} is not satisfied')
+            #     print(f'{constraint}: {solver.BooleanValue(constraints[constraint])}')
+
+            # for objective in objectives:
+            #     print(f'{objective}: {solver.BooleanValue(objectives[objective])}')
+
+            # Give a warning if the employee is assigned to 2 shift types in the same day that cannot be assigned to the same employee in the same day
+            # for employee in self.employees:
+            #     for shift1 in [shift for shift in self.shifts if shift not in fixed_shifts]:
+            #         for shift2 in [shift for shift in self.shifts if shift != shift1 and shift.start_time.date() == shift1.start_time.date() and shift not in fixed_shifts]:
+            #             i = shift_labels.index(shift1.shift_type)
+            #             j = shift_labels.index(shift2.shift_type)
+            #             if not matrix[i][j]:
+            #                 if solver.Value(self.__shift_vars[(shift1, employee)]) == 1 and solver.Value(self.__shift_vars[(shift2, employee)]) == 1:
+            #                     print(f'Warning: {employee.name} is assigned to {shift1.name} and {shift2.name} in the same day.')
+            return True
+        else:
+            print('No solution found.')
+            # for constraint in constraints:
+            #     print(f'{constraint}: {solver.BooleanValue(constraints[constraint])}')
+                
+            # print(f'{solver.SufficientAssumptionsForInfeasibility()}')
+            return False
+
+    def __resolve(self, time_limit=60, verbose=True, config: SolverConfig = None, callback: cp_model.CpSolverSolutionCallback = None, progress=None, metrics=None):
+        """Repairs the previous solution after small edits, re-using the built model.
+
+        Assignments added to shift.employees since the last solve become fixed, solver assignments
+        removed from shift.employees are forbidden, and availability is re-read from the employees'
+        tasks. The current assignment is given to CP-SAT as a hint and a single solve maximizes the
+        satisfied soft constraints first and the number of kept assignments second.
+        """
+        shift_vars = self.__shift_vars
+        constraints = self.__constraints
+        const_penalties_var = self.__const_penalties_var
+        self.__callback = callback
+        self.__progress = progress
+        self.__metrics = metrics
+        if hasattr(callback, 'bind'):
+            callback.bind(shift_vars)
+        shift_vars.reindex()
+
+        self.__index = ScheduleIndex(self.shifts)
+
+        current_shifts = {(shift, employee) for shift in self.shifts for employee in shift.employees}
+        self.__blocked_shifts = (self.__blocked_shifts | (self.__assigned_shifts - current_shifts)) - current_shifts
+        fixed_shifts = (current_shifts - self.__assigned_shifts) | (self.__fixed_shifts & current_shifts)
+
+        # Release the pins of the previous phases and apply the edited assignments
+        for var in [const_penalties_var] + self.__ls_penalties:
+            var.Proto().domain[:] = self.__objective_domain
+        self.__bound_assignments(fixed_shifts, self.__blocked_shifts)
+
+        # Warm start from the current assignment
+        self.__model.ClearHints()
+        for i, j in zip(*np.nonzero(shift_vars.variable)):
+            self.__model.AddHint(shift_vars.vars[i, j], int((shift_vars.shifts[i], shift_vars.employees[j]) in current_shifts))
+
+        # Soft constraints first, then keep as many of the current assignments as possible
+        kept = [shift_vars[shift, employee] for shift, employee in current_shifts]
+        weights = self.__tier_weights([self.__tier_ranges[const_penalties_var.Index()], len(kept)])
+        self.__model.Maximize(weights[0] * const_penalties_var + weights[1] * shift_vars.sum(kept))
+
+        solver = self.__solver(time_limit, config)
+        self.__phases = []
+        print(f'Begin repairing the previous solution')
+        status = self.__solve_phase(solver, 'repair')
+
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            print(f'Constraints satisfaction: {solver.Value(const_penalties_var)} ({solver.Value(const_penalties_var) / len(constraints) * 100 :.2f} %)')
+            values = shift_vars.values(solver.ResponseProto().solution)
+            assigned_shifts = {(shift_vars.shifts[i], shift_vars.employees[j]) for i, j in zip(*np.nonzero(values))}
+            print(f'Moved assignments: {len(current_shifts - assigned_shifts)}')
+
+            # Sync shift.employees and the employees' tasks with the repaired solution
+            for shift, employee in current_shifts - assigned_shifts:
+                shift.remove_employee(employee)
+                if shift in employee.all_tasks:
+                    employee.remove_task(shift)
+            for shift, employee in assigned_shifts - current_shifts:
+                shift.add_employee(employee)
+                if shift not in employee.all_tasks:
+                    employee.add_task(shift)
+
+            self.__assigned_shifts = assigned_shifts
+            self.__fixed_shifts = fixed_shifts
+            for constraint in constraints:
+                if solver.Value(constraints[constraint]) == 0:
+                    print(f'{constraint} is not satisfied')
+            return True
+        else:
+            print('No solution found.')
+            return False
+
+    def components(self) -> list[tuple]:
+        """Independent parts of the model of the last build, as (shifts, employees) pairs.
+
+        A union-find pass over the constraints of the model joins the variables of every
+        constraint, and every assignment variable with its shift and its employee. The objective
+        sums and the enforcement literals are left out: components sharing only a soft
+        constraint literal, e.g. a shift type conflict of the same date, are solved each with
+        their own copy of it. Shifts and employees without any variable go to the first component.
+        """
+        proto = self.__model.Proto()
+        shift_vars = self.__shift_vars
+        num_shifts, num_employees = shift_vars.shape
+        # Nodes: the model's variables, then one per shift and one per employee
+        parent = list(range(len(proto.variables) + num_shifts + num_employees))
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        def union(nodes):
+            roots = [find(node) for node in nodes]
+            for root in roots[1:]:
+                parent[root] = roots[0]
+
+        constant = [variable.domain[0] == variable.domain[-1] for variable in proto.variables]
+        aggregates = {var.Index() for var in [self.__const_penalties_var] + self.__ls_penalties}
+        for constraint in proto.constraints:
+            kind = constraint.WhichOneof('constraint')
+            if kind == 'linear':
+                refs = list(constraint.linear.vars)
+            elif kind in ('bool_or', 'bool_and', 'at_most_one', 'exactly_one'):
+                refs = list(getattr(constraint, kind).literals)
+            elif kind == 'lin_max':
+                refs = list(constraint.lin_max.target.vars) + [ref for expr in constraint.lin_max.exprs for ref in expr.vars]
+            else:
+                raise ValueError(f'Invalid value for constraint: {kind} is not supported by components')
+            variables = {ref if ref >= 0 else -ref - 1 for ref in refs}
+            if variables & aggregates:
+                continue
+            union([variable for variable in variables if not constant[variable]])
+
+        rows, columns = np.nonzero(shift_vars.variable | shift_vars.fixed)
+        for i, j in zip(rows.tolist(), columns.tolist()):
+            nodes = [len(proto.variables) + i, len(proto.variables) + num_shifts + j]
+            if shift_vars.variable[i, j]:
+                nodes.append(int(shift_vars.indices[i, j]))
+            union(nodes)
+
+        groups = {}
+        for i, shift in enumerate(shift_vars.shifts):
+            groups.setdefault(find(len(proto.variables) + i), ([], []))[0].append(shift)
+        for j, employee in enumerate(shift_vars.employees):
+            groups.setdefault(find(len(proto.variables) + num_shifts + j), ([], []))[1].append(employee)
+        components = [group for group in groups.values() if group[0] and group[1]]
+        if not components:
+            return [(list(shift_vars.shifts), list(shift_vars.employees))]
+        for shifts, employees in groups.values():
+            if not (shifts and employees):
+                components[0][0].extend(shifts)
+                components[0][1].extend(employees)
+        return components
+
+    def __solve_components(self, components: list[tuple], time_limit, verbose, objective, config: SolverConfig, progress, metrics, sparse, warm_start) -> bool:
+        """Solves every component as a schedule sharing the shifts and the employees, so the
+        assignments land in shift.employees."""
+        config = config or SolverConfig()
+        workers = max(1, config.workers // len(components))
+        parts = []
+        for k, (shifts, employees) in enumerate(components):
+            part = Schedule(f'{self.name} component {k}', self.start_time, self.end_time)
+            part._holidays = list(self._holidays)
+            part.shift_group_sum = dict(self.shift_group_sum)
+            part.holiday_sum = dict(self.holiday_sum)
+            part.carry = {employee: counts for employee, counts in self.carry.items() if employee in employees}
+            part.frozen_until = self.frozen_until
+            part.employees = list(employees)
+            for shift in shifts:
+                part.add_shift(shift)
+            parts.append(part)
+        print(f'Solving {len(parts)} independent components with {workers} workers each')
+
+        part_config = SolverConfig(workers=workers, preset=config.preset, seed=config.seed, relative_gap_limit=config.relative_gap_limit, log_search_progress=config.log_search_progress)
+        # The callbacks are called by one component at a time, and the output of every component
+        # is printed once all of them are done
+        lock = threading.Lock()
+        relays = [ComponentRelay(k, lock, progress, metrics) for k in range(len(parts))]
+        output = ThreadOutput(sys.stdout)
+
+        def solve_part(k):
+            with output.capture(k):
+                return parts[k].solve(time_limit=time_limit, verbose=verbose, objective=objective, config=part_config,
+                                      progress=relays[k].progress if progress is not None else None,
+                                      metrics=relays[k] if metrics is not None else None, sparse=sparse, warm_start=warm_start)
+
+        with contextlib.redirect_stdout(output), ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            solved = list(executor.map(solve_part, range(len(parts))))
+        for k in range(len(parts)):
+            print(f'Component {k}:')
+            print(output.buffers[k].getvalue(), end='')
+
+        # The model of this schedule stays the full one, for incremental solves
+        self.__shift_vars.reindex()
+        self.__phases = [{**phase, 'component': k} for k, part in enumerate(parts) for phase in part.phases]
+        self.__assigned_shifts = {(shift, employee) for shift in self.shifts for employee in shift.employees}
+        return all(solved)
+
+    def __solve_greedy(self, time_limit, config: SolverConfig, progress, metrics) -> bool:
+        """Assigns the shifts with GreedyScheduler, without building a CP-SAT model."""
+        self.__metrics = metrics
+        self.__phases = []
+        if progress is not None:
+            progress({'name': 'greedy', 'status': 'RUNNING', 'objective': None, 'wall_time': 0.0})
+        start = time.perf_counter()
+        draft = GreedyScheduler(self, time_limit=time_limit, seed=(config or SolverConfig()).seed or 0).run()
+        feasible = draft.feasible
+        draft.apply()
+        phase = {
+            'name': 'greedy',
+            'status': 'FEASIBLE' if feasible else 'INFEASIBLE',
+            'objective': -draft.cost(),
+            'best_bound': None,
+            'wall_time': time.perf_counter() - start,
+            'conflicts': 0,
+            'branches': 0,
+            'violations': draft.violations(),
+        }
+        self.__phases.append(phase)
+        self.__record({'type': 'phase', **phase})
+        if progress is not None:
+            progress(phase)
+        print(f"Greedy draft in {phase['wall_time'] * 1000:.0f} ms, violations: {phase['violations']}")
+        return feasible
+
+    def __signature(self) -> tuple:
+        # Everything the structure of the model depends on, apart from fixed assignments and availability
+        return (tuple(map(id, self.shifts)), tuple(map(id, self.employees)),
+                tuple((shift.min_employees, shift.max_employees) for shift in self.shifts), tuple(self.holiday_dates),
+                tuple(self.shift_group_sum.items()), tuple(self.holiday_sum.items()),
+                tuple((employee, tuple(counts.items())) for employee, counts in self.carry.items()), self.frozen_until)
+
+    def __solver(self, time_limit, config: SolverConfig = None) -> cp_model.CpSolver:
+        solver = cp_model.CpSolver()
+        (config or SolverConfig()).apply(solver)
+        solver.parameters.max_time_in_seconds = time_limit
+        return solver
+
+    def __solve_phase(self, solver, name):
+        if self.__progress is not None:
+            self.__progress({'name': name, 'status': 'RUNNING', 'objective': None, 'wall_time': 0.0})
+        status = solver.Solve(self.__model, self.__callback)
+        solved = status == cp_model.OPTIMAL or status == cp_model.FEASIBLE
+        phase = {
+            'name': name,
+            'status': solver.StatusName(status),
+            'objective': solver.ObjectiveValue() if solved else None,
+            'best_bound': solver.BestObjectiveBound() if solved else None,
+            'wall_time': solver.WallTime(),
+            'conflicts': solver.NumConflicts(),
+            'branches': solver.NumBranches(),
+        }
+        self.__phases.append(phase)
+        self.__record({'type': 'phase', **phase})
+        if self.__progress is not None:
+            self.__progress(phase)
+        return status
+
+    def __record(self, event: dict) -> None:
+        if self.__metrics is not None:
+            self.__metrics.record({'schedule': self.name, **event})
+
+    def __hint(self, solution) -> None:
+        # Use a full solution of the model as the hint of the next solve
+        self.__model.ClearHints()
+        hint = self.__model.Proto().solution_hint
+        hint.vars.extend(range(len(solution)))
+        hint.values.extend(solution)
+
+    @staticmethod
+    def __tier_weights(ranges: list[int]) -> list[int]:
+        """Weights of a weighted-sum objective that keep tiers in priority order.
+
+        Args:
+            ranges: The span of each tier's value, highest priority first.
+        Returns:
+            Weights such that one unit of a tier is worth more than the whole span of all lower tiers.
         """
+        weights = [1]
+        for span in reversed(ranges[1:]):
+            weights.insert(0, weights[0] * (span + 1))
+        if weights[0] * (ranges[0] + 1) >= 2 ** 53:
+            raise ValueError('Objective tiers are too wide for a weighted objective, use a lexicographic one')
+        return weights
+
+    @staticmethod
+    def __restrict(var, lower_bound) -> None:
+        # Pin an objective at the value reached in a phase, through its domain so it can be released again
+        domain = var.Proto().domain
+        domain[:] = [lower_bound, domain[-1]]
+
+    def __eligibility(self) -> tuple:
+        """Availability of every (shift, employee) pair from the employees' tasks, and the pairs
+        that need an assignment variable: available or already assigned (fixed assignments win).
+        Shifts before frozen_until only get variables for their assigned pairs."""
+        available = AvailabilityBitmap(self.employees, self.shifts).available
+        assignment = self.__assignment()
+        eligible = available | assignment
+        if self.frozen_until is not None:
+            frozen = np.array([shift.start_time < self.frozen_until for shift in self.shifts], dtype=bool)
+            eligible[frozen] = assignment[frozen]
+        return available, eligible
+
+    def __assignment(self) -> np.ndarray:
+        """The pairs assigned in shift.employees, as a shifts x employees matrix."""
+        assigned = np.zeros((len(self.shifts), len(self.employees)), dtype=bool)
+        columns = {employee: j for j, employee in enumerate(self.employees)}
+        for i, shift in enumerate(self.shifts):
+            for employee in shift.employees:
+                if employee in columns:
+                    assigned[i, columns[employee]] = True
+        return assigned
+
+    def __literal(self, name: str, always: bool = False, never: bool = False):
+        """A new soft constraint literal, or in a sparse model a constant when the assignments
+        that are already fixed decide it (always satisfied, or never satisfiable)."""
+        if self.__sparse and always:
+            return self.__shift_vars.one
+        if self.__sparse and never:
+            return self.__shift_vars.zero
+        return self.__model.NewBoolVar(name)
+
+    def __add_shift_type_conflicts(self, conflicts: ShiftTypeConflicts, date, constraints: dict) -> None:
+        """Adds one soft constraint per clique of conflicts with shifts on date: no employee works
+        more than one shift of a group of the clique."""
+        shift_vars = self.__shift_vars
+        shifts = self.__index.shifts_on(date)
+        for clique, exclusive in conflicts.cliques:
+            groups = conflicts.groups(clique, exclusive, shifts)
+            if not groups:
+                continue
+            # Employees with at most one variable in a group can't break the rule
+            columns = []
+            for group in groups:
+                block = shift_vars.rows(group)
+                for j in range(block.shape[1]):
+                    low, high = shift_vars.bounds(block[:, j])
+                    if high > 1:
+                        columns.append((block[:, j], low))
+            name = f'shift_types_matrix_{date}_{"_".join(clique)}'
+            constraints[name] = self.__literal(f'shift_types_matrix_constraints_{date}_{"_".join(clique)}',
+                                               always=not columns, never=any(low > 1 for _, low in columns))
+            if shift_vars.is_constant(constraints[name]):
+                continue
+            for column, _ in columns:
+                self.__model.Add(shift_vars.sum(column) <= 1).OnlyEnforceIf(constraints[name]) # type: ignore
+
+    def __bound_assignments(self, fixed_shifts: set, blocked_shifts: set = frozenset()) -> None:
+        """Sets the domain of every assignment variable: [1, 1] for fixed pairs,
+        [0, 0] for blocked pairs and unavailable employees, [0, 1] otherwise."""
+        shift_vars = self.__shift_vars
+        available = self.__available
+        for i, j in zip(*np.nonzero(shift_vars.variable)):
+            shift, employee, var = shift_vars.shifts[i], shift_vars.employees[j], shift_vars.vars[i, j]
+            if (shift, employee) in fixed_shifts:
+                if not available[i, j]:
+                    print(f'Warning: {employee.first_name} is not available for {shift.name} but is assigned to it.')
+                var.Proto().domain[:] = [1, 1]
+            elif (shift, employee) in blocked_shifts or not available[i, j]:
+                var.Proto().domain[:] = [0, 0]
+            else:
+                var.Proto().domain[:] = [0, 1]
+
+    def __build_model(self) -> None:
+        """Builds a new CP-SAT model of the schedule: variables, constraints and objective terms."""
+        # Index shifts by date / type once per solve
+        self.__index = ScheduleIndex(self.shifts)
+        index = self.__index
+        holiday_dates = set(self.holiday_dates)
+
         # ------------------------ Variable ---------------------------
-        self.__shift_vars = {}
-        for shift in self.shifts:
-            for employee in self.employees:
-                self.__shift_vars[(shift, employee)] = self.__model.NewBoolVar('shift_{}_employee_{}'.format(shift.name, employee.name))
+        self.__model = cp_model.CpModel()
+        spans = BuildSpans(self.__model, self.__record)
+        self.__spans = spans.spans
+        # Unavailable employees get no variable for the shift, unless they are assigned to it
+        spans.begin('eligibility')
+        self.__available, eligible = self.__eligibility()
+        spans.begin('variables')
+        # A sparse model has constants for the pairs already assigned
+        fixed = self.__assignment() if self.__sparse else None
+        self.__shift_vars = ShiftVariables(self.__model, self.shifts, self.employees, eligible, fixed)
+        shift_vars = self.__shift_vars
 
     
 
@@ -637,102 +2586,36 @@ class Schedule:
 
 
         # Each shift must be assigned to employees more than or equal to min_employees, and less than or equal to max_employees
+        spans.begin('coverage')
         for shift in self.shifts:
-            self.__model.Add(sum(self.__shift_vars[(shift, employee)] for employee in self.employees) >= shift.min_employees) # type: ignore
-            self.__model.Add(sum(self.__shift_vars[(shift, employee)] for employee in self.employees) <= shift.max_employees) # type: ignore
+            self.__model.Add(shift_vars.sum(shift_vars.shift(shift)) >= shift.min_employees) # type: ignore
+            self.__model.Add(shift_vars.sum(shift_vars.shift(shift)) <= shift.max_employees) # type: ignore
 
         # If the shift is assigned to employees, fixed the shift assigned to the employees
-        fixed_shifts = [] # List of tuples (shift, employee)
+        spans.begin('fixed_shifts')
+        fixed_shifts = set() # Set of tuples (shift, employee)
         for shift in self.shifts:
             for employee in shift.employees:
-                fixed_shifts.append((shift, employee))
-        for shift, employee in fixed_shifts:
-            self.__model.Add(self.__shift_vars[(shift, employee)] == 1)
+                fixed_shifts.add((shift, employee))
 
 
         # The shift should only be assigned to the employees who are available (Compare to employee's tasks)
+        spans.begin('availability')
         for date in self.dates:
             constraints[f'employee_availability_{date.date()}'] = self.__model.NewBoolVar(f'employee_availability_constraints_{date.date()}')
-            for shift in self.get_shifts_by_date(date):
-                for employee in self.employees:
-                    if not employee.is_available(shift) and (shift, employee) not in fixed_shifts:
-                        self.__model.Add(self.__shift_vars[(shift, employee)] == 0)
-                        # self.__model.Add(self.__shift_vars[(shift, employee)] == 0).OnlyEnforceIf(constraints[f'employee_availability_{date.date()}']) # type: ignore
-                    if not employee.is_available(shift) and (shift, employee) in fixed_shifts:
-                        print(f'Warning: {employee.first_name} is not available for {shift.name} but is assigned to it.')
+
+        # Fixed and unavailable assignments are set through the variables' domains rather than
+        # constraints, so an incremental solve can change them without rebuilding the model
+        self.__bound_assignments(fixed_shifts)
 
 
         # Logical matrix for 2 shift types in the same day that cannot be assigned to the same employee in the same day
+        spans.begin('shift_types_matrix')
         # constraints['shift_types_matrix'] = self.__model.NewBoolVar('shift_types_logical_matrix_constraints')
 
 
-        shift_types_matrix = {
-            'labels' : ['s1', 's1+', 'mc', 's2', 's2+', 'observe', 'ems', 'amd', 'avd'],
-            'matrix': [
-              # s1 s1+ mc s2 s2+ ob em amd avd
-                [0, 0, 0, 0, 0, 0, 0, 1, 0], # s1
-                [0, 0, 0, 0, 0, 1, 1, 1, 1], # s1+
-                [0, 0, 0, 1, 1, 0, 0, 1, 1], # mc
-                [0, 0, 1, 0, 0, 0, 0, 1, 0], # s2
-                [0, 0, 1, 0, 0, 1, 1, 1, 1], # s2+
-                [0, 1, 0, 0, 1, 0, 0, 1, 1], # ob
-                [0, 1, 0, 0, 1, 0, 0, 1, 1], # em
-                [1, 1, 1, 1, 1, 1, 1, 0, 1], # amd
-                [0, 1, 1, 0, 1, 1, 1, 1, 0]  # avd
-            ]
-        }
-
-        shift_labels = shift_types_matrix['labels']
-        matrix = shift_types_matrix['matrix']
-
-        for date in [d for d in self.dates if d.day < 16]:
-            # constraints[f'shift_types_matrix_{date.date()}'] = self.__model.NewBoolVar(f'shift_types_matrix_constraints_{date.date()}')
-            shifts = self.get_shifts_by_date(date)
-            for shift1 in shifts:
-                for shift2 in shifts:
-                    if shift1 != shift2 and shift1.type in shift_labels and shift2.type in shift_labels:
-                        i = shift_labels.index(shift1.type)
-                        j = shift_labels.index(shift2.type)
-                        if not matrix[i][j]:
-                            constraints[f'shift_types_matrix_{date.date()}_{shift1.type}_{shift2.type}'] = self.__model.NewBoolVar(f'shift_types_matrix_constraints_{date.date()}_{shift1.type}_{shift2.type}')
-                            # print(f'{shift1.name} and {shift2.name} cannot be assigned to the same employee in the same day.')
-                            for employee in self.employees:
-                                # self.__model.Add(self.__shift_vars[(shift1, employee)] + self.__shift_vars[(shift2, employee)] <= 1)
-                                self.__model.Add(self.__shift_vars[(shift1, employee)] + self.__shift_vars[(shift2, employee)] <= 1).OnlyEnforceIf(constraints[f'shift_types_matrix_{date.date()}_{shift1.type}_{shift2.type}']) # type: ignore
-
-        shift_types_matrix = {
-            'labels' : ['s1', 's1+', 'mc', 's2', 's2+', 'observe', 'ems', 'amd', 'avd'],
-            'matrix': [
-              # s1 s1+ mc s2 s2+ ob em amd avd
-                [0, 0, 0, 0, 0, 0, 0, 1, 0], # s1
-                [0, 0, 0, 0, 0, 1, 1, 1, 1], # s1+
-                [0, 0, 0, 1, 1, 0, 0, 1, 1], # mc
-                [0, 0, 1, 0, 0, 0, 0, 1, 0], # s2
-                [0, 0, 1, 0, 0, 1, 1, 1, 1], # s2+
-                [0, 1, 0, 0, 1, 0, 0, 1, 1], # ob
-                [0, 1, 0, 0, 1, 0, 0, 1, 1], # em
-                [1, 1, 1, 1, 1, 1, 1, 0, 0], # amd
-                [0, 1, 1, 0, 1, 1, 1, 0, 0]  # avd
-            ]
-        }
-
-        shift_labels = shift_types_matrix['labels']
-        matrix = shift_types_matrix['matrix']
-
-        for date in [d for d in self.dates if d.day >= 16]:
-            # constraints[f'shift_types_matrix2_{date.date()}'] = self.__model.NewBoolVar(f'shift_types_matrix_constraints2_{date.date()}')
-            shifts = self.get_shifts_by_date(date)
-            for shift1 in shifts:
-                for shift2 in shifts:
-                    if shift1 != shift2 and shift1.type in shift_labels and shift2.type in shift_labels:
-                        i = shift_labels.index(shift1.type)
-                        j = shift_labels.index(shift2.type)
-                        if not matrix[i][j]:
-                            # print(f'{shift1.name} and {shift2.name} cannot be assigned to the same employee in the same day.')
-                            constraints[f'shift_types_matrix_{date.date()}_{shift1.type}_{shift2.type}'] = self.__model.NewBoolVar(f'shift_types_matrix_constraints_{date.date()}_{shift1.type}_{shift2.type}')
-                            for employee in self.employees:
-                                # self.__model.Add(self.__shift_vars[(shift1, employee)] + self.__shift_vars[(shift2, employee)] <= 1)
-                                self.__model.Add(self.__shift_vars[(shift1, employee)] + self.__shift_vars[(shift2, employee)] <= 1).OnlyEnforceIf(constraints[f'shift_types_matrix_{date.date()}_{shift1.type}_{shift2.type}']) # type: ignore
+        for date in self.dates:
+            self.__add_shift_type_conflicts(self.shift_type_conflicts(date), date.date(), constraints)
 
 
         # # Minimum and maximum shifts per employee per schedule per shift type
@@ -761,59 +2644,58 @@ class Schedule:
         #     # TODO: In case of failure, change to objective
 
         # Custom shift groups summate to a specific value per employee
+        spans.begin('group_sum')
 
 
 
-        shift_group_sum = {
-            ('max',('mc')) : 2,
-            ('min',('mc')) : 1,
-            ('max',('amd')) : 2,
-            ('min',('amd')) : 1,
-            ('max',('avd')) : 3,
-            ('min',('avd')) : 2,
-            ('max',('s1', 's2')) : 4,
-            ('min',('s1', 's2')) : 3,
-            ('max',('s1', 's1+', 's2', 's2+')) : 8,
-            ('min',('s1', 's1+', 's2', 's2+')) : 7,
-            
-        }
+        shift_group_sum = self.shift_group_sum
+        group_blocks = {group: shift_vars.rows(index.shifts_of_type(group[1])) for group in shift_group_sum}
         for employee in self.employees:
+            carry = self.carry.get(employee, {})
             for group in shift_group_sum:
-                shifts = [self.__shift_vars[(shift, employee)] for shift in self.shifts if shift.type in group[1]]
+                shifts = shift_vars.sum(group_blocks[group][:, employee._index]) + carry.get(group[1], 0)
                 # constraints[f'shift_group_sum_max_{group[1]}'] = self.__model.NewBoolVar('shift_group_sum_max_constraints')
                 constraints[f'shift_group_sum_min_{group[1]}_{employee.first_name}'] = self.__model.NewBoolVar(f'shift_group_sum_min_constraints_{group[1]}_{employee.first_name}')
                 # print(f'{employee.first_name} {shifts}')
                 if group[0] == 'max':
-                    self.__model.Add(sum(shifts) <= shift_group_sum[group])
-                    # self.__model.Add(sum(shifts) <= shift_group_sum[group]).OnlyEnforceIf(constraints['shift_group_sum_max']) # type: ignore
+                    self.__model.Add(shifts <= shift_group_sum[group])
+                    # self.__model.Add(shifts <= shift_group_sum[group]).OnlyEnforceIf(constraints['shift_group_sum_max']) # type: ignore
                 elif group[0] == 'min':
-                    self.__model.Add(sum(shifts) >= shift_group_sum[group])
+                    self.__model.Add(shifts >= shift_group_sum[group])
                     # self.__model.Add(sum(shifts) >= shift_group_sum[group]).OnlyEnforceIf(constraints[f'shift_group_sum_min_{group[1]}_{employee.first_name}']) # type: ignore
 
 
         #AVD
+        spans.begin('avd')
+        avd_block = shift_vars.rows([shift for shift in index.shifts_of_type('avd') if shift.day >=16])
         for employee in self.employees:
-            constraints[f'avd_max_{employee.first_name}'] = self.__model.NewBoolVar(f'avd_constraints_{employee.first_name}')
-            constraints[f'avd_min_{employee.first_name}'] = self.__model.NewBoolVar(f'avd_constraints_{employee.first_name}')
+            low, high = shift_vars.bounds(avd_block[:, employee._index])
+            constraints[f'avd_max_{employee.first_name}'] = self.__literal(f'avd_constraints_{employee.first_name}', always=high <= 2, never=low > 2)
+            constraints[f'avd_min_{employee.first_name}'] = self.__literal(f'avd_constraints_{employee.first_name}', always=low >= 1, never=high < 1)
             # shifts = [self.__shift_vars[(shift, employee)] for shift in self.shifts if shift.type in ['avd'] and shift.day <16]
             # self.__model.Add(sum(shifts) <= 2)
             # self.__model.Add(sum(shifts) >= 1)
-            shifts = [self.__shift_vars[(shift, employee)] for shift in self.shifts if shift.type in ['avd'] and shift.day >=16]
-            self.__model.Add(sum(shifts) <= 2).OnlyEnforceIf(constraints[f'avd_max_{employee.first_name}']) # type: ignore
-            self.__model.Add(sum(shifts) >= 1).OnlyEnforceIf(constraints[f'avd_min_{employee.first_name}']) # type: ignore
+            shifts = shift_vars.sum(avd_block[:, employee._index])
+            if not shift_vars.is_constant(constraints[f'avd_max_{employee.first_name}']):
+                self.__model.Add(shifts <= 2).OnlyEnforceIf(constraints[f'avd_max_{employee.first_name}']) # type: ignore
+            if not shift_vars.is_constant(constraints[f'avd_min_{employee.first_name}']):
+                self.__model.Add(shifts >= 1).OnlyEnforceIf(constraints[f'avd_min_{employee.first_name}']) # type: ignore
 
         #Holiday
+        spans.begin('holiday')
+        holiday_block = shift_vars.rows([shift for date in holiday_dates for shift in index.shifts_on(date)])
         for employee in self.employees:
             # constraints[f'holiday_max_{employee.first_name}'] = self.__model.NewBoolVar(f'holiday_constraints_{employee.first_name}')
             # constraints[f'holiday_min_{employee.first_name}'] = self.__model.NewBoolVar(f'holiday_constraints_{employee.first_name}')
-            shifts = [self.__shift_vars[(shift, employee)] for shift in self.shifts if shift.date in self.holiday_dates]
+            shifts = shift_vars.sum(holiday_block[:, employee._index]) + self.carry.get(employee, {}).get(self.HOLIDAYS, 0)
             # print(f'{employee.first_name} - {shifts}')
-            self.__model.Add(sum(shifts) <= 2)
-            self.__model.Add(sum(shifts) >= 1)
+            self.__model.Add(shifts <= self.holiday_sum['max'])
+            self.__model.Add(shifts >= self.holiday_sum['min'])
 
 
 
         # TODO: Discuss กับ อจก ว่ายังอยากให้มี constraint นี้ไหม
+        spans.begin('group_sum_employee')
         shift_group_sum_employee = {
             ('s1', 's2', 's1+', 's2+'): {
                 'BC': 8,
@@ -852,20 +2734,31 @@ class Schedule:
             },
             }
         
+        employees_by_abbreviation = {}
+        for employee in self.employees:
+            employees_by_abbreviation.setdefault(employee.abbreviation, employee)
+
         for group in shift_group_sum_employee:
             for e in shift_group_sum_employee[group]:
                 
                 # select employee by abbreviation
-                employee = [employee for employee in self.employees if employee.abbreviation == e][0]
+                if e not in employees_by_abbreviation:
+                    continue
+                employee = employees_by_abbreviation[e]
 
 
-                constraints[f'shift_group_sum_employee_{employee.first_name}_{group}'] = self.__model.NewBoolVar(f'shift_group_sum_employee_{employee.first_name}_{group}_constraints')
+                block = shift_vars.block(index.shifts_of_type(group), employee)
+                low, high = shift_vars.bounds(block)
+                target = shift_group_sum_employee[group][e]
+                constraints[f'shift_group_sum_employee_{employee.first_name}_{group}'] = self.__literal(f'shift_group_sum_employee_{employee.first_name}_{group}_constraints',
+                                                                                                       always=low == high == target, never=not low <= target <= high)
                 
-                shifts = [self.__shift_vars[(shift, employee)] for shift in self.shifts if shift.type in group]
+                shifts = shift_vars.sum(block)
                 
                 # print(shifts)
-                # self.__model.Add(sum(shifts) == shift_group_sum_employee[group][e])
-                self.__model.Add(sum(shifts) == shift_group_sum_employee[group][e]).OnlyEnforceIf(constraints[f'shift_group_sum_employee_{employee.first_name}_{group}']) # type: ignore
+                # self.__model.Add(shifts == shift_group_sum_employee[group][e])
+                if not shift_vars.is_constant(constraints[f'shift_group_sum_employee_{employee.first_name}_{group}']):
+                    self.__model.Add(shifts == target).OnlyEnforceIf(constraints[f'shift_group_sum_employee_{employee.first_name}_{group}']) # type: ignore
 
      
         
@@ -878,20 +2771,25 @@ class Schedule:
         obj_int_coeffs = []
 
         # Minimize the number of shifts assigned to the same employee in the same day
+        spans.begin('max_per_day')
         ls_vars = []
         ls_coeff = []
         objective_names.append('Minimize the number of shifts assigned to the same employee in the same day')
         for day in self.days:
             # num_available_employee = len([e for e in self.employees if e.is_available_date(day)])
             # num_shifts = len([s for s in self.shifts if s.start_time.date() == day])
+            day_block = shift_vars.rows(index.shifts_on(day))
             for employee in self.employees:
-                constraints[f'max_shifts_per_day_{day}_{employee.first_name}'] = self.__model.NewBoolVar(f'max_shifts_per_day_constraints_{day}_{employee.first_name}')
-                objectives[f'max_shifts_per_day_{day}_{employee.first_name}'] = self.__model.NewBoolVar(f'max_shifts_per_day_objective_{day}_{employee.first_name}')
+                low, high = shift_vars.bounds(day_block[:, employee._index])
+                constraints[f'max_shifts_per_day_{day}_{employee.first_name}'] = self.__literal(f'max_shifts_per_day_constraints_{day}_{employee.first_name}', always=high <= 2, never=low > 2)
+                objectives[f'max_shifts_per_day_{day}_{employee.first_name}'] = self.__literal(f'max_shifts_per_day_objective_{day}_{employee.first_name}', always=high <= 1, never=low > 1)
                 # objectives[f'max2_shifts_per_day_{day}_{employee.first_name}'] = self.__model.NewBoolVar(f'max2_shifts_per_day_objective_{day}_{employee.first_name}')
-                shifts = [self.__shift_vars[(shift, employee)] for shift in self.shifts if shift.start_time.date() == day]
+                shifts = shift_vars.sum(day_block[:, employee._index])
                 
-                self.__model.Add(sum(shifts)<=1).OnlyEnforceIf(objectives[f'max_shifts_per_day_{day}_{employee.first_name}']) # Soft constraint  # type: ignore
-                self.__model.Add(sum(shifts)<=2).OnlyEnforceIf(constraints[f'max_shifts_per_day_{day}_{employee.first_name}']) # Soft constraint  # type: ignore
+                if not shift_vars.is_constant(objectives[f'max_shifts_per_day_{day}_{employee.first_name}']):
+                    self.__model.Add(shifts<=1).OnlyEnforceIf(objectives[f'max_shifts_per_day_{day}_{employee.first_name}']) # Soft constraint  # type: ignore
+                if not shift_vars.is_constant(constraints[f'max_shifts_per_day_{day}_{employee.first_name}']):
+                    self.__model.Add(shifts<=2).OnlyEnforceIf(constraints[f'max_shifts_per_day_{day}_{employee.first_name}']) # Soft constraint  # type: ignore
                 # self.__model.Add(sum(shifts)<=3)
                 # self.__model.Add(sum(shifts)<=2).OnlyEnforceIf(constraints[f'max_shifts_per_day_{day}_{employee.first_name}']) # Hard constraint  # type: ignore
                 ls_vars.append(objectives[f'max_shifts_per_day_{day}_{employee.first_name}'])
@@ -983,27 +2881,37 @@ class Schedule:
 
     
         # Avoid working with thse shift in the same group on consecutive days
+        spans.begin('consecutive_days')
         ls_vars = []
         ls_coeff = []
         objective_names.append('Avoid working with thse shift in the same group on consecutive days')
-        shift_groups = [
-            ['s1', 's1+', 's2', 's2+'],
-            ['mc'],
-            ['amd', 'avd'],
-            ['avd']
-        ]
-
+        shift_groups = self.CONSECUTIVE_SHIFT_GROUPS
+        window = self.CONSECUTIVE_DAYS_WINDOW
+        days = self.days
         for group in shift_groups:
+            day_blocks = [shift_vars.rows(index.shifts_on_type(day, group)) for day in days]
             for employee in self.employees:
-                shifts = [shift for shift in self.shifts if shift.shift_type in group]
-                for shift1 in shifts:
-                    for shift2 in [shift for shift in shifts if shift != shift1 and shift.start_time > shift1.start_time and shift.start_time - shift1.start_time <= timedelta(days=1)]:
-                        
-                        bool_var = self.__model.NewBoolVar(f'avoid_consecutive_days_{shift1}_{shift2}')
-                        self.__model.Add(sum([self.__shift_vars[(shift1, employee)], self.__shift_vars[(shift2, employee)]])<=1).OnlyEnforceIf(bool_var) # type: ignore
-                        self.__model.Add(self.__shift_vars[(shift1, employee)] == self.__shift_vars[(shift2, employee)]).OnlyEnforceIf(bool_var.Not()) # type: ignore
-                        ls_vars.append(bool_var)
-                        ls_coeff.append(1)
+                # Whether the employee works a shift of the group on each day
+                works = []
+                for day, block in zip(days, day_blocks):
+                    cells = [var for var in block[:, employee._index] if var is not shift_vars.zero]
+                    if not cells:
+                        works.append(shift_vars.zero)
+                    elif len(cells) == 1 or any(var is shift_vars.one for var in cells):
+                        works.append(cells[0] if len(cells) == 1 else shift_vars.one)
+                    else:
+                        works.append(self.__model.NewBoolVar(f'works_{"_".join(group)}_{day}_{employee.first_name}'))
+                        self.__model.AddMaxEquality(works[-1], cells)
+                for k in range(len(days) - 1):
+                    terms = works[k:k + window]
+                    low, high = shift_vars.bounds(terms)
+                    if high <= 1:
+                        continue
+                    bool_var = self.__literal(f'avoid_consecutive_days_{"_".join(group)}_{days[k]}_{employee.first_name}', never=low > 1)
+                    if not shift_vars.is_constant(bool_var):
+                        self.__model.Add(shift_vars.sum(terms) <= 1).OnlyEnforceIf(bool_var) # type: ignore
+                    ls_vars.append(bool_var)
+                    ls_coeff.append(1)
         obj_bool_vars.append(ls_vars)
         obj_bool_coeffs.append(ls_coeff)
                         
@@ -1037,8 +2945,9 @@ class Schedule:
 
 
 
+        spans.begin('objective')
         const_penalties = sum([constraint for constraint in constraints.values()]) 
-        const_penalties_var = self.__model.NewIntVar(-10000, 10000, 'const_penalties')
+        const_penalties_var = self.__model.NewIntVar(*self.__objective_domain, 'const_penalties')
         self.__model.Add(const_penalties_var == const_penalties)
         self.__model.Maximize(const_penalties_var)
 
@@ -1051,14 +2960,14 @@ class Schedule:
         for ls_vars, ls_coeff in zip(obj_bool_vars, obj_bool_coeffs):
             penalties = sum([coeff * vars for coeff, vars in zip(ls_coeff, ls_vars)])
             # print(ls_vars)
-            penalties_var_bool = self.__model.NewIntVar(-10000, 10000, 'penalties')
+            penalties_var_bool = self.__model.NewIntVar(*self.__objective_domain, 'penalties')
             self.__model.Add(penalties_var_bool == penalties)
             ls_penalties.append(penalties_var_bool)
             # print(ls_penalties)
         
         for ls_vars, ls_coeff in zip(obj_int_vars, obj_int_coeffs):
             # penalties = sum([coeff * vars for coeff, vars in zip(ls_coeff, ls_vars)])
-            penalties_var_int = self.__model.NewIntVar(-100000000, 100000000, 'penalties')
+            penalties_var_int = self.__model.NewIntVar(*self.__objective_domain, 'penalties')
             self.__model.Add(cp_model.LinearExpr.WeightedSum(ls_vars, ls_coeff) == penalties_var_int)
             # self.__model.Add(penalties_var == penalties)
             ls_penalties.append(penalties_var_int)
@@ -1066,80 +2975,20 @@ class Schedule:
         
         # print(ls_penalties)
 
+        # Span of every aggregated objective, used to scale weighted objectives
+        self.__tier_ranges = {const_penalties_var.Index(): len(constraints)}
+        for penalties, ls_vars, ls_coeff in zip(ls_penalties, obj_bool_vars + obj_int_vars, obj_bool_coeffs + obj_int_coeffs):
+            self.__tier_ranges[penalties.Index()] = sum(abs(coeff) * max(abs(bound) for bound in var.Proto().domain) for var, coeff in zip(ls_vars, ls_coeff))
+        spans.end()
 
-        # ------------------------ Solver ---------------------------
-
-        # add assumptions
-        # self.__model.AddAssumptions([constraint for constraint in constraints.values()])
-
-
-        solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = time_limit
-        solver.parameters.num_search_workers = 8
-
-        # Solve model - satisfy only constraints
-        print(f'Begin solving with constraints')
-        status = solver.Solve(self.__model)
-
-        print(f'Constraints satisfaction: {solver.Value(const_penalties_var)} ({solver.Value(const_penalties_var) / len(constraints) * 100 :.2f} %)')
-
-        # Save constraint satisfaction
-        self.__model.Add(const_penalties_var >= round(solver.ObjectiveValue()))
-
-        # ----------------- Complete the objectives ------------------
-        for penalties in ls_penalties:
-
-            self.__model.Maximize(penalties)
-            print(f'Begin solving with objective {objective_names[ls_penalties.index(penalties)]}')
-            status = solver.Solve(self.__model)
-            # Save objective satisfaction
-            self.__model.Add(penalties >= round(solver.ObjectiveValue()))
-            try:
-                # print(penalties)
-                print(f'Objective satisfaction: {solver.ObjectiveValue()}')
-            except Exception as e:
-                print(e)
-             
-
-
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            # if verbose:
-            print('Solution:')
-            # print('Objective value =', solver.ObjectiveValue())
-            for shift in self.shifts:
-                for employee in self.employees:
-                    if solver.Value(self.__shift_vars[(shift, employee)]) == 1:
-                        # print(f'{shift.name} is assigned to {employee.name}')
-                        try:
-                            shift.add_employee(employee)
-                            employee.add_task(shift)
-                        except Exception as e:
-                            pass
-            for constraint in constraints:
-                if solver.Value(constraints[constraint]) == 0:
-                    print(f'{constraint} is not satisfied')
-            #     print(f'{constraint}: {solver.BooleanValue(constraints[constraint])}')
-
-            # for objective in objectives:
-            #     print(f'{objective}: {solver.BooleanValue(objectives[objective])}')
+        self.__constraints = constraints
+        self.__objective_names = objective_names
+        self.__const_penalties_var = const_penalties_var
+        self.__ls_penalties = ls_penalties
+        self.__fixed_shifts = fixed_shifts
+        self.__blocked_shifts = set()
+        self.__model_signature = self.__signature()
 
-            # Give a warning if the employee is assigned to 2 shift types in the same day that cannot be assigned to the same employee in the same day
-            # for employee in self.employees:
-            #     for shift1 in [shift for shift in self.shifts if shift not in fixed_shifts]:
-            #         for shift2 in [shift for shift in self.shifts if shift != shift1 and shift.start_time.date() == shift1.start_time.date() and shift not in fixed_shifts]:
-            #             i = shift_labels.index(shift1.shift_type)
-            #             j = shift_labels.index(shift2.shift_type)
-            #             if not matrix[i][j]:
-            #                 if solver.Value(self.__shift_vars[(shift1, employee)]) == 1 and solver.Value(self.__shift_vars[(shift2, employee)]) == 1:
-            #                     print(f'Warning: {employee.name} is assigned to {shift1.name} and {shift2.name} in the same day.')
-            return True
-        else:
-            print('No solution found.')
-            # for constraint in constraints:
-            #     print(f'{constraint}: {solver.BooleanValue(constraints[constraint])}')
-                
-            # print(f'{solver.SufficientAssumptionsForInfeasibility()}')
-            return False
 
     def to_matrix(self):
         """Convert the schedule to a matrix of employee assign to shift"""
@@ -1,6 +1,5 @@
 from datetime import datetime
 from timeinterval import TimeInterval, TimeIntervals
-from shift import Shift
 
 # Create employee class, which contains the employee's name, 
 # and the time intervals that the employee is available for given periods of time
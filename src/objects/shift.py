@@ -55,10 +55,16 @@ class Shift:
             raise Exception("Exceeds maximum number of employees for this shift")
 
         # add if the employee is not already assigned to the shift
+        added = []
         for employee in employees:
             if employee not in self.assigned_employees:
                 self.assigned_employees.append(employee)
                 self.num_assigned_employees += 1
+                added.append(employee)
+
+        # update the employees' availability in one sweep
+        for employee, availability in zip(added, TimeIntervals.sweep_many([employee.availability for employee in added], self.interval, 'difference')):
+            employee.availability = availability
     
     def reset_employees(self):
         self.assigned_employees = []
@@ -1,8 +1,6 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import pandas as pd
-from bisect import bisect_left, bisect_right
 import numpy as np
-import plotly.express as px
 import unittest
 
 class TimeInterval:
@@ -45,20 +43,10 @@ class TimeInterval:
         return self.start_time >= other.end_time
 
     def __add__(self, other):
-        if self > other:
-            return TimeIntervals([other, self])
-        elif self < other:
-            return TimeIntervals([self, other])
-        else:
-            return TimeIntervals([self])
+        return TimeIntervals([self, other])
 
     def __sub__(self, other):
-        if self == other:
-            return TimeIntervals([])
-        elif self < other:
-            return TimeIntervals([self])
-        elif self > other:
-            return TimeIntervals([TimeInterval(other.end_time, self.end_time)])
+        return TimeIntervals([self]) - other
 
     def duration(self) -> int:
         """
@@ -104,47 +92,171 @@ class TimeInterval:
         return (self.start_time < other.end_time) and (other.start_time < self.end_time)
 
 
+# Times of TimeIntervals are stored as int64 microseconds since the epoch
+EPOCH = datetime(1970, 1, 1)
+
+
+def time_zone(times):
+    """The tzinfo of timezone-aware datetimes, None for naive datetimes and for arrays."""
+    if isinstance(times, np.ndarray) and times.dtype != object:
+        return None
+    aware = [time.tzinfo is not None for time in times if isinstance(time, datetime)]
+    if any(aware) and not all(aware):
+        raise ValueError('Invalid value for times: naive and timezone-aware datetimes cannot be mixed')
+    return next(time.tzinfo for time in times if isinstance(time, datetime)) if aware and aware[0] else None
+
+
+def to_microseconds(times) -> np.ndarray:
+    """Converts datetimes, a datetime64 array or int64 microseconds to an int64 microseconds array.
+    Timezone-aware datetimes are converted to UTC."""
+    if time_zone(times) is not None:
+        times = [time.astimezone(timezone.utc).replace(tzinfo=None) for time in times]
+    times = np.asarray(times)
+    if times.dtype.kind in 'iu':
+        return times.astype(np.int64)
+    return times.astype('datetime64[us]').astype(np.int64)
+
+
+def from_microseconds(time: int, tzinfo=None) -> datetime:
+    """The datetime of microseconds since the epoch, in tzinfo if given (the microseconds are then UTC)."""
+    if tzinfo is None:
+        return EPOCH + timedelta(microseconds=int(time))
+    return (EPOCH + timedelta(microseconds=int(time))).replace(tzinfo=timezone.utc).astimezone(tzinfo)
+
+
+def common_time_zone(*time_intervals):
+    """The tzinfo of the result of an operation on time intervals, the one of the first non-empty
+    operand. Raises a ValueError if naive and timezone-aware operands are mixed."""
+    # Empty operands go with any time zone
+    tzinfos = [intervals.tzinfo for intervals in time_intervals if len(intervals)]
+    if len({tzinfo is None for tzinfo in tzinfos}) > 1:
+        raise ValueError('Invalid value for time intervals: naive and timezone-aware intervals cannot be mixed')
+    if tzinfos:
+        return tzinfos[0]
+    return next((intervals.tzinfo for intervals in time_intervals if intervals.tzinfo is not None), None)
+
+
+# Whether a segment is in the result of a set operation, from whether it is in the left and the right operand
+SET_OPERATIONS = {
+    'union': np.logical_or,
+    'intersection': np.logical_and,
+    'difference': lambda left, right: left & ~right,
+    'symmetric_difference': np.logical_xor,
+}
+
+
 class TimeIntervals:
     """
-    A class representing a list of time intervals. Each interval is represented as an instance of the TimeInterval class.
-    
+    A class representing a set of time intervals, stored as a sorted array of disjoint intervals.
+
+    Overlapping and touching intervals are merged. The intervals are kept in bounds, an (n, 2) int64
+    array of start and end times in microseconds since the epoch, sorted by start time, so that
+    containment and overlap queries are binary searches and unions are merges of sorted arrays.
+    Timezone-aware times are stored in UTC, and given back in the time zone of tzinfo.
+
     Attributes:
     -----------
-    intervals : List[TimeInterval]
-        A list of TimeInterval instances representing the time intervals.
-        
+    bounds : np.ndarray
+        The (n, 2) int64 array of the start and end times of the merged intervals.
+
+    tzinfo : tzinfo
+        The time zone of timezone-aware intervals, None for naive ones.
+
     Methods:
     --------
     __init__(intervals: List[TimeInterval])
         Initializes a new instance of the TimeIntervals class with the specified list of intervals.
-        
-    __repr__() -> str
-        Returns a string representation of the TimeIntervals instance.
-        
-    __str__() -> str
-        Returns a string representation of the TimeIntervals instance.
-        
-    __add__(other: TimeIntervals) -> TimeIntervals
-        Adds the intervals of another TimeIntervals instance to this instance and returns a new TimeIntervals instance.
-        
-    __sub__(other: TimeIntervals) -> TimeIntervals
-        Subtracts the intervals of another TimeIntervals instance from this instance and returns a new TimeIntervals instance.
-        
+
+    from_arrays(starts, ends) -> TimeIntervals
+        Creates a TimeIntervals instance from arrays of start and end times.
+
+    union(other), intersection(other), difference(other), symmetric_difference(other) -> TimeIntervals
+        Set operations with another TimeIntervals or a TimeInterval, also as the + or |, &, - and ^ operators.
+
+    sweep_many(lefts, rights, operation) -> List[TimeIntervals]
+        The same set operation on many pairs of time intervals at once.
+
+    contains_many(starts, ends) -> np.ndarray
+        Returns for every interval of the arrays whether one of the intervals contains it.
+
+    overlap_many(starts, ends) -> np.ndarray
+        Returns for every interval of the arrays whether it overlaps with one of the intervals.
+
     combine_intervals(intervals: List[TimeInterval]) -> List[TimeInterval]
         Combines a list of overlapping intervals into a list of non-overlapping intervals and returns the result.
-        
+
     visualize_gantt()
         Generates a Gantt chart visualization of the time intervals using Plotly.
     """
 
     def __init__(self, intervals):
         """
-        Initializes a TimeIntervals object with a list of non-overlapping TimeInterval objects.
+        Initializes a TimeIntervals object with a list of TimeInterval objects.
+
+        Args:
+        - intervals (List[TimeInterval]): a list of TimeInterval objects, overlapping intervals are merged.
+        """
+        intervals = list(intervals)
+        starts = [interval.start_time for interval in intervals]
+        ends = [interval.end_time for interval in intervals]
+        self.tzinfo = time_zone(starts + ends)
+        self.bounds = self.merge(to_microseconds(starts), to_microseconds(ends))
+
+    @classmethod
+    def from_arrays(cls, starts, ends) -> 'TimeIntervals':
+        """
+        Creates a TimeIntervals object from arrays of start and end times, without creating TimeInterval objects.
 
         Args:
-        - intervals (List[TimeInterval]): a list of non-overlapping TimeInterval objects.
+        - starts: the start times, as datetimes, a datetime64 array or int64 microseconds since the epoch
+        - ends: the end times, in the same format as starts
         """
-        self.intervals = self.combine_intervals(intervals)
+        time_intervals = cls.__new__(cls)
+        time_intervals.tzinfo = time_zone(starts)
+        if time_zone(ends) != time_intervals.tzinfo:
+            raise ValueError('Invalid value for ends: not in the time zone of starts')
+        time_intervals.bounds = cls.merge(to_microseconds(starts), to_microseconds(ends))
+        return time_intervals
+
+    @staticmethod
+    def merge(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        Sorts intervals and merges the overlapping and touching ones.
+
+        Args:
+        - starts (np.ndarray): the int64 start times
+        - ends (np.ndarray): the int64 end times
+
+        Returns:
+        - The (n, 2) int64 array of the merged intervals, sorted by start time.
+        """
+        if len(starts) != len(ends):
+            raise ValueError('starts and ends must have the same length')
+        if np.any(ends <= starts):
+            raise ValueError('end_time must be greater than start_time')
+        order = np.argsort(starts, kind='stable')
+        starts, ends = starts[order], ends[order]
+        # An interval starts a new group if it starts after the end of all the intervals before it
+        reach = np.maximum.accumulate(ends) if len(ends) else ends
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = starts[1:] > reach[:-1]
+        last = np.append(np.nonzero(first)[0][1:] - 1, len(starts) - 1) if len(starts) else np.array([], dtype=np.intp)
+        return np.stack([starts[first], reach[last]], axis=1).astype(np.int64).reshape(-1, 2)
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.bounds[:, 0]
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self.bounds[:, 1]
+
+    @property
+    def intervals(self) -> list:
+        return [TimeInterval(from_microseconds(start, self.tzinfo), from_microseconds(end, self.tzinfo)) for start, end in self.bounds]
+
+    def __len__(self):
+        return len(self.bounds)
 
     def __repr__(self):
         return f'TimeIntervals({self.intervals})'
@@ -153,29 +265,148 @@ class TimeIntervals:
         return ', '.join(str(interval) for interval in self.intervals)
 
     def __add__(self, other):
-        intervals = self.intervals + other.intervals
-        return TimeIntervals(intervals)
+        return self.union(other)
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
 
     def __sub__(self, other):
-        intervals = self.intervals + other.intervals
-        events = []
-        for interval in intervals:
-            events.append((interval.start_time, 1))
-            events.append((interval.end_time, -1))
-        events.sort()
-        result_intervals = []
-        count = 0
-        start_time = None
-        for time, delta in events:
-            if count == 0 and start_time is not None:
-                result_intervals.append(TimeInterval(start_time, time))
-            count += delta
-            if count == 0:
-                start_time = None
-            else:
-                start_time = time
-        return TimeIntervals(result_intervals)
+        return self.difference(other)
 
+    def __xor__(self, other):
+        return self.symmetric_difference(other)
+
+    @staticmethod
+    def _coerce(other) -> 'TimeIntervals':
+        return TimeIntervals([other]) if isinstance(other, TimeInterval) else other
+
+    def union(self, other) -> 'TimeIntervals':
+        """
+        Returns the time covered by the current or the other time intervals.
+
+        Args:
+        - other (TimeIntervals or TimeInterval): the other time intervals
+        """
+        return self.__operation(other, 'union')
+
+    def intersection(self, other) -> 'TimeIntervals':
+        """
+        Returns the time covered by both the current and the other time intervals.
+
+        Args:
+        - other (TimeIntervals or TimeInterval): the other time intervals
+        """
+        return self.__operation(other, 'intersection')
+
+    def difference(self, other) -> 'TimeIntervals':
+        """
+        Returns the time covered by the current time intervals but not by the other time intervals.
+
+        Args:
+        - other (TimeIntervals or TimeInterval): the other time intervals
+        """
+        return self.__operation(other, 'difference')
+
+    def symmetric_difference(self, other) -> 'TimeIntervals':
+        """
+        Returns the time covered by exactly one of the current and the other time intervals.
+
+        Args:
+        - other (TimeIntervals or TimeInterval): the other time intervals
+        """
+        return self.__operation(other, 'symmetric_difference')
+
+    def __operation(self, other, operation: str) -> 'TimeIntervals':
+        other = self._coerce(other)
+        return self._from_bounds(self.sweep(self.bounds, other.bounds, operation), common_time_zone(self, other))
+
+    @classmethod
+    def _from_bounds(cls, bounds: np.ndarray, tzinfo=None) -> 'TimeIntervals':
+        # bounds are already sorted and merged
+        time_intervals = cls.__new__(cls)
+        time_intervals.bounds = bounds
+        time_intervals.tzinfo = tzinfo
+        return time_intervals
+
+    @staticmethod
+    def _covered(bounds: np.ndarray, points: np.ndarray) -> np.ndarray:
+        # Whether every point is in [start, end) of one of the merged intervals
+        if not len(bounds):
+            return np.zeros(len(points), dtype=bool)
+        k = np.searchsorted(bounds[:, 0], points, side='right') - 1
+        return (k >= 0) & (bounds[np.maximum(k, 0), 1] > points)
+
+    @staticmethod
+    def sweep(a: np.ndarray, b: np.ndarray, operation: str) -> np.ndarray:
+        """
+        Set operation on two arrays of merged intervals by a sweep over their boundaries.
+
+        The boundaries of both arrays cut the time into segments that are either inside or outside
+        of each array, the segments kept by the operation are then merged back into intervals.
+
+        Args:
+        - a (np.ndarray): the (n, 2) int64 bounds of the left operand
+        - b (np.ndarray): the (m, 2) int64 bounds of the right operand
+        - operation (str): one of SET_OPERATIONS
+
+        Returns:
+        - The (k, 2) int64 bounds of the result.
+        """
+        if operation not in SET_OPERATIONS:
+            raise ValueError(f'Invalid value for operation: {operation}')
+        points = np.unique(np.concatenate([a.ravel(), b.ravel()]))
+        if len(points) < 2:
+            return np.empty((0, 2), dtype=np.int64)
+        inside = SET_OPERATIONS[operation](TimeIntervals._covered(a, points[:-1]), TimeIntervals._covered(b, points[:-1]))
+        return TimeIntervals.merge(points[:-1][inside], points[1:][inside])
+
+    @staticmethod
+    def sweep_many(lefts: list['TimeIntervals'], rights, operation: str) -> list['TimeIntervals']:
+        """
+        The same set operation on many pairs of time intervals in a single sweep, e.g. the
+        availability of every employee minus the shifts assigned to them.
+
+        The intervals of row r are moved to their own band of time, r * span after the earliest
+        time, so that the rows never meet and one sweep computes all the results.
+
+        Args:
+        - lefts (List[TimeIntervals]): the left operands
+        - rights (List[TimeIntervals] or TimeIntervals): the right operands, one per left operand
+          or one for all of them
+        - operation (str): one of SET_OPERATIONS
+
+        Returns:
+        - The list of the results, one per left operand.
+        """
+        if isinstance(rights, (TimeIntervals, TimeInterval)):
+            rights = [TimeIntervals._coerce(rights)] * len(lefts)
+        if len(rights) != len(lefts):
+            raise ValueError('lefts and rights must have the same length')
+        rights = [TimeIntervals._coerce(right) for right in rights]
+        if not lefts:
+            return []
+        tzinfos = [common_time_zone(left, right) for left, right in zip(lefts, rights)]
+        common_time_zone(*lefts, *rights)
+        a = [left.bounds for left in lefts]
+        b = [right.bounds for right in rights]
+        times = np.concatenate([bounds.ravel() for bounds in a + b])
+        if not len(times):
+            return [TimeIntervals._from_bounds(np.empty((0, 2), dtype=np.int64), tzinfo) for tzinfo in tzinfos]
+        low, span = int(times.min()), int(times.max() - times.min()) + 1
+        if span * len(lefts) >= 2 ** 62:
+            # The bands don't fit in int64
+            return [TimeIntervals._from_bounds(TimeIntervals.sweep(x, y, operation), tzinfo) for x, y, tzinfo in zip(a, b, tzinfos)]
+
+        offsets = np.arange(len(lefts), dtype=np.int64) * span - low
+        def banded(arrays):
+            return np.concatenate([bounds + offset for bounds, offset in zip(arrays, offsets)])
+        result = TimeIntervals.sweep(banded(a), banded(b), operation)
+        rows = result[:, 0] // span
+        splits = np.searchsorted(rows, np.arange(1, len(lefts)))
+        return [TimeIntervals._from_bounds(bounds - offset, tzinfo) for bounds, offset, tzinfo in zip(np.split(result, splits), offsets, tzinfos)]
 
     def contains(self, interval):
         """
@@ -187,11 +418,31 @@ class TimeIntervals:
         Returns:
         - True if the current time intervals contain the specified time interval, False otherwise
         """
-        for iv in self.intervals:
-            if iv.contains(interval):
-                return True
-        return False
-    
+        return bool(self.contains_many([interval.start_time], [interval.end_time])[0])
+
+    def contains_many(self, starts, ends) -> np.ndarray:
+        """
+        Returns for every interval given by starts and ends whether one of the current time intervals contains it.
+
+        Args:
+        - starts: the start times, as datetimes, a datetime64 array or int64 microseconds since the epoch
+        - ends: the end times, in the same format as starts
+
+        Returns:
+        - A boolean array with one value per interval.
+        """
+        starts, ends = self._query_times(starts), self._query_times(ends)
+        # The last interval starting at or before every start
+        k = np.searchsorted(self.starts, starts, side='right') - 1
+        return (k >= 0) & (self.ends[np.maximum(k, 0)] >= ends) if len(self.bounds) else np.zeros(len(starts), dtype=bool)
+
+    def _query_times(self, times) -> np.ndarray:
+        # Datetimes of a query must be naive or aware like the intervals, arrays are taken as they are
+        aware = [time.tzinfo is not None for time in times if isinstance(time, datetime)] if not isinstance(times, np.ndarray) else []
+        if aware and len(self.bounds) and aware[0] != (self.tzinfo is not None):
+            raise ValueError('Invalid value for times: naive and timezone-aware datetimes cannot be mixed')
+        return to_microseconds(times)
+
     def overlap(self, other: 'TimeIntervals') -> bool:
         """
         Returns True if the current time intervals overlap with the other time intervals.
@@ -202,39 +453,69 @@ class TimeIntervals:
         Returns:
         - True if the current time intervals overlap with the other time intervals, False otherwise
         """
-        for interval in self.intervals:
-            for other_interval in other.intervals:
-                if interval.overlap(other_interval):
-                    return True
-        return False
+        return bool(self.overlap_many(other.starts, other.ends).any())
+
+    def overlap_many(self, starts, ends) -> np.ndarray:
+        """
+        Returns for every interval given by starts and ends whether it overlaps with one of the current time intervals.
+
+        Args:
+        - starts: the start times, as datetimes, a datetime64 array or int64 microseconds since the epoch
+        - ends: the end times, in the same format as starts
+
+        Returns:
+        - A boolean array with one value per interval.
+        """
+        starts, ends = self._query_times(starts), self._query_times(ends)
+        # The first interval ending after every start
+        k = np.searchsorted(self.ends, starts, side='right')
+        inside = k < len(self.bounds)
+        return inside & (self.starts[np.minimum(k, len(self.bounds) - 1)] < ends) if len(self.bounds) else np.zeros(len(starts), dtype=bool)
+
+    @staticmethod
+    def contains_matrix(time_intervals: list['TimeIntervals'], starts, ends) -> np.ndarray:
+        """
+        Containment of many intervals in many time intervals, e.g. of shifts in the availability of every employee.
+
+        Args:
+        - time_intervals (List[TimeIntervals]): the time intervals of the rows, e.g. the employees' availability
+        - starts: the start times of the columns, e.g. of the shifts
+        - ends: the end times of the columns
+
+        Returns:
+        - A (len(time_intervals), len(starts)) boolean array.
+        """
+        if not isinstance(starts, np.ndarray):
+            # The time zone check of contains_many, on one time per row
+            for intervals in time_intervals:
+                intervals._query_times(list(starts[:1]))
+        starts, ends = to_microseconds(starts), to_microseconds(ends)
+        matrix = np.zeros((len(time_intervals), len(starts)), dtype=bool)
+        for row, intervals in enumerate(time_intervals):
+            matrix[row] = intervals.contains_many(starts, ends)
+        return matrix
 
     def duration(self) -> int:
         """
         Returns the total duration of the time intervals as the sum of the durations of the individual intervals.
 
         Returns:
-        - The total duration of the time intervals as an int.
+        - The total duration of the time intervals in seconds.
         """
-        return sum(interval.duration().total_seconds() for interval in self.intervals)
+        return float((self.ends - self.starts).sum() / 1e6)
 
     @staticmethod
     def combine_intervals(intervals):
-        intervals.sort(key=lambda x: x.start_time)
-        merged_intervals = []
-        for interval in intervals:
-            idx = bisect_right(merged_intervals, interval)
-            if idx == 0 or interval.start_time > merged_intervals[idx-1].end_time:
-                merged_intervals.insert(idx, interval)
-            else:
-                merged_intervals[idx-1].end_time = max(merged_intervals[idx-1].end_time, interval.end_time)
-        return merged_intervals
+        return TimeIntervals(intervals).intervals
 
     def visualize_gantt(self):
         """
         Generates a Gantt chart visualization of the time intervals using Plotly.
         """
-        # Combine intervals into a single interval
-        combined_intervals = self.combine_intervals(self.intervals)
+        # Plotly is only needed for the chart, it is not in requirements.txt
+        import plotly.express as px
+
+        combined_intervals = self.intervals
 
         # Create a Pandas DataFrame with the interval data
         data = pd.DataFrame({'Task': ['Time Intervals'] * len(combined_intervals),
@@ -251,4 +532,3 @@ class TimeIntervals:
 
         # Show the chart
         fig.show()
-
@@ -0,0 +1,167 @@
+import contextlib
+import io
+import threading
+import time
+import unittest
+from unittest import mock
+
+from googlesheetapp import GoogleSheetApp
+
+
+KEY = 'spreadsheet'
+
+
+class FakeClient:
+    """Stands in for the gspread client: every sheet holds the same values, and the requests
+    made through its spreadsheets and worksheets are counted."""
+
+    def __init__(self):
+        self.values = [['a', 'b'], ['c', 'd']]
+        self.requests = []
+
+    def open_by_key(self, key):
+        self.requests.append(('open', key))
+        return FakeSpreadsheet(self, key)
+
+
+class FakeSpreadsheet:
+
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+
+    def worksheet(self, name):
+        self.client.requests.append(('worksheet', name))
+        return FakeWorksheet(self.client, name)
+
+    def values_batch_get(self, ranges):
+        self.client.requests.append(('batch', tuple(ranges)))
+        return {'valueRanges': [{'range': range, 'values': self.client.values} for range in ranges]}
+
+
+class FakeWorksheet:
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def get_values(self, range):
+        self.client.requests.append(('get', self.name, range))
+        return [list(row) for row in self.client.values]
+
+    def update(self, range, values):
+        self.client.requests.append(('update', self.name, range))
+        self.client.values = values
+
+
+class GoogleSheetAppTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+        patcher = mock.patch('gspread.service_account', return_value=self.client)
+        self.service_account = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def requests(self, kind: str) -> list:
+        return [request for request in self.client.requests if request[0] == kind]
+
+
+class TestCache(GoogleSheetAppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app = GoogleSheetApp(cache_values=True, values_ttl=60)
+
+    def test_hit(self):
+        self.assertEqual(self.app.get_sheet_values(KEY, 'Week!A1:B2'), [['a', 'b'], ['c', 'd']])
+        values = self.app.get_sheet_values(KEY, 'Week ! A1:B2')
+        self.assertEqual(values, [['a', 'b'], ['c', 'd']])
+        self.assertEqual(len(self.requests('get')), 1)
+        # The cached rows are copies
+        values[0][0] = 'changed'
+        self.assertEqual(self.app.get_sheet_values(KEY, 'Week!A1:B2', type='dict'), [{'a': 'c', 'b': 'd'}])
+        self.assertEqual(len(self.requests('get')), 1)
+        # Handles are cached too
+        self.app.get_sheet_values(KEY, 'Week!C1:D2')
+        self.assertEqual((len(self.requests('open')), len(self.requests('worksheet')), len(self.requests('get'))), (1, 1, 2))
+
+    def test_batch_only_requests_missing_ranges(self):
+        self.app.get_sheet_values(KEY, 'Week!A1:B2')
+        values = self.app.batch_get_sheet_values(KEY, ['Week!A1:B2', 'Week!C1:D2'], ['values', 'dict'])
+        self.assertEqual(values, [[['a', 'b'], ['c', 'd']], [{'a': 'c', 'b': 'd'}]])
+        self.assertEqual(self.requests('batch'), [('batch', ("'Week'!C1:D2",))])
+        self.app.batch_get_sheet_values(KEY, ['Week!A1:B2', 'Week!C1:D2'])
+        self.assertEqual(len(self.requests('batch')), 1)
+
+    def test_miss_after_invalidate(self):
+        self.app.get_sheet_values(KEY, 'Week!A1:B2')
+        self.app.get_sheet_values(KEY, 'Other!A1:B2')
+        self.app.invalidate(KEY, 'Week')
+        self.app.get_sheet_values(KEY, 'Week!A1:B2')
+        self.app.get_sheet_values(KEY, 'Other!A1:B2')
+        self.assertEqual(self.requests('get'), [('get', 'Week', 'A1:B2'), ('get', 'Other', 'A1:B2'), ('get', 'Week', 'A1:B2')])
+
+        self.app.invalidate(handles=True)
+        self.app.get_sheet_values(KEY, 'Other!A1:B2')
+        self.assertEqual((len(self.requests('open')), len(self.requests('worksheet')), len(self.requests('get'))), (2, 3, 4))
+
+    def test_miss_after_update(self):
+        self.app.get_sheet_values(KEY, 'Week!A1:B2')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.app.update_sheet_values(KEY, 'Week!A1:B2', [['x', 'y']])
+        self.assertEqual(self.app.get_sheet_values(KEY, 'Week!A1:B2'), [['x', 'y']])
+        self.assertEqual(len(self.requests('get')), 2)
+
+    def test_expiry(self):
+        app = GoogleSheetApp(cache_values=True, values_ttl=0.05)
+        app.get_sheet_values(KEY, 'Week!A1:B2')
+        time.sleep(0.1)
+        app.get_sheet_values(KEY, 'Week!A1:B2')
+        self.assertEqual(len(self.requests('get')), 2)
+
+    def test_values_are_not_cached_by_default(self):
+        app = GoogleSheetApp()
+        app.get_sheet_values(KEY, 'Week!A1:B2')
+        app.get_sheet_values(KEY, 'Week!A1:B2')
+        self.assertEqual(len(self.requests('get')), 2)
+        self.assertEqual(len(self.requests('open')), 1)
+
+
+class TestShared(GoogleSheetAppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        GoogleSheetApp._GoogleSheetApp__shared = None
+        self.addCleanup(setattr, GoogleSheetApp, '_GoogleSheetApp__shared', None)
+
+    def test_single_instance(self):
+        app = GoogleSheetApp.shared()
+        self.assertIs(GoogleSheetApp.shared(), app)
+        self.assertEqual(self.service_account.call_count, 1)
+
+    def test_concurrent_first_calls(self):
+        # A slow client login widens the window between the check and the assignment
+        def service_account(**kwargs):
+            time.sleep(0.05)
+            return self.client
+        self.service_account.side_effect = service_account
+
+        barrier = threading.Barrier(8)
+        apps = []
+
+        def get():
+            barrier.wait()
+            apps.append(GoogleSheetApp.shared())
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(apps), 8)
+        self.assertEqual(len({id(app) for app in apps}), 1)
+        self.assertEqual(self.service_account.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import contextlib
+import io
+import unittest
+from datetime import datetime, timedelta
+
+from googlesheetapp import LocalSheetApp
+from Interface_demo import SchedulerApp
+
+
+SHEET_NAME = 'Test week'
+SHIFT_TYPES = ['mc', 's1', 's1+', 's2', 's2+', 'ems', 'observe', 'amd', 'avd']
+START = datetime(2023, 8, 1)
+STAFFS = [
+    # first_name, last_name, role, abbreviation, active
+    ('Bea', 'Chan', 'doctor', 'BC', 'TRUE'),
+    ('Sam', 'Sato', 'doctor', 'SS', 'TRUE'),
+    ('Pat', 'Ueda', 'resident', 'PU', 'TRUE'),
+    ('Old', 'Timer', 'doctor', 'OT', 'FALSE'),
+]
+
+
+def cell(a1: str) -> tuple:
+    """Row and column indices of an A1 cell, e.g. C11 -> (10, 2)."""
+    column = ''.join(char for char in a1 if char.isalpha())
+    row = int(a1[len(column):])
+    return row - 1, sum((ord(char) - 64) * 26 ** k for k, char in enumerate(reversed(column))) - 1
+
+
+def week_sheet() -> list:
+    """A week of the scheduling sheet, at the ranges read by SchedulerApp."""
+    rows = [[''] * 16 for _ in range(280)]
+
+    def put(a1, values):
+        row, column = cell(a1)
+        for i, value in enumerate(values):
+            rows[row][column + i] = value
+
+    put('E5', ['Test week'])
+    put('C11', [shift_type.upper() for shift_type in SHIFT_TYPES])
+    put('A47', ['first_name', 'last_name', 'role', 'abbreviation', 'active', 'phone', 'email'])
+    put('B72', [staff[3] for staff in STAFFS])
+    put('B107', [staff[3] for staff in STAFFS])
+    put('C145', SHIFT_TYPES)
+    for k, staff in enumerate(STAFFS):
+        put(f'A{48 + k}', list(staff))
+    for day in range(7):
+        date = START + timedelta(days=day)
+        weekend = date.weekday() >= 5
+        put(f'A{12 + day}', [date.strftime('%d/%m/%Y')])
+        # The 3rd is a public holiday
+        put(f'B{12 + day}', ['TRUE' if weekend or day == 2 else 'FALSE'])
+        if day == 0:
+            types = SHIFT_TYPES
+        elif weekend:
+            types = ['avd']
+        else:
+            types = ['mc', 's1', 's2']
+        put(f'C{12 + day}', ['TRUE' if shift_type in types else 'FALSE' for shift_type in SHIFT_TYPES])
+        put(f'B{73 + day}', ['TRUE'] * len(STAFFS))
+        put(f'B{108 + day}', ['TRUE'] * len(STAFFS))
+    # SS is away on the morning of the 3rd, PU on the afternoon of the 5th
+    put('C75', ['FALSE'])
+    put('D112', ['FALSE'])
+    # BC is assigned to the mc shift of the 2nd
+    put('C147', ['BC'])
+    return rows
+
+
+class TestSchedulerApp(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet_app = LocalSheetApp({SHEET_NAME: week_sheet()})
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.app = SchedulerApp(sheet_name=SHEET_NAME, sheet_app=self.sheet_app)
+        self.schedule = self.app.schedule
+
+    def test_one_batch_request(self):
+        self.assertEqual(self.sheet_app.requests, 1)
+
+    def test_schedule(self):
+        schedule = self.schedule
+        self.assertEqual(schedule.name, 'Test week')
+        self.assertEqual((schedule.start_time, schedule.end_time), (START, START + timedelta(days=6)))
+        self.assertEqual([(employee.first_name, employee.last_name, employee.role, employee.abbreviation) for employee in schedule.employees],
+                         [staff[:4] for staff in STAFFS if staff[4] == 'TRUE'])
+        self.assertEqual(sorted(schedule.holidays), [START + timedelta(days=day) for day in (2, 4, 5)])
+
+    def test_shifts(self):
+        hours = {'mc': (8, 4), 's1': (8, 4), 's1+': (8, 4), 's2': (12, 4), 's2+': (12, 4)}
+        expected = [(shift_type, START + timedelta(hours=hours.get(shift_type, (8, 8))[0]), timedelta(hours=hours.get(shift_type, (8, 8))[1])) for shift_type in SHIFT_TYPES]
+        for day in (1, 2, 3, 6):
+            expected += [(shift_type, START + timedelta(days=day, hours=hours[shift_type][0]), timedelta(hours=4)) for shift_type in ('mc', 's1', 's2')]
+        for day in (4, 5):
+            expected.append(('avd', START + timedelta(days=day, hours=8), timedelta(hours=8)))
+        self.assertEqual(sorted((shift.shift_type, shift.start_time, shift.duration) for shift in self.schedule.shifts), sorted(expected))
+        for shift in self.schedule.shifts:
+            self.assertEqual((shift.name, shift.description), (shift.shift_type, shift.shift_type))
+
+    def test_fixed_shifts_and_availability(self):
+        bc, ss, pu = self.schedule.employees
+        assigned = [(shift.shift_type, shift.start_time, [employee.abbreviation for employee in shift.employees]) for shift in self.schedule.shifts if shift.employees]
+        self.assertEqual(assigned, [('mc', START + timedelta(days=1, hours=8), ['BC'])])
+        self.assertEqual([shift.start_time for shift in bc.shifts], [START + timedelta(days=1, hours=8)])
+        self.assertEqual([(task.start_time, task.duration) for task in ss.tasks], [(START + timedelta(days=2, hours=8), timedelta(hours=4))])
+        self.assertEqual([(task.start_time, task.duration) for task in pu.tasks], [(START + timedelta(days=4, hours=12), timedelta(hours=4))])
+
+    def test_batch_matches_single_reads(self):
+        tables = self.app.fetch_tables()
+        self.assertEqual(tables['staffs'], self.app.get_staffs())
+        self.assertEqual(tables['shifts'], self.app.get_shifts())
+        self.assertEqual(tables['holidays'], self.app.get_holidays())
+        self.assertEqual(tables['morning_availability'], self.app.get_morning_availability())
+        self.assertEqual(self.app.get_schedule_name(), 'Test week')
+        self.assertEqual(self.app.get_date(), (START, START + timedelta(days=6)))
+
+    def test_update_schedule(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.app.update_schedule()
+        self.assertEqual(self.sheet_app.requests, 2)
+        # The output range starts at C233, one row per day and one column per shift type
+        rows = self.sheet_app.sheets[SHEET_NAME]
+        self.assertEqual(rows[232][2:11], ['Unassigned'] * 9)
+        self.assertEqual(rows[233][2:5], ['BC', 'Unassigned', ''])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import time
+import unittest
+
+from benchmarks.roster import generate_roster
+from jobs import JobStore, SolveJobQueue, run_job
+
+
+class RosterApp:
+    """Stands in for SchedulerApp: builds a synthetic roster instead of reading a sheet."""
+
+    def __init__(self, sheet_name: str):
+        if sheet_name == 'missing':
+            raise KeyError(f'No sheet named {sheet_name}')
+        self.schedule = generate_roster(13, 31)
+        self.written = False
+
+    def solve(self, **kwargs):
+        return self.schedule.solve(**kwargs)
+
+    def update_schedule(self):
+        self.written = True
+
+
+class JobsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.directory.name, 'jobs.db'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class TestJobStore(JobsTestCase):
+
+    def test_roundtrip(self):
+        job_id = self.store.create('August', {'time_limit': 5, 'objective': 'weighted'})
+        job = self.store.get(job_id)
+        self.assertEqual((job['id'], job['sheet_name'], job['status']), (job_id, 'August', 'queued'))
+        self.assertEqual(job['params'], {'time_limit': 5, 'objective': 'weighted'})
+        self.assertEqual((job['phase'], job['objective'], job['solutions'], job['result'], job['error']), (None, None, 0, None, None))
+        self.assertEqual(job['elapsed'], 0.0)
+
+        started = time.time() - 2
+        self.store.update(job_id, status='running', started_at=started, phase='constraints', objective=12.0, solutions=3)
+        job = self.store.get(job_id)
+        self.assertEqual((job['status'], job['phase'], job['objective'], job['solutions']), ('running', 'constraints', 12.0, 3))
+        self.assertGreaterEqual(job['elapsed'], 2)
+
+        result = {'name': 'August', 'schedule': [['BC', '']], 'phases': [{'name': 'constraints', 'objective': 12.0}]}
+        self.store.update(job_id, status='done', result=result, finished_at=started + 5)
+        job = self.store.get(job_id)
+        self.assertEqual(job['result'], result)
+        self.assertAlmostEqual(job['elapsed'], 5)
+
+    def test_stores_are_shared_through_the_file(self):
+        job_id = self.store.create('August', {})
+        JobStore(self.store.path).update(job_id, status='failed', error='No sheet')
+        self.assertEqual(self.store.get(job_id)['error'], 'No sheet')
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.store.get('unknown'))
+
+    def test_invalid_update(self):
+        job_id = self.store.create('August', {})
+        with self.assertRaises(ValueError):
+            self.store.update(job_id, status='paused')
+        with self.assertRaises(ValueError):
+            self.store.update(job_id, id='other')
+        with self.assertRaises(ValueError):
+            self.store.update(job_id, owner='me')
+        self.assertEqual(self.store.get(job_id)['status'], 'queued')
+
+
+class TestRunJob(JobsTestCase):
+
+    def test_done(self):
+        params = {'time_limit': 2, 'objective': 'weighted', 'write': True, 'workers': 2}
+        job_id = self.store.create('August', params)
+        run_job(self.store.path, job_id, RosterApp, 'August', params)
+        job = self.store.get(job_id)
+        self.assertEqual(job['status'], 'done', job['error'])
+        self.assertEqual(job['phase'], 'weighted')
+        self.assertGreater(job['solutions'], 0)
+        self.assertEqual(job['result']['name'], 'Benchmark 13x31')
+        self.assertEqual(len(job['result']['schedule']), 31)
+        self.assertEqual([phase['name'] for phase in job['result']['phases']], ['weighted'])
+        self.assertEqual(job['objective'], job['result']['phases'][0]['objective'])
+
+    def test_failed(self):
+        params = {'time_limit': 2, 'workers': 1}
+        job_id = self.store.create('missing', params)
+        run_job(self.store.path, job_id, RosterApp, 'missing', params)
+        job = self.store.get(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('No sheet named missing', job['error'])
+        self.assertIsNotNone(job['finished_at'])
+
+
+class TestSolveJobQueue(JobsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.queue = SolveJobQueue(store=self.store, max_jobs=1, workers_per_job=2, app_factory=RosterApp)
+
+    def tearDown(self):
+        self.queue.shutdown()
+        super().tearDown()
+
+    def wait(self, job_id: str, timeout: float = 120) -> dict:
+        deadline = time.time() + timeout
+        while self.queue.status(job_id)['status'] in ('queued', 'running'):
+            self.assertLess(time.time(), deadline, 'job did not finish')
+            time.sleep(0.2)
+        return self.queue.result(job_id)
+
+    def test_submit(self):
+        job_id = self.queue.submit('August', time_limit=2, objective='weighted')
+        status = self.queue.status(job_id)
+        self.assertEqual(set(status), {'id', 'sheet_name', 'status', 'phase', 'objective', 'solutions', 'elapsed', 'error'})
+        self.assertEqual(self.store.get(job_id)['params'], {'time_limit': 2, 'objective': 'weighted', 'write': False, 'workers': 2})
+        failed = self.queue.submit('missing', time_limit=2)
+        job = self.wait(job_id)
+        self.assertEqual(job['status'], 'done', job['error'])
+        self.assertEqual(self.wait(failed)['status'], 'failed')
+
+    def test_invalid_objective(self):
+        with self.assertRaises(ValueError):
+            self.queue.submit('August', objective='fastest')
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.queue.status('unknown'))
+        self.assertIsNone(self.queue.result('unknown'))
+
+
+class TestEndpoints(JobsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        try:
+            from fastapi.testclient import TestClient
+            import app
+        except ImportError as e:
+            self.skipTest(f'the API dependencies are not installed: {e}')
+        self.app = app
+        self.default_queue = app.job_queue
+        app.job_queue = SolveJobQueue(store=self.store, max_jobs=1, workers_per_job=2, app_factory=RosterApp)
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        self.app.job_queue.shutdown()
+        self.app.job_queue = self.default_queue
+        super().tearDown()
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/jobs/unknown').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/unknown/result').status_code, 404)
+
+    def test_result_of_unfinished_jobs(self):
+        job_id = self.store.create('August', {})
+        self.assertEqual(self.client.get(f'/jobs/{job_id}/result').status_code, 409)
+        self.store.update(job_id, status='running', started_at=time.time())
+        response = self.client.get(f'/jobs/{job_id}/result')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('running', response.json()['detail'])
+        response = self.client.get(f'/jobs/{job_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'running')
+
+    def test_result_of_finished_jobs(self):
+        job_id = self.store.create('August', {})
+        self.store.update(job_id, status='done', result={'name': 'August', 'schedule': [], 'phases': []})
+        response = self.client.get(f'/jobs/{job_id}/result')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message': 'Solved', 'status': 'done', 'name': 'August', 'schedule': [], 'phases': []})
+
+        job_id = self.store.create('missing', {})
+        self.store.update(job_id, status='failed', error='No sheet')
+        self.assertEqual(self.client.get(f'/jobs/{job_id}/result').json(), {'message': 'No sheet', 'status': 'failed'})
+
+    def test_solve(self):
+        response = self.client.get('/solve/August', params={'time_limit': 2, 'objective': 'weighted'})
+        self.assertEqual(response.status_code, 200)
+        job_id = response.json()['job_id']
+        deadline = time.time() + 120
+        while self.client.get(f'/jobs/{job_id}').json()['status'] in ('queued', 'running'):
+            self.assertLess(time.time(), deadline, 'job did not finish')
+            time.sleep(0.2)
+        response = self.client.get(f'/jobs/{job_id}/result')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'done')
+
+        response = self.client.get('/solve/August', params={'objective': 'fastest'})
+        self.assertEqual(response.json(), {'message': 'Invalid value for objective: fastest'})
+
+
+if __name__ == '__main__':
+    unittest.main()
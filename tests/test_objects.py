@@ -164,4 +164,172 @@
 
 
 # if __name__ == '__main__':
-#     run_tests()
\ No newline at end of file
+#     run_tests()
+
+import os
+import sys
+# The modules of src/objects import each other by their module names
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'objects')))
+
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+from timeinterval import TimeInterval, TimeIntervals
+from employee import Employee
+from shift import Shift
+
+
+def hours(hour_from: int, hour_to: int, tzinfo=None) -> TimeInterval:
+    return TimeInterval(datetime(2023, 1, 1, tzinfo=tzinfo) + timedelta(hours=hour_from), datetime(2023, 1, 1, tzinfo=tzinfo) + timedelta(hours=hour_to))
+
+
+class TestTimeIntervalsTimeZone(unittest.TestCase):
+
+    def test_aware_times_are_kept(self):
+        tzinfo = timezone(timedelta(hours=7))
+        intervals = TimeIntervals([hours(0, 5, tzinfo)])
+        self.assertEqual(intervals.intervals[0].start_time, datetime(2023, 1, 1, tzinfo=tzinfo))
+        self.assertEqual(intervals.intervals[0].start_time.utcoffset(), timedelta(hours=7))
+        self.assertEqual(intervals.intervals[0].end_time, datetime(2023, 1, 1, 5, tzinfo=tzinfo))
+
+    def test_other_time_zone(self):
+        tzinfo = timezone(timedelta(hours=7))
+        # 01:00 - 03:00 UTC is 08:00 - 10:00 at UTC+7
+        intervals = TimeIntervals([hours(0, 9, tzinfo)]) - hours(1, 3, timezone.utc)
+        self.assertEqual([(interval.start_time, interval.end_time) for interval in intervals.intervals],
+                         [(datetime(2023, 1, 1, 0, tzinfo=tzinfo), datetime(2023, 1, 1, 8, tzinfo=tzinfo))])
+
+    def test_naive_and_aware_are_not_mixed(self):
+        aware = TimeIntervals([hours(0, 5, timezone.utc)])
+        with self.assertRaises(ValueError):
+            aware | TimeIntervals([hours(0, 5)])
+        with self.assertRaises(ValueError):
+            aware.contains(hours(1, 2))
+        with self.assertRaises(ValueError):
+            TimeIntervals([hours(0, 5), hours(6, 7, timezone.utc)])
+        # Empty intervals go with both
+        self.assertEqual((TimeIntervals([]) | aware).tzinfo, timezone.utc)
+
+    def test_duration_is_a_float(self):
+        duration = TimeIntervals([hours(0, 1), hours(2, 4)]).duration()
+        self.assertIs(type(duration), float)
+        self.assertEqual(duration, 3 * 3600)
+
+
+# Set operations of TimeIntervals and the same operations on sets of hours
+OPERATIONS = {
+    'union': lambda a, b: a | b,
+    'intersection': lambda a, b: a & b,
+    'difference': lambda a, b: a - b,
+    'symmetric_difference': lambda a, b: a ^ b,
+}
+
+
+def hour_set(intervals) -> set:
+    """The hours covered by intervals on integer hours, as a point set model."""
+    start = datetime(2023, 1, 1)
+    return {hour for interval in intervals for hour in range(int((interval.start_time - start) / timedelta(hours=1)), int((interval.end_time - start) / timedelta(hours=1)))}
+
+
+def random_intervals(rnd: random.Random, n: int) -> list:
+    return [hours(start, start + rnd.randint(1, 12)) for start in (rnd.randint(0, 72) for _ in range(n))]
+
+
+class TestTimeIntervalsSetOperations(unittest.TestCase):
+
+    def assertDisjoint(self, intervals: TimeIntervals):
+        # Merged intervals neither overlap nor touch
+        for first, second in zip(intervals.intervals, intervals.intervals[1:]):
+            self.assertLess(first.end_time, second.start_time)
+
+    def test_against_point_sets(self):
+        rnd = random.Random(0)
+        for _ in range(500):
+            a, b = random_intervals(rnd, rnd.randint(0, 8)), random_intervals(rnd, rnd.randint(0, 8))
+            left, right = TimeIntervals(a), TimeIntervals(b)
+            for operation, expected in OPERATIONS.items():
+                result = getattr(left, operation)(right)
+                self.assertEqual(hour_set(result.intervals), expected(hour_set(a), hour_set(b)), operation)
+                self.assertDisjoint(result)
+            self.assertEqual(left.overlap(right), bool(hour_set(a) & hour_set(b)))
+            query = random_intervals(rnd, 1)[0]
+            self.assertEqual(left.contains(query), any(hour_set([query]) <= hour_set([interval]) for interval in left.intervals))
+
+    def test_operators(self):
+        left, right = TimeIntervals([hours(0, 4)]), TimeIntervals([hours(2, 6)])
+        self.assertEqual(hour_set((left + right).intervals), hour_set((left | right).intervals))
+        self.assertEqual(hour_set((left & right).intervals), {2, 3})
+        self.assertEqual(hour_set((left - right).intervals), {0, 1})
+        self.assertEqual(hour_set((left ^ right).intervals), {0, 1, 4, 5})
+
+    def test_partial_overlap(self):
+        self.assertEqual(hour_set((hours(0, 4) - hours(2, 6)).intervals), {0, 1})
+        self.assertEqual(hour_set((hours(2, 6) - hours(0, 4)).intervals), {4, 5})
+
+    def test_inner_overlap(self):
+        # Subtracting an inner interval splits the interval in two
+        result = hours(0, 10) - hours(3, 5)
+        self.assertEqual([(interval.start_time, interval.end_time) for interval in result.intervals],
+                         [(hours(0, 3).start_time, hours(0, 3).end_time), (hours(5, 10).start_time, hours(5, 10).end_time)])
+        self.assertEqual(len((hours(3, 5) - hours(0, 10)).intervals), 0)
+
+    def test_touching(self):
+        # Touching intervals are merged, and don't overlap
+        self.assertEqual(len((hours(0, 2) + hours(2, 4)).intervals), 1)
+        self.assertFalse(TimeIntervals([hours(0, 2)]).overlap(TimeIntervals([hours(2, 4)])))
+        self.assertEqual(len((TimeIntervals([hours(0, 2)]) & hours(2, 4)).intervals), 0)
+        self.assertEqual(hour_set((hours(0, 2) - hours(2, 4)).intervals), {0, 1})
+
+    def test_disjoint(self):
+        self.assertEqual(hour_set((hours(0, 2) - hours(5, 6)).intervals), {0, 1})
+        self.assertEqual(len((hours(0, 2) + hours(5, 6)).intervals), 2)
+        self.assertEqual(len((TimeIntervals([hours(0, 2)]) & hours(5, 6)).intervals), 0)
+
+    def test_empty_operand(self):
+        intervals, empty = TimeIntervals([hours(0, 2), hours(4, 6)]), TimeIntervals([])
+        for operation in OPERATIONS:
+            self.assertEqual(hour_set(getattr(intervals, operation)(empty).intervals), OPERATIONS[operation](hour_set(intervals.intervals), set()))
+            self.assertEqual(hour_set(getattr(empty, operation)(intervals).intervals), OPERATIONS[operation](set(), hour_set(intervals.intervals)))
+        self.assertEqual(len(empty - empty), 0)
+        self.assertFalse(empty.contains(hours(0, 1)))
+        self.assertFalse(empty.overlap(intervals))
+
+    def test_sweep_many(self):
+        rnd = random.Random(1)
+        lefts = [TimeIntervals(random_intervals(rnd, rnd.randint(0, 6))) for _ in range(30)]
+        rights = [TimeIntervals(random_intervals(rnd, rnd.randint(0, 6))) for _ in range(30)]
+        shared = TimeIntervals(random_intervals(rnd, 4))
+        for operation, expected in OPERATIONS.items():
+            # One right operand per row
+            for result, left, right in zip(TimeIntervals.sweep_many(lefts, rights, operation), lefts, rights):
+                self.assertEqual(hour_set(result.intervals), expected(hour_set(left.intervals), hour_set(right.intervals)))
+            # The same right operand for all the rows
+            for result, left in zip(TimeIntervals.sweep_many(lefts, shared, operation), lefts):
+                self.assertEqual(hour_set(result.intervals), expected(hour_set(left.intervals), hour_set(shared.intervals)))
+        self.assertEqual(TimeIntervals.sweep_many([], shared, 'union'), [])
+        with self.assertRaises(ValueError):
+            TimeIntervals.sweep_many(lefts, rights[:-1], 'union')
+        with self.assertRaises(ValueError):
+            TimeIntervals.sweep_many(lefts, rights, 'complement')
+
+
+class TestShiftAvailability(unittest.TestCase):
+
+    def setUp(self):
+        self.shift = Shift(hours(8, 16), min_employees=1, max_employees=3, shift_name='Day Shift')
+        self.employee1 = Employee('John', 30, 'male', TimeIntervals([hours(0, 24)]))
+        self.employee2 = Employee('Jane', 30, 'female', TimeIntervals([hours(10, 20)]))
+
+    def test_add_assigned_employee(self):
+        self.shift.add_assigned_employee(self.employee1)
+        self.assertEqual(hour_set(self.employee1.availability.intervals), set(range(0, 8)) | set(range(16, 24)))
+
+    def test_add_assigned_employees(self):
+        self.shift.add_assigned_employees([self.employee1, self.employee2])
+        self.assertEqual(self.shift.num_assigned_employees, 2)
+        self.assertEqual(hour_set(self.employee1.availability.intervals), set(range(0, 8)) | set(range(16, 24)))
+        self.assertEqual(hour_set(self.employee2.availability.intervals), set(range(16, 20)))
+        # Already assigned employees are not updated again
+        self.shift.add_assigned_employees([self.employee1])
+        self.assertEqual(self.shift.num_assigned_employees, 2)
+        self.assertEqual(hour_set(self.employee1.availability.intervals), set(range(0, 8)) | set(range(16, 24)))
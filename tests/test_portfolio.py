@@ -0,0 +1,114 @@
+import json
+import unittest
+from datetime import timedelta
+
+from benchmarks.roster import generate_roster
+from portfolio import rank, solve_scenario
+from source import Schedule
+
+
+def window_schedule() -> Schedule:
+    """A benchmark roster set up like a RollingHorizon window: assignments, a frozen prefix,
+    carried-over counts and an extra holiday."""
+    schedule = generate_roster(13, 14)
+    schedule.add_holiday(schedule.start_time + timedelta(days=2))
+    for k, shift in enumerate(schedule.shifts[:10]):
+        schedule.assign_shift(shift, schedule.employees[k % 3])
+    schedule.frozen_until = schedule.start_time + timedelta(days=2)
+    schedule.carry = {
+        schedule.employees[0]: {('s1', 's2'): 2, 'mc': 1, Schedule.HOLIDAYS: 1},
+        schedule.employees[4]: {('s1', 's1+', 's2', 's2+'): 3},
+    }
+    return schedule
+
+
+class TestScheduleDict(unittest.TestCase):
+
+    def test_roundtrip(self):
+        schedule = window_schedule()
+        data = schedule.to_dict()
+        # Plain values only, as sent to the worker processes
+        loaded = Schedule.from_dict(json.loads(json.dumps(data)))
+        self.assertEqual(loaded.to_dict(), data)
+
+        self.assertEqual((loaded.name, loaded.start_time, loaded.end_time), (schedule.name, schedule.start_time, schedule.end_time))
+        self.assertEqual(loaded.frozen_until, schedule.start_time + timedelta(days=2))
+        self.assertEqual(sorted(loaded.holidays), sorted(schedule.holidays))
+        self.assertEqual(loaded.shift_group_sum, schedule.shift_group_sum)
+        self.assertEqual(loaded.holiday_sum, schedule.holiday_sum)
+        self.assertEqual({loaded.employees.index(employee): counts for employee, counts in loaded.carry.items()},
+                         {0: {('s1', 's2'): 2, 'mc': 1, Schedule.HOLIDAYS: 1}, 4: {('s1', 's1+', 's2', 's2+'): 3}})
+        for original, copy in zip(schedule.employees, loaded.employees):
+            self.assertEqual([(task.start_time, task.duration) for task in copy.tasks], [(task.start_time, task.duration) for task in original.tasks])
+            self.assertEqual([shift.start_time for shift in copy.shifts], [shift.start_time for shift in original.shifts])
+        for original, copy in zip(schedule.shifts, loaded.shifts):
+            self.assertEqual([schedule.employees.index(employee) for employee in original.employees],
+                             [loaded.employees.index(employee) for employee in copy.employees])
+
+    def test_defaults(self):
+        schedule = generate_roster(4, 3)
+        loaded = Schedule.from_dict(schedule.to_dict())
+        self.assertIsNone(loaded.frozen_until)
+        self.assertEqual(loaded.carry, {})
+        # Dicts written before frozen_until, carry and holiday_sum were added
+        data = schedule.to_dict()
+        for key in ('frozen_until', 'carry', 'holiday_sum'):
+            del data[key]
+        loaded = Schedule.from_dict(data)
+        self.assertEqual((loaded.frozen_until, loaded.carry, loaded.holiday_sum), (None, {}, Schedule.HOLIDAY_SUM))
+
+    def test_scenario_keeps_the_frozen_prefix(self):
+        schedule = window_schedule()
+        result = solve_scenario(schedule.to_dict(), {'seed': 0}, workers=2, time_limit=2, objective='weighted')
+        self.assertIsNone(result['error'])
+        solved = Schedule.from_dict(result['schedule'])
+        self.assertEqual(solved.frozen_until, schedule.frozen_until)
+        self.assertEqual(solved.to_dict()['carry'], schedule.to_dict()['carry'])
+
+
+def result(phases, wall_time, solved=True, error=None, schedule=None) -> dict:
+    return {
+        'solved': solved,
+        'phases': [{'name': name, 'status': status, 'objective': objective} for name, status, objective in phases],
+        'wall_time': wall_time,
+        'schedule': schedule,
+        'error': error,
+    }
+
+
+class TestRank(unittest.TestCase):
+
+    def test_ordering(self):
+        schedule = generate_roster(4, 3).to_dict()
+        results = {
+            # Better constraints beat better objectives
+            'fewer constraints': result([('constraints', 'OPTIMAL', 10), ('objective', 'OPTIMAL', 9)], 1.0),
+            'best': result([('constraints', 'OPTIMAL', 12), ('objective', 'OPTIMAL', 5)], 3.0, schedule=schedule),
+            # Same objectives, slower
+            'slow': result([('constraints', 'OPTIMAL', 12), ('objective', 'FEASIBLE', 5)], 4.0),
+            'worse objective': result([('constraints', 'OPTIMAL', 12), ('objective', 'OPTIMAL', 4)], 0.5),
+            # The last phase ran out of time, its objective doesn't count
+            'unknown objective': result([('constraints', 'OPTIMAL', 12), ('objective', 'UNKNOWN', 8)], 0.5),
+            # Unsolved scenarios have no objective, the faster one comes first
+            'unsolved': result([('constraints', 'INFEASIBLE', None)], 0.1, solved=False),
+            'failed': result([], 0.0, solved=False, error='Invalid value for scenario key: x'),
+        }
+        table = rank(list(results), list(results.values()))
+        self.assertEqual(list(table['scenario']), ['best', 'slow', 'worse objective', 'unknown objective', 'fewer constraints', 'failed', 'unsolved'])
+        self.assertEqual(list(table['rank']), list(range(1, 8)))
+        self.assertEqual(list(table.columns), ['rank', 'scenario', 'solved', 'status', 'wall_time', 'error', 'constraints', 'objective', 'schedule'])
+        best = table.iloc[0]
+        self.assertEqual((best['status'], best['constraints'], best['objective']), ('OPTIMAL', 12, 5))
+        self.assertIsInstance(best['schedule'], Schedule)
+        self.assertIsNone(table.iloc[1]['schedule'])
+        self.assertEqual(table.iloc[-2]['error'], 'Invalid value for scenario key: x')
+        self.assertEqual(table.iloc[-1]['status'], 'INFEASIBLE')
+
+    def test_empty(self):
+        table = rank([], [])
+        self.assertEqual(len(table), 0)
+        self.assertIn('rank', table.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
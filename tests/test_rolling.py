@@ -0,0 +1,35 @@
+import contextlib
+import io
+import unittest
+
+from benchmarks.roster import generate_roster
+from rolling import RollingHorizon
+
+
+class TestRollingHorizon(unittest.TestCase):
+
+    def test_boundary_days_are_not_changed(self):
+        # A free seat on every shift, so a window could add employees to its boundary days
+        schedule = generate_roster(13, 31)
+        for shift in schedule.shifts:
+            shift.max_employees = shift.min_employees + 1
+
+        # Assignments when every window starts solving
+        snapshots = []
+        def progress(phase):
+            if phase['name'] == 'constraints' and phase['status'] == 'RUNNING':
+                snapshots.append({shift: set(shift.employees) for shift in schedule.shifts})
+
+        horizon = RollingHorizon(schedule, window_days=14, freeze_days=7, boundary_days=2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(horizon.run(time_limit=10, progress=progress))
+
+        self.assertEqual(len(snapshots), len(horizon.windows))
+        for window, snapshot in zip(horizon.windows, snapshots):
+            for shift in schedule.shifts:
+                if shift.start_time < window['start']:
+                    self.assertEqual(set(shift.employees), snapshot[shift], f"{shift.name} changed by the window of {window['start']}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from benchmarks.roster import generate_roster
+from source import Schedule, ScheduleSnapshot
+
+
+def shifts_of(schedule: Schedule) -> list:
+    return [(shift.name, shift.description, shift.start_time, shift.duration, shift.shift_type, shift.min_employees, shift.max_employees)
+            for shift in schedule.shifts]
+
+
+def employees_of(schedule: Schedule) -> list:
+    return [(employee.first_name, employee.last_name, employee.role, employee.abbreviation,
+             [(task.name, task.description, task.start_time, task.duration) for task in employee.tasks])
+            for employee in schedule.employees]
+
+
+def assignments_of(schedule: Schedule) -> set:
+    return {(i, schedule.employees.index(employee)) for i, shift in enumerate(schedule.shifts) for employee in shift.employees}
+
+
+def carry_of(schedule: Schedule) -> dict:
+    return {schedule.employees.index(employee): counts for employee, counts in schedule.carry.items()}
+
+
+class TestScheduleSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'schedule.snap')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def roundtrip(self, schedule: Schedule, mmap: bool = True) -> Schedule:
+        schedule.save(self.path)
+        self.assertTrue(ScheduleSnapshot.is_snapshot(self.path))
+        return Schedule.load(self.path, mmap=mmap)
+
+    def assertSameSchedule(self, loaded: Schedule, schedule: Schedule):
+        self.assertEqual(loaded.name, schedule.name)
+        self.assertEqual((loaded.start_time, loaded.end_time), (schedule.start_time, schedule.end_time))
+        self.assertEqual(shifts_of(loaded), shifts_of(schedule))
+        self.assertEqual(employees_of(loaded), employees_of(schedule))
+        self.assertEqual(assignments_of(loaded), assignments_of(schedule))
+        self.assertEqual(sorted(loaded.holidays), sorted(schedule.holidays))
+        self.assertEqual(loaded.shift_group_sum, schedule.shift_group_sum)
+        self.assertEqual(loaded.holiday_sum, schedule.holiday_sum)
+        self.assertEqual(carry_of(loaded), carry_of(schedule))
+        self.assertEqual(loaded.frozen_until, schedule.frozen_until)
+        self.assertEqual(loaded.to_dict(), schedule.to_dict())
+
+    def test_roundtrip(self):
+        schedule = generate_roster(13, 14)
+        # Assignments, also kept as the employees' shifts
+        for k, shift in enumerate(schedule.shifts[:40]):
+            schedule.assign_shift(shift, schedule.employees[k % len(schedule.employees)])
+        schedule.add_holiday(schedule.start_time + timedelta(days=2))
+        schedule.remove_holiday(schedule.holidays[0])
+        schedule.shift_group_sum[('max', ('s1', 's2'))] = 5
+        schedule.holiday_sum = {'max': 3, 'min': 0}
+        schedule.carry = {schedule.employees[0]: {'mc': 2, Schedule.HOLIDAYS: 1}, schedule.employees[3]: {('s1', 's2'): 4}}
+        schedule.frozen_until = schedule.start_time + timedelta(days=3)
+
+        for mmap in (True, False):
+            loaded = self.roundtrip(schedule, mmap=mmap)
+            self.assertSameSchedule(loaded, schedule)
+            for shift in loaded.shifts:
+                for employee in shift.employees:
+                    self.assertIn(shift, employee.shifts)
+
+    def test_empty_schedule(self):
+        schedule = Schedule('Empty', datetime(2023, 8, 1), datetime(2023, 8, 31))
+        loaded = self.roundtrip(schedule)
+        self.assertSameSchedule(loaded, schedule)
+        self.assertEqual(loaded.shifts, [])
+        self.assertEqual(loaded.employees, [])
+
+    def test_date_range(self):
+        schedule = generate_roster(13, 14)
+        for k, shift in enumerate(schedule.shifts):
+            schedule.assign_shift(shift, schedule.employees[k % len(schedule.employees)])
+        start, end = datetime(2023, 8, 3), datetime(2023, 8, 6)
+        schedule.save(self.path)
+        part = Schedule.load(self.path, start=start, end=end)
+        expected = [shift for shift in schedule.shifts if start <= shift.start_time < end]
+        self.assertEqual([shift.name for shift in part.shifts], [shift.name for shift in expected])
+        self.assertEqual([[employee.name for employee in shift.employees] for shift in part.shifts],
+                         [[employee.name for employee in shift.employees] for shift in expected])
+        self.assertEqual((part.start_time, part.end_time), (start, end - timedelta(microseconds=1)))
+
+        # The frozen prefix is the whole schedule's, also for a part of it
+        schedule.frozen_until = start
+        schedule.save(self.path)
+        self.assertEqual(Schedule.load(self.path, start=start, end=end).frozen_until, start)
+
+    def test_range_outside_of_the_schedule(self):
+        schedule = generate_roster(4, 7)
+        schedule.save(self.path)
+        for start, end in [(datetime(2023, 9, 1), None), (None, datetime(2023, 7, 1)), (datetime(2023, 8, 5), datetime(2023, 8, 3)),
+                           (datetime(2023, 8, 3), datetime(2023, 8, 3)), (schedule.end_time, None)]:
+            with self.assertRaises(ValueError, msg=f'{start} to {end}'):
+                Schedule.load(self.path, start=start, end=end)
+        # Ranges overlapping the schedule are clipped to it
+        part = Schedule.load(self.path, start=datetime(2023, 7, 1), end=datetime(2023, 8, 3))
+        self.assertEqual((part.start_time, part.end_time), (schedule.start_time, datetime(2023, 8, 3) - timedelta(microseconds=1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,784 @@
+import unittest
+
+import contextlib
+import copyreg
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.roster import generate_roster
+from source import AssignmentSet, AvailabilityBitmap, Employee, GreedyScheduler, InMemoryMetrics, JSONLinesMetrics, MetricsSink, PrometheusMetrics, Schedule, Shift, ShiftSolutionStream, ShiftTypeConflicts, SolverConfig, Task
+
+
+def two_team_schedule() -> Schedule:
+    """Four workdays and two teams of two employees that never share a shift: team A works the
+    mc shifts in the morning, team B the s2 shifts in the afternoon. A1 and B1 are away on the
+    first day, so alternating the days is the only roster without consecutive days."""
+    start = datetime(2023, 8, 7)
+    schedule = Schedule('Two teams', start, start + timedelta(days=3))
+    schedule.shift_group_sum = {}
+    schedule.holiday_sum = {'max': 2, 'min': 0}
+    for team, (shift_type, hour, other_hour) in {'A': ('mc', 8, 12), 'B': ('s2', 12, 8)}.items():
+        for k in (1, 2):
+            employee = schedule.add_employee(Employee(f'{team}{k}', 'Team', abbreviation=f'{team}{k}'))
+            for day in range(4):
+                employee.add_task(Task('other team', '', start + timedelta(days=day, hours=other_hour), timedelta(hours=4)))
+            if k == 1:
+                employee.add_task(Task('away', '', start + timedelta(hours=hour), timedelta(hours=4)))
+        for day in range(4):
+            schedule.add_shift(Shift(shift_type, shift_type, timedelta(hours=4), start + timedelta(days=day, hours=hour), shift_type))
+    return schedule
+
+
+def assignments(schedule: Schedule) -> set:
+    return {(shift.name, shift.date, employee.abbreviation) for shift in schedule.shifts for employee in shift.employees}
+
+
+def broken_rules(schedule: Schedule) -> dict:
+    """The hard rules and the shift type conflicts broken by the assignments in shift.employees,
+    counted from the schedule rather than by GreedyScheduler."""
+    broken = {'coverage': 0, 'shift_group_sum': 0, 'holiday_sum': 0, 'shift_types_matrix': 0}
+    broken['coverage'] = sum(not shift.min_employees <= len(shift.employees) <= shift.max_employees for shift in schedule.shifts)
+    holiday_dates = set(schedule.holiday_dates)
+    for employee in schedule.employees:
+        shifts = [shift for shift in schedule.shifts if employee in shift.employees]
+        for (bound, types), value in schedule.shift_group_sum.items():
+            count = len([shift for shift in shifts if shift.shift_type in ((types,) if isinstance(types, str) else types)])
+            broken['shift_group_sum'] += count > value if bound == 'max' else count < value
+        holidays = len([shift for shift in shifts if shift.date in holiday_dates])
+        broken['holiday_sum'] += not schedule.holiday_sum['min'] <= holidays <= schedule.holiday_sum['max']
+        for date in {shift.date for shift in shifts}:
+            matrix = [matrix for first_day, matrix in Schedule.SHIFT_TYPES_MATRICES if first_day <= date.day][-1]
+            labels = matrix['labels']
+            types = [labels.index(shift.shift_type) for shift in shifts if shift.date == date]
+            broken['shift_types_matrix'] += any(not matrix['matrix'][a][b] for k, a in enumerate(types) for b in types[k + 1:])
+    return broken
+
+
+def solve(schedule: Schedule, **kwargs) -> bool:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return schedule.solve(verbose=False, **{'time_limit': 10, 'config': SolverConfig(workers=2, seed=0), **kwargs})
+
+
+class TestShiftTypeConflicts(unittest.TestCase):
+
+    def test_cliques_cover_the_conflicts(self):
+        for first_day, matrix in Schedule.SHIFT_TYPES_MATRICES:
+            labels, rows = matrix['labels'], matrix['matrix']
+            conflicts = {frozenset((labels[i], labels[j])) for i in range(len(labels)) for j in range(i, len(labels))
+                         if not rows[i][j] or not rows[j][i]}
+
+            # Pairs of shifts forbidden on the same day by the cliques, a single type for two shifts of that type
+            forbidden = set()
+            for clique, exclusive in ShiftTypeConflicts(labels, rows).cliques:
+                for a in clique:
+                    for b in clique:
+                        if exclusive or a != b:
+                            forbidden.add(frozenset((a, b)))
+            self.assertEqual(forbidden, conflicts, f'matrix from day {first_day}')
+
+    def test_cache(self):
+        labels, rows = Schedule.SHIFT_TYPES_MATRICES[0][1]['labels'], Schedule.SHIFT_TYPES_MATRICES[0][1]['matrix']
+        self.assertIs(ShiftTypeConflicts(labels, rows).cliques, ShiftTypeConflicts(list(labels), [list(row) for row in rows]).cliques)
+
+    def test_invalid_matrix(self):
+        with self.assertRaises(ValueError):
+            ShiftTypeConflicts(['a', 'b'], [[1, 0], [0]])
+
+
+class TestAssignmentSet(unittest.TestCase):
+
+    def test_insertion_order(self):
+        items = AssignmentSet(['c', 'a', 'b'])
+        items.append('d')
+        items.append('a') # already in, keeps its place
+        self.assertEqual(list(items), ['c', 'a', 'b', 'd'])
+        self.assertEqual(items[0], 'c')
+        self.assertEqual(items[-1], 'd')
+        self.assertEqual(items[1:3], ['a', 'b'])
+        self.assertEqual(len(items), 4)
+        self.assertEqual(items, ['c', 'a', 'b', 'd'])
+
+    def test_remove(self):
+        items = AssignmentSet(['c', 'a', 'b'])
+        self.assertEqual(items[1], 'a')
+        items.remove('a')
+        self.assertNotIn('a', items)
+        self.assertEqual(list(items), ['c', 'b'])
+        # The cached list used for indexing follows the change
+        self.assertEqual(items[1], 'b')
+        with self.assertRaises(ValueError):
+            items.remove('a')
+        items.append('a')
+        self.assertEqual(list(items), ['c', 'b', 'a'])
+        items.clear()
+        self.assertEqual(len(items), 0)
+        self.assertFalse(items)
+
+    def test_view_after_mutation(self):
+        items = AssignmentSet([1, 2, 3, 4])
+        even = lambda item: item % 2 == 0
+        view = items.view(even)
+        self.assertEqual(view, [2, 4])
+        self.assertIs(items.view(even), view)
+        items.append(6)
+        self.assertEqual(items.view(even), [2, 4, 6])
+        items.remove(2)
+        self.assertEqual(items.view(even), [4, 6])
+        # The first view is a snapshot of the set when it was cached
+        self.assertEqual(view, [2, 4])
+
+    def test_pickle(self):
+        items = AssignmentSet(['a', 'b'])
+        items.view(str.isalpha)
+        self.assertEqual(list(pickle.loads(pickle.dumps(items))), ['a', 'b'])
+
+    def test_employee_views(self):
+        employee = Employee('John', 'Doe')
+        task = Task('leave', '', datetime(2023, 8, 1, 8), timedelta(hours=4))
+        shift = Shift('mc', 'mc', timedelta(hours=4), datetime(2023, 8, 2, 8), 'mc')
+        employee.add_task(task)
+        self.assertEqual(employee.shifts, [])
+        employee.add_task(shift)
+        self.assertEqual(employee.shifts, [shift])
+        self.assertEqual(employee.tasks, [task])
+        employee.remove_task(task)
+        self.assertEqual(employee.tasks, [])
+        self.assertEqual(employee.all_tasks, [shift])
+        with self.assertRaises(Exception):
+            employee.add_task(shift)
+
+
+class PreSlots:
+    """Pickles like the classes did before __slots__: the object's class and its __dict__, as
+    written by pickle.dumps with protocol 0 or 1."""
+
+    def __init__(self, cls, **state):
+        self.cls = cls
+        self.state = state
+
+    def __reduce_ex__(self, protocol):
+        return copyreg._reconstructor, (self.cls, object, None), self.state
+
+
+class TestSlots(unittest.TestCase):
+
+    def test_pickle(self):
+        employee = Employee('John', 'Doe', 'doctor', 'JD')
+        task = Task('leave', 'annual', datetime(2023, 8, 1, 8), timedelta(hours=4))
+        shift = Shift('mc', 'morning', timedelta(hours=4), datetime(2023, 8, 2, 8), 'MC', 0, 2)
+        employee.add_task(task)
+        employee.add_task(shift)
+        shift.employees.append(employee)
+
+        employee, task, shift = pickle.loads(pickle.dumps((employee, task, shift)))
+        self.assertEqual((employee.name, employee.abbreviation, employee.role), ('John Doe', 'JD', 'doctor'))
+        self.assertEqual((task.name, task.description, task.start_time, task.end_time), ('leave', 'annual', datetime(2023, 8, 1, 8), datetime(2023, 8, 1, 12)))
+        self.assertEqual((shift.shift_type, shift.min_employees, shift.max_employees, shift.end_time), ('mc', 0, 2, datetime(2023, 8, 2, 12)))
+        self.assertIsInstance(employee.all_tasks, AssignmentSet)
+        self.assertEqual((employee.tasks, employee.shifts), ([task], [shift]))
+        self.assertEqual(list(shift.employees), [employee])
+
+    def test_pickle_from_before_slots(self):
+        created = datetime(2023, 7, 1)
+        employee = PreSlots(Employee, first_name='John', last_name='Doe', name='John Doe', abbreviation='JD', role='doctor',
+                            _id=uuid.uuid4(), _created_at=created, _updated_at=created, _index=None, all_tasks=[])
+        task = PreSlots(Task, name='leave', description='', start_time=datetime(2023, 8, 1, 8), duration=timedelta(hours=4),
+                        end_time=datetime(2023, 8, 1, 12), _id=uuid.uuid4(), _created_at=created, _updated_at=created)
+        shift = PreSlots(Shift, name='mc', description='mc', start_time=datetime(2023, 8, 2, 8), duration=timedelta(hours=4),
+                         end_time=datetime(2023, 8, 2, 12), _id=uuid.uuid4(), _created_at=created, _updated_at=created,
+                         shift_type='mc', min_employees=1, max_employees=1, employees=[employee], _index=3)
+        employee.state['all_tasks'] += [task, shift]
+
+        employee, task, shift = pickle.loads(pickle.dumps((employee, task, shift)))
+        self.assertEqual((type(employee), type(task), type(shift)), (Employee, Task, Shift))
+        self.assertEqual(employee.full_name, 'John Doe')
+        self.assertIsInstance(employee.all_tasks, AssignmentSet)
+        self.assertEqual((employee.tasks, employee.shifts), ([task], [shift]))
+        self.assertIsInstance(shift.employees, AssignmentSet)
+        self.assertEqual(list(shift.employees), [employee])
+        # end_time is computed now, the stored value is dropped
+        self.assertEqual((task.end_time, shift.end_time), (datetime(2023, 8, 1, 12), datetime(2023, 8, 2, 12)))
+        shift.duration = timedelta(hours=6)
+        self.assertEqual(shift.end_time, datetime(2023, 8, 2, 14))
+        self.assertEqual(shift._index, 3)
+
+    def test_from_arrays(self):
+        rnd = random.Random(0)
+        fields = []
+        for k in range(50):
+            low = rnd.randint(0, 2)
+            fields.append((f'shift {k}', rnd.choice(['mc', 'avd', '']), timedelta(minutes=rnd.randint(0, 720)),
+                           datetime(2023, 8, rnd.randint(1, 31), rnd.randint(0, 23), rnd.randint(0, 59)), rnd.choice(['MC', 's1', 'Avd']), low, low + rnd.randint(0, 2)))
+        one_by_one = [Shift(*values) for values in fields]
+        names, descriptions, durations, start_times, shift_types, lows, highs = (list(column) for column in zip(*fields))
+        from_arrays = Shift.from_arrays(names, descriptions, np.array(durations, dtype='timedelta64[us]'), np.array(start_times, dtype='datetime64[us]'), shift_types, lows, highs)
+
+        attributes = ('name', 'description', 'start_time', 'duration', 'end_time', 'date', 'day', 'shift_type', 'min_employees', 'max_employees', '_index')
+        self.assertEqual(len(from_arrays), len(one_by_one))
+        for shift, expected in zip(from_arrays, one_by_one):
+            self.assertIs(type(shift), Shift)
+            self.assertEqual([getattr(shift, name) for name in attributes], [getattr(expected, name) for name in attributes])
+            # Plain Python values, not numpy scalars
+            self.assertEqual((type(shift.start_time), type(shift.duration), type(shift.min_employees)), (datetime, timedelta, int))
+            self.assertIsInstance(shift.employees, AssignmentSet)
+            self.assertEqual(len(shift.employees), 0)
+        self.assertEqual(len({shift._id for shift in from_arrays + one_by_one}), 2 * len(fields))
+
+        # A single value for all the shifts, and datetimes instead of arrays
+        shifts = Shift.from_arrays(names[:3], descriptions[:3], durations[:3], start_times[:3], 'mc', 1, 2)
+        self.assertEqual([(shift.shift_type, shift.min_employees, shift.max_employees) for shift in shifts], [('mc', 1, 2)] * 3)
+
+    def test_from_arrays_checks(self):
+        start = datetime(2023, 8, 1, 8)
+        with self.assertRaises(ValueError):
+            Shift.from_arrays(['a'], ['a', 'b'], [timedelta(hours=4)] * 2, [start] * 2, 'mc')
+        with self.assertRaises(AssertionError):
+            Shift.from_arrays(['a'], ['a'], [timedelta(hours=-1)], [start], 'mc')
+        with self.assertRaises(AssertionError):
+            Shift.from_arrays(['a'], ['a'], [timedelta(hours=4)], [start], 'mc', 2, 1)
+
+
+class TestAvailabilityBitmap(unittest.TestCase):
+
+    def assertAgrees(self, employees, shifts):
+        available = AvailabilityBitmap(employees, shifts).available
+        self.assertEqual(available.shape, (len(shifts), len(employees)))
+        for i, shift in enumerate(shifts):
+            for j, employee in enumerate(employees):
+                self.assertEqual(available[i, j], employee.is_available(shift), f'{shift} for {employee.all_tasks}')
+
+    def test_boundaries_and_partial_overlaps(self):
+        day = datetime(2023, 8, 1)
+        shift = Shift('mc', 'mc', timedelta(hours=4), day + timedelta(hours=8), 'mc')
+        # (start hour, duration in hours) of a single task, and whether the employee is available for the 8:00-12:00 shift
+        cases = [
+            ((4, 4), True),    # ends when the shift starts
+            ((12, 4), True),   # starts when the shift ends
+            ((8, 4), False),   # same time as the shift
+            ((6, 4), False),   # overlaps the start
+            ((10, 4), False),  # overlaps the end
+            ((6, 8), False),   # covers the shift
+            ((9, 2), True),    # inside the shift, as for Employee.is_available
+            ((8, 2), False),   # starts with the shift
+            ((10, 2), False),  # ends with the shift
+            ((8, 0), True),    # empty task at the start
+            ((0, 24), False),
+        ]
+        employees = []
+        for (hour, hours), _ in cases:
+            employee = Employee('E', 'Mployee')
+            employee.add_task(Task('', '', day + timedelta(hours=hour), timedelta(hours=hours)))
+            employees.append(employee)
+        # Assigned shifts are not tasks and don't make the employee unavailable
+        employees[0].add_task(Shift('s1', 's1', timedelta(hours=4), day + timedelta(hours=8), 's1'))
+        self.assertEqual(AvailabilityBitmap(employees, [shift]).available[0].tolist(), [available for _, available in cases])
+        self.assertAgrees(employees, [shift])
+
+    def test_random_tasks(self):
+        rnd = random.Random(0)
+        day = datetime(2023, 8, 1)
+        for _ in range(20):
+            employees = [Employee(f'E{j}', 'Mployee') for j in range(5)]
+            for employee in employees:
+                for _ in range(rnd.randint(0, 6)):
+                    employee.add_task(Task('', '', day + timedelta(hours=rnd.randint(0, 47)), timedelta(hours=rnd.randint(0, 10))))
+            shifts = [Shift('s', 's', timedelta(hours=rnd.choice([0, 1, 4, 8, 12])), day + timedelta(hours=rnd.randint(0, 47)), 's') for _ in range(30)]
+            self.assertAgrees(employees, shifts)
+
+    def test_roster(self):
+        schedule = generate_roster(13, 31, availability=0.8)
+        self.assertAgrees(schedule.employees, schedule.shifts)
+
+    def test_empty(self):
+        self.assertEqual(AvailabilityBitmap([], []).available.shape, (0, 0))
+        employee = Employee('E', 'Mployee')
+        shift = Shift('mc', 'mc', timedelta(hours=4), datetime(2023, 8, 1, 8), 'mc')
+        self.assertEqual(AvailabilityBitmap([employee], [shift]).available.tolist(), [[True]])
+
+
+class TestSparseModel(unittest.TestCase):
+
+    @staticmethod
+    def drafted_roster(num_employees: int, num_days: int, fixed_days: int):
+        """Builds of a benchmark roster with the greedy draft of its first fixed_days days as fixed assignments."""
+        # The local search of the draft is timed, so it is made once and assigned to every build
+        draft = GreedyScheduler(generate_roster(num_employees, num_days)).run()
+        pairs = [(i, j) for i, j in zip(*draft.assignment().nonzero()) if draft.shifts[i].start_time < draft.schedule.start_time + timedelta(days=fixed_days)]
+
+        def build():
+            schedule = generate_roster(num_employees, num_days)
+            for i, j in pairs:
+                schedule.assign_shift(schedule.shifts[i], schedule.employees[j])
+            return schedule
+        return build
+
+    def assertSameObjectives(self, build, **kwargs):
+        results = {}
+        for sparse in (False, True):
+            schedule = build()
+            fixed = assignments(schedule)
+            self.assertTrue(solve(schedule, sparse=sparse, config=SolverConfig(workers=8, seed=0), **kwargs))
+            self.assertTrue(all(phase['status'] == 'OPTIMAL' for phase in schedule.phases), schedule.phases)
+            self.assertLessEqual(fixed, assignments(schedule))
+            results[sparse] = ([(phase['name'], phase['objective']) for phase in schedule.phases], len(schedule.model.Proto().variables))
+        self.assertEqual(results[True][0], results[False][0])
+        self.assertLess(results[True][1], results[False][1])
+
+    def test_fully_fixed_roster(self):
+        self.assertSameObjectives(self.drafted_roster(13, 31, 31))
+
+    def test_partly_fixed_roster(self):
+        self.assertSameObjectives(self.drafted_roster(8, 7, 5))
+
+    def test_two_teams(self):
+        def build():
+            schedule = two_team_schedule()
+            schedule.assign_shift(schedule.shifts[1], schedule.employees[0])
+            return schedule
+        self.assertSameObjectives(build)
+
+
+def shift_fields(shifts) -> list:
+    return [(shift.name, shift.description, shift.start_time, shift.duration, shift.shift_type, shift.min_employees, shift.max_employees) for shift in shifts]
+
+
+def legacy_add_shifts(schedule: Schedule, shift: Shift, holiday=False, until=None) -> list:
+    """The shifts Schedule.add_shifts created before it delegated to add_recurring_shifts, as shift_fields."""
+    if holiday:
+        dates = [date for date in schedule.dates if date.date() >= shift.start_time.date()]
+    else:
+        dates = [date for date in schedule.dates if date not in schedule.holidays and date.date() >= shift.start_time.date()]
+    shifts = []
+    for date in dates:
+        if until is not None and date > until:
+            break
+        start_time = datetime.combine(date, shift.start_time.time())
+        shifts.append((shift.name + ' ' + str(start_time.date()), shift.description, start_time, shift.duration, shift.shift_type, shift.min_employees, shift.max_employees))
+    return shifts
+
+
+def consecutive_pairs(schedule: Schedule) -> int:
+    """Consecutive days counted like the objective did before the per-day literals: the pairs of
+    shifts of a group, worked by the same employee, with the second one starting within a day
+    after the first."""
+    count = 0
+    for group in Schedule.CONSECUTIVE_SHIFT_GROUPS:
+        shifts = [shift for shift in schedule.shifts if shift.shift_type in group]
+        for employee in schedule.employees:
+            worked = [shift for shift in shifts if employee in shift.employees]
+            count += sum(timedelta(0) < second.start_time - first.start_time <= timedelta(days=1) for first in worked for second in worked)
+    return count
+
+
+class TestConsecutiveDays(unittest.TestCase):
+    OBJECTIVE = 'Avoid working with thse shift in the same group on consecutive days'
+
+    def objective(self, schedule: Schedule) -> float:
+        return [phase['objective'] for phase in schedule.phases if phase['name'] == self.OBJECTIVE][0]
+
+    def test_window(self):
+        self.assertEqual(Schedule.CONSECUTIVE_DAYS_WINDOW, 2)
+
+    def test_penalties_match_the_pairwise_count(self):
+        # The objective counts the avoided windows. A1 and B1 can't work on the first day, so there
+        # are 2 windows for them and 3 for A2 and B2.
+        windows = 10
+        schedule = two_team_schedule()
+        self.assertTrue(solve(schedule))
+        self.assertEqual(consecutive_pairs(schedule), 0)
+        self.assertEqual(self.objective(schedule), windows)
+
+        rnd = random.Random(0)
+        for case in range(10):
+            schedule = two_team_schedule()
+            for shift in schedule.shifts:
+                team = [employee for employee in schedule.employees if employee.first_name[0] == ('A' if shift.shift_type == 'mc' else 'B')]
+                # The first employee of a team is away on the first day
+                employee = team[1] if shift.date == schedule.start_time.date() else rnd.choice(team)
+                schedule.assign_shift(shift, employee)
+            # All the assignments are fixed, the objective only counts them
+            self.assertTrue(solve(schedule))
+            self.assertEqual(self.objective(schedule), windows - consecutive_pairs(schedule), f'case {case}')
+
+
+class TestRecurringShifts(unittest.TestCase):
+
+    def setUp(self):
+        # Tuesday 1 to Thursday 31 August 2023, the weekends are holidays
+        self.schedule = Schedule('August', datetime(2023, 8, 1), datetime(2023, 8, 31))
+        self.mc = Shift('mc', 'Morning clinic', timedelta(hours=4), datetime(2023, 8, 1, 8), 'mc', 1, 2)
+
+    def test_add_shifts_is_unchanged(self):
+        rnd = random.Random(0)
+        for start_hour in (0, 7):
+            for _ in range(40):
+                schedule = Schedule('August', datetime(2023, 8, 1, start_hour), datetime(2023, 8, rnd.randint(2, 31), start_hour))
+                date = schedule.dates[rnd.randrange(schedule.num_days)]
+                if rnd.random() < 0.5 and date not in schedule.holidays:
+                    schedule.add_holiday(date)
+                template = Shift('s', 'shift', timedelta(hours=rnd.randint(1, 12)), datetime(2023, 8, rnd.randint(1, schedule.end_time.day), rnd.randint(0, 23)), rnd.choice(['mc', 'avd']),
+                                 1, rnd.randint(1, 3))
+                holiday = rnd.random() < 0.5
+                until = rnd.choice([None, datetime(2023, 8, rnd.randint(1, 31), rnd.randint(0, 23)), datetime(2023, 7, 1), datetime(2023, 9, 30)])
+                expected = legacy_add_shifts(schedule, template, holiday, until)
+                schedule.add_shifts(template, holiday=holiday, until=until)
+                self.assertEqual(shift_fields(schedule.shifts), expected, f'{template} holiday={holiday} until={until} in {schedule}')
+
+    def test_holidays(self):
+        excluded = self.schedule.add_recurring_shifts(self.mc)
+        self.assertEqual(len(excluded), 31 - 8)
+        self.assertTrue(all(shift.start_time.weekday() < 5 for shift in excluded))
+        self.assertEqual(excluded[0].name, 'mc 2023-08-01')
+        self.assertEqual(shift_fields(excluded[:1]), [('mc 2023-08-01', 'Morning clinic', datetime(2023, 8, 1, 8), timedelta(hours=4), 'mc', 1, 2)])
+
+        self.schedule.add_holiday(datetime(2023, 8, 14))
+        only = self.schedule.add_recurring_shifts(self.mc, holidays='only')
+        self.assertEqual([shift.start_time.day for shift in only], [5, 6, 12, 13, 14, 19, 20, 26, 27])
+        self.assertEqual(len(self.schedule.add_recurring_shifts(self.mc, holidays='include')), 31)
+        self.assertEqual(len(self.schedule.shifts), 31 - 8 + 9 + 31)
+        # The 14th became a holiday after the first batch
+        self.assertEqual(len(self.schedule.index.shifts_on(datetime(2023, 8, 14).date())), 3)
+
+    def test_weekdays_until_and_every_days(self):
+        shifts = self.schedule.add_recurring_shifts(self.mc, weekdays=[0, 2], until=datetime(2023, 8, 21))
+        self.assertEqual([shift.start_time for shift in shifts], [datetime(2023, 8, day, 8) for day in (2, 7, 9, 14, 16, 21)])
+
+        # From the template's day, on holidays too
+        template = Shift('avd', 'avd', timedelta(hours=8), datetime(2023, 8, 3, 8), 'avd')
+        shifts = self.schedule.add_recurring_shifts(template, holidays='include', every_days=7)
+        self.assertEqual([shift.start_time.day for shift in shifts], [3, 10, 17, 24, 31])
+        # until is compared with the days at the schedule's time of day, midnight here
+        shifts = self.schedule.add_recurring_shifts(template, holidays='include', every_days=7, until=datetime(2023, 8, 17))
+        self.assertEqual([shift.start_time.day for shift in shifts], [3, 10, 17])
+        self.assertEqual(self.schedule.add_recurring_shifts(template, until=datetime(2023, 8, 2)), [])
+
+    def test_rules_per_template(self):
+        s2 = Shift('s2', 's2', timedelta(hours=4), datetime(2023, 8, 1, 12), 's2')
+        shifts = self.schedule.add_recurring_shifts([self.mc, (s2, {'weekdays': [4], 'holidays': 'include'})], until=datetime(2023, 8, 11))
+        self.assertEqual([(shift.shift_type, shift.start_time.day) for shift in shifts],
+                         [('mc', day) for day in (1, 2, 3, 4, 7, 8, 9, 10, 11)] + [('s2', 4), ('s2', 11)])
+        self.assertEqual(self.schedule.shifts, shifts)
+
+    def test_invalid_values(self):
+        with self.assertRaises(ValueError):
+            self.schedule.add_recurring_shifts(self.mc, holidays='skip')
+        with self.assertRaises(ValueError):
+            self.schedule.add_recurring_shifts(self.mc, every_days=0)
+        with self.assertRaises(ValueError):
+            self.schedule.add_recurring_shifts([(self.mc, {'weekday': [0]})])
+        self.assertEqual(self.schedule.shifts, [])
+
+
+class TestObjectiveStrategies(unittest.TestCase):
+    # The only roster of two_team_schedule without consecutive days
+    OPTIMUM = {('mc', datetime(2023, 8, 7 + day).date(), 'A2' if day % 2 == 0 else 'A1') for day in range(4)} | \
+              {('s2', datetime(2023, 8, 7 + day).date(), 'B2' if day % 2 == 0 else 'B1') for day in range(4)}
+
+    def test_strategies_reach_the_optimum(self):
+        for objective in Schedule.OBJECTIVE_STRATEGIES:
+            schedule = two_team_schedule()
+            self.assertTrue(solve(schedule, objective=objective), objective)
+            self.assertEqual(assignments(schedule), self.OPTIMUM, objective)
+            self.assertEqual(broken_rules(schedule), {'coverage': 0, 'shift_group_sum': 0, 'holiday_sum': 0, 'shift_types_matrix': 0})
+            names = [phase['name'] for phase in schedule.phases]
+            if objective == 'weighted':
+                self.assertEqual(names, ['weighted'])
+            else:
+                self.assertEqual(names[0], 'constraints')
+                self.assertEqual(len(names), 3)
+
+    def test_invalid_objective(self):
+        with self.assertRaises(ValueError):
+            solve(two_team_schedule(), objective='fastest')
+
+    def test_tier_weights(self):
+        tier_weights = Schedule._Schedule__tier_weights
+        self.assertEqual(tier_weights([2, 3, 4]), [20, 5, 1])
+        self.assertEqual(tier_weights([7]), [1])
+        # One unit of a tier is worth more than the whole span of the lower tiers
+        ranges = [5, 0, 9, 1]
+        weights = tier_weights(ranges)
+        for k in range(len(ranges) - 1):
+            self.assertGreater(weights[k], sum(weight * span for weight, span in zip(weights[k + 1:], ranges[k + 1:])))
+
+    def test_oversized_tiers(self):
+        with self.assertRaises(ValueError):
+            Schedule._Schedule__tier_weights([2 ** 30, 2 ** 30])
+        # Just below the limit of exact floating point objectives
+        self.assertEqual(Schedule._Schedule__tier_weights([2 ** 26 - 2, 2 ** 27 - 1]), [2 ** 27, 1])
+
+
+class TestSolutionStream(unittest.TestCase):
+
+    def test_queue_keeps_the_last_solutions(self):
+        schedule = two_team_schedule()
+        stream = ShiftSolutionStream(maxsize=2)
+        # Solutions left from an earlier solve are dropped first
+        stream.queue.put({'solution': 'old'})
+        self.assertTrue(solve(schedule, callback=stream))
+        count = stream.solution_count()
+        # At least one solution per phase
+        self.assertGreaterEqual(count, len(schedule.phases))
+        solutions = list(stream.queue.queue)
+        self.assertEqual([solution['solution'] for solution in solutions], [count - 1, count])
+        self.assertIs(solutions[-1], stream.last)
+
+        assignment = stream.last['assignment']
+        self.assertEqual((assignment.dtype, assignment.shape), (np.uint8, (len(schedule.shifts), len(schedule.employees))))
+        self.assertEqual({(schedule.shifts[i].name, schedule.shifts[i].date, schedule.employees[j].abbreviation) for i, j in zip(*np.nonzero(assignment))},
+                         assignments(schedule))
+        self.assertEqual(stream.to_frame().loc[schedule.start_time.date(), 'mc'], ['A2'])
+        self.assertEqual(stream.workload().loc['A1 Team'].to_dict(), {'mc': 2, 's2': 0})
+
+    def test_sink(self):
+        schedule = two_team_schedule()
+        solutions = []
+        stream = ShiftSolutionStream(sink=solutions.append, maxsize=1)
+        self.assertTrue(solve(schedule, callback=stream))
+        self.assertEqual([solution['solution'] for solution in solutions], list(range(1, stream.solution_count() + 1)))
+        self.assertTrue(stream.queue.empty())
+        self.assertIs(solutions[-1], stream.last)
+        for solution in solutions:
+            self.assertEqual(set(solution), {'solution', 'objective', 'wall_time', 'assignment'})
+
+
+def phase_event(status: str, objective, wall_time: float) -> dict:
+    return {'schedule': 'August "A"', 'type': 'phase', 'name': 'constraints', 'status': status, 'objective': objective,
+            'best_bound': objective, 'wall_time': wall_time, 'conflicts': 4, 'branches': 9}
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_sinks_need_record(self):
+        with self.assertRaises(TypeError):
+            MetricsSink()
+
+    def test_in_memory(self):
+        metrics = InMemoryMetrics()
+        schedule = two_team_schedule()
+        self.assertTrue(solve(schedule, metrics=metrics))
+        spans, phases = metrics.spans(), metrics.phases()
+        self.assertEqual(len(spans) + len(phases), len(metrics.events))
+        self.assertEqual(spans[0]['name'], 'eligibility')
+        self.assertEqual([event['name'] for event in phases], [phase['name'] for phase in schedule.phases])
+        for event in metrics.events:
+            self.assertEqual(event['schedule'], 'Two teams')
+        # Every variable of the model is counted by a single span
+        self.assertEqual(sum(span['variables'] for span in spans), len(schedule.model.Proto().variables))
+        self.assertEqual(list(metrics.to_frame('phase')['status']), ['OPTIMAL'] * len(phases))
+        self.assertEqual(len(metrics.to_frame()), len(spans))
+
+    def test_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.jsonl')
+            metrics = JSONLinesMetrics(path)
+            events = [phase_event('FEASIBLE', 12.0, 1.5), phase_event('OPTIMAL', None, 0.5)]
+            before = time.time()
+            for event in events:
+                metrics.record(event)
+            # Appended to, not overwritten
+            JSONLinesMetrics(path).record(events[0])
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 3)
+        for line, event in zip(lines, events + events[:1]):
+            self.assertGreaterEqual(line.pop('timestamp'), before)
+            self.assertEqual(line, event)
+
+    def test_prometheus(self):
+        metrics = PrometheusMetrics()
+        span = {'schedule': 'August "A"', 'type': 'span', 'name': 'coverage', 'wall_time': 0.25, 'variables': 0, 'constraints': 16}
+        metrics.record(span)
+        metrics.record({**span, 'wall_time': 0.5})
+        metrics.record(phase_event('FEASIBLE', 12.0, 1.5))
+        metrics.record(phase_event('OPTIMAL', None, 0.5))
+        lines = metrics.render().splitlines()
+
+        self.assertIn('# HELP scheduler_build_span_seconds Time of the last build of a constraint family', lines)
+        self.assertIn('# TYPE scheduler_build_span_seconds_total counter', lines)
+        self.assertIn('# TYPE scheduler_phase_status gauge', lines)
+        span_labels = 'schedule="August \\"A\\"",span="coverage"'
+        phase_labels = 'phase="constraints",schedule="August \\"A\\""'
+        # Gauges keep the last value, counters add them up
+        self.assertIn(f'scheduler_build_span_seconds{{{span_labels}}} 0.5', lines)
+        self.assertIn(f'scheduler_build_span_seconds_total{{{span_labels}}} 0.75', lines)
+        self.assertIn(f'scheduler_build_span_constraints{{{span_labels}}} 16', lines)
+        self.assertIn(f'scheduler_phase_seconds_total{{{phase_labels}}} 2.0', lines)
+        # A missing objective keeps the previous one
+        self.assertIn(f'scheduler_phase_objective{{{phase_labels}}} 12.0', lines)
+        self.assertIn(f'scheduler_phase_conflicts{{{phase_labels}}} 4', lines)
+        # Only the current status is 1
+        self.assertIn(f'scheduler_phase_status{{{phase_labels},status="FEASIBLE"}} 0', lines)
+        self.assertIn(f'scheduler_phase_status{{{phase_labels},status="OPTIMAL"}} 1', lines)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'scheduler.prom')
+            metrics.write(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), metrics.render())
+            self.assertEqual(os.listdir(directory), ['scheduler.prom'])
+
+    def test_prometheus_empty(self):
+        self.assertEqual(PrometheusMetrics().render(), '\n')
+
+
+class TestDecompose(unittest.TestCase):
+
+    def test_same_assignments_as_a_single_solve(self):
+        single = two_team_schedule()
+        self.assertTrue(solve(single))
+
+        schedule = two_team_schedule()
+        phases, metrics = [], InMemoryMetrics()
+        self.assertTrue(solve(schedule, decompose=True, progress=phases.append, metrics=metrics))
+        self.assertEqual(sorted(sorted(employee.abbreviation for employee in employees) for _, employees in schedule.components()),
+                         [['A1', 'A2'], ['B1', 'B2']])
+        self.assertEqual(assignments(schedule), assignments(single))
+        start = schedule.start_time.date()
+        self.assertEqual({(day - start).days: employee for name, day, employee in assignments(schedule) if name == 'mc'},
+                         {0: 'A2', 1: 'A1', 2: 'A2', 3: 'A1'})
+
+        # Progress and metrics come through the relays, tagged with their component
+        self.assertEqual({phase['component'] for phase in phases}, {0, 1})
+        self.assertEqual({phase['component'] for phase in metrics.phases()}, {0, 1})
+        self.assertEqual({phase['component'] for phase in schedule.phases}, {0, 1})
+
+    def test_output_of_the_components_is_not_interleaved(self):
+        schedule = two_team_schedule()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertTrue(schedule.solve(time_limit=10, verbose=False, config=SolverConfig(workers=2, seed=0), decompose=True))
+        lines = output.getvalue().splitlines()
+        first, second = lines.index('Component 0:'), lines.index('Component 1:')
+        self.assertLess(first, second)
+        # Every component prints its own solve, from its first phase to its solution
+        for block in (lines[first + 1:second], lines[second + 1:]):
+            self.assertEqual(block[0], 'Begin solving with constraints')
+            self.assertIn('Solution:', block)
+
+
+class TestIncrementalSolve(unittest.TestCase):
+
+    def test_repair_after_an_availability_change(self):
+        schedule = two_team_schedule()
+        self.assertTrue(solve(schedule))
+        before = assignments(schedule)
+        a1 = schedule.employees[0]
+        day = schedule.start_time + timedelta(days=1)
+        self.assertIn(('mc', day.date(), 'A1'), before)
+
+        # A1 is now away on the second day too
+        a1.add_task(Task('away', '', day + timedelta(hours=8), timedelta(hours=4)))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertTrue(schedule.solve(time_limit=10, verbose=False, incremental=True, config=SolverConfig(workers=2, seed=0)))
+        self.assertNotIn('rebuilding the model', output.getvalue())
+        self.assertEqual([phase['name'] for phase in schedule.phases], ['repair'])
+        self.assertIn(schedule.phases[0]['status'], ('OPTIMAL', 'FEASIBLE'))
+
+        # Only the shift A1 can no longer work changes hands
+        after = assignments(schedule)
+        self.assertEqual(before - after, {('mc', day.date(), 'A1')})
+        self.assertEqual(after - before, {('mc', day.date(), 'A2')})
+        self.assertEqual(broken_rules(schedule), dict.fromkeys(broken_rules(schedule), 0))
+        for shift in schedule.shifts:
+            self.assertEqual(len(shift.employees), 1)
+            for employee in schedule.employees:
+                self.assertEqual(shift in employee.shifts, employee in shift.employees)
+
+    def test_repair_keeps_edited_assignments(self):
+        schedule = two_team_schedule()
+        self.assertTrue(solve(schedule))
+        last = schedule.shifts[3]
+        a1, a2 = schedule.employees[:2]
+        # Swap the last mc shift from A1 to A2 by hand
+        last.remove_employee(a1)
+        a1.remove_task(last)
+        last.add_employee(a2)
+        a2.add_task(last)
+        edited = assignments(schedule)
+        self.assertTrue(solve(schedule, incremental=True))
+        self.assertEqual(schedule.phases[-1]['name'], 'repair')
+        self.assertEqual(assignments(schedule), edited)
+
+
+class TestGreedyScheduler(unittest.TestCase):
+
+    HARD = ('coverage', 'shift_group_sum', 'holiday_sum')
+
+    def test_respects_availability_conflicts_and_staffing(self):
+        for seed in range(3):
+            schedule = generate_roster(13, 31, seed=seed)
+            available = {(shift, employee) for shift in schedule.shifts for employee in schedule.employees if employee.is_available(shift)}
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertTrue(schedule.solve(engine='greedy', time_limit=0.5, config=SolverConfig(seed=seed)))
+            self.assertEqual(broken_rules(schedule), dict.fromkeys(broken_rules(schedule), 0))
+            for shift in schedule.shifts:
+                self.assertTrue(shift.min_employees <= len(shift.employees) <= shift.max_employees)
+                for employee in shift.employees:
+                    self.assertIn((shift, employee), available)
+                    self.assertIn(shift, employee.shifts)
+            phase, = schedule.phases
+            self.assertEqual((phase['name'], phase['status']), ('greedy', 'FEASIBLE'))
+
+    def test_keeps_fixed_assignments(self):
+        schedule = two_team_schedule()
+        first = schedule.shifts[0]
+        # A1 is away on the first day, so the draft has to give A1 the day after
+        first.add_employee(schedule.employees[1])
+        draft = GreedyScheduler(schedule).run()
+        self.assertTrue(draft.feasible)
+        self.assertTrue(draft.assignment()[0, 1])
+        self.assertEqual(sum(draft.violations().values()), 0)
+
+    def test_violations_are_zero_exactly_when_feasible(self):
+        def infeasible_staffing(schedule):
+            schedule.shifts[0].min_employees = schedule.shifts[0].max_employees = 3
+
+        def infeasible_quota(schedule):
+            schedule.shift_group_sum = {('max', 'mc'): 1}
+
+        def infeasible_holidays(schedule):
+            schedule.holiday_sum = {'max': 2, 'min': 1}
+
+        def single_employee(schedule):
+            # Feasible, but A2 has to work on consecutive days
+            schedule.employees.remove(schedule.employees[0])
+
+        for change, feasible in ((None, True), (infeasible_staffing, False), (infeasible_quota, False), (infeasible_holidays, False), (single_employee, True)):
+            schedule = two_team_schedule()
+            if change is not None:
+                change(schedule)
+            draft = GreedyScheduler(schedule).run()
+            violations = draft.violations()
+            name = change.__name__ if change else 'unchanged'
+            self.assertEqual(draft.feasible, feasible, name)
+            self.assertEqual(all(violations[rule] == 0 for rule in self.HARD), feasible, name)
+            self.assertEqual(draft.cost() < GreedyScheduler.HARD, feasible, name)
+
+            draft.apply()
+            broken = broken_rules(schedule)
+            self.assertEqual({rule: violations[rule] > 0 for rule in broken}, {rule: count > 0 for rule, count in broken.items()}, name)
+            self.assertEqual(violations['coverage'], broken['coverage'], name)
+        self.assertGreater(violations['consecutive_days'], 0)
+
+    def test_engine_reports_infeasible_drafts(self):
+        schedule = two_team_schedule()
+        schedule.shifts[0].min_employees = schedule.shifts[0].max_employees = 3
+        self.assertFalse(solve(schedule, engine='greedy', time_limit=0.2))
+        phase, = schedule.phases
+        self.assertEqual(phase['status'], 'INFEASIBLE')
+        self.assertEqual(phase['violations']['coverage'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()